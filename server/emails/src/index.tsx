@@ -1,28 +1,71 @@
 import { render } from "@react-email/render";
 import { Command } from "commander";
+import * as readline from "node:readline";
 
 import emails from "./emails";
 
-const program = new Command();
+const renderTemplate = (template: string, props: any): Promise<string> => {
+  const TemplateComponent = emails[template];
+  if (!TemplateComponent) {
+    return Promise.reject(new Error(`Template ${template} not found`));
+  }
+  return render(<TemplateComponent {...props} />);
+};
 
-program
-  .argument("<template>", "name of the email template")
-  .argument("<props>", "props to pass to the email template, as a JSON string")
-  .action((template: string, props: string) => {
+// Long-lived mode: reads one JSON request per line on stdin,
+// writes one JSON response per line on stdout, in completion order.
+const serve = () => {
+  const lines = readline.createInterface({ input: process.stdin });
+  lines.on("line", (line: string) => {
+    let id: number | null = null;
     try {
-      const parsedProps = JSON.parse(props);
-      const TemplateComponent = emails[template];
-      if (!TemplateComponent) {
-        console.error(`Template ${template} not found`);
-        process.exit(1);
-      }
-      render(<TemplateComponent {...parsedProps} />).then((html) =>
-        console.log(html),
-      );
+      const request = JSON.parse(line);
+      id = request.id;
+      renderTemplate(request.template, request.props)
+        .then((html) => process.stdout.write(JSON.stringify({ id, html }) + "\n"))
+        .catch((error) =>
+          process.stdout.write(
+            JSON.stringify({ id, error: String(error) }) + "\n",
+          ),
+        );
     } catch (error) {
-      console.error("Error parsing JSON string:", error);
-      process.exit(1);
+      process.stdout.write(JSON.stringify({ id, error: String(error) }) + "\n");
     }
   });
+};
+
+const program = new Command();
+
+program
+  .argument("[template]", "name of the email template")
+  .argument("[props]", "props to pass to the email template, as a JSON string")
+  .option("--serve", "render templates requested on stdin until it's closed")
+  .action(
+    (
+      template: string | undefined,
+      props: string | undefined,
+      options: { serve?: boolean },
+    ) => {
+      if (options.serve) {
+        serve();
+        return;
+      }
+      if (!template || !props) {
+        program.help({ error: true });
+      }
+      try {
+        const parsedProps = JSON.parse(props as string);
+        renderTemplate(template as string, parsedProps)
+          .then((html) => console.log(html))
+          .catch((error) => {
+            console.error(String(error));
+            process.exit(1);
+          });
+      } catch (error) {
+        console.error("Error parsing JSON string:", error);
+        process.exit(1);
+      }
+    },
+  );
 
 program.parse(process.argv);
@@ -0,0 +1,37 @@
+"""Add GIN index on Event.user_metadata
+
+Revision ID: f4cb1003a930
+Revises: 10b53528efd6
+Create Date: 2026-10-17 11:38:47.902615
+
+"""
+
+from alembic import op
+
+# Polar Custom Imports
+
+# revision identifiers, used by Alembic.
+revision = "f4cb1003a930"
+down_revision = "10b53528efd6"
+branch_labels: tuple[str] | None = None
+depends_on: tuple[str] | None = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_events_user_metadata",
+        "events",
+        ["user_metadata"],
+        unique=False,
+        postgresql_using="gin",
+        postgresql_ops={"user_metadata": "jsonb_path_ops"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "ix_events_user_metadata",
+        table_name="events",
+        postgresql_using="gin",
+        postgresql_ops={"user_metadata": "jsonb_path_ops"},
+    )
@@ -0,0 +1,34 @@
+"""Add Organization.webhook_endpoints_version
+
+Revision ID: 8d2f6e14a9b3
+Revises: f4cb1003a930
+Create Date: 2026-10-17 12:26:09.481736
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# Polar Custom Imports
+
+# revision identifiers, used by Alembic.
+revision = "8d2f6e14a9b3"
+down_revision = "f4cb1003a930"
+branch_labels: tuple[str] | None = None
+depends_on: tuple[str] | None = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "organizations",
+        sa.Column(
+            "webhook_endpoints_version",
+            sa.Integer(),
+            server_default="0",
+            nullable=False,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("organizations", "webhook_endpoints_version")
@@ -6,10 +6,11 @@ import structlog
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
 
-from polar import receivers, worker  # noqa
+from polar import receivers, tasks, worker  # noqa
 from polar.api import router
 from polar.checkout import ip_geolocation
 from polar.config import settings
+from polar.email.react import close_email_renderer_pool
 from polar.exception_handlers import add_exception_handlers
 from polar.health.endpoints import router as health_router
 from polar.kit.cors import CORSConfig, CORSMatcherMiddleware, Scope
@@ -133,6 +134,7 @@ async def lifespan(app: FastAPI) -> AsyncIterator[State]:
 
             await async_engine.dispose()
             sync_engine.dispose()
+            await close_email_renderer_pool()
             if ip_geolocation_client is not None:
                 ip_geolocation_client.close()
 
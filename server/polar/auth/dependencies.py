@@ -1,28 +1,48 @@
 from collections.abc import Awaitable, Callable
+from datetime import UTC, datetime
 from inspect import Parameter, Signature
 from typing import Annotated, Any
 
 from fastapi import Depends, Request, Security
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.security.utils import get_authorization_scheme_param
 from makefun import with_signature
 
 from polar.auth.scope import RESERVED_SCOPES, Scope
-from polar.customer_session.dependencies import get_optional_customer_session_token
-from polar.exceptions import NotPermitted, Unauthorized
-from polar.models import (
-    Customer,
-    CustomerSession,
-    OAuth2Token,
-    OrganizationAccessToken,
-    PersonalAccessToken,
-    UserSession,
+from polar.config import settings
+from polar.customer_session.dependencies import (
+    auth_header_scheme as customer_session_auth_header_scheme,
+)
+from polar.customer_session.service import CUSTOMER_SESSION_TOKEN_PREFIX
+from polar.customer_session.service import (
+    customer_session as customer_session_service,
 )
-from polar.oauth2.dependencies import get_optional_token
+from polar.enums import TokenType
+from polar.exceptions import NotPermitted, Unauthorized
+from polar.kit.crypto import get_token_hash
+from polar.kit.utils import utc_now
+from polar.models import Customer, UserSession
+from polar.oauth2.constants import ACCESS_TOKEN_PREFIX
+from polar.oauth2.dependencies import openid_scheme
 from polar.oauth2.exceptions import InsufficientScopeError, InvalidTokenError
+from polar.oauth2.service.oauth2_token import oauth2_token as oauth2_token_service
 from polar.organization_access_token.dependencies import (
-    get_optional_organization_access_token,
+    auth_header_scheme as organization_access_token_auth_header_scheme,
+)
+from polar.organization_access_token.service import (
+    TOKEN_PREFIX as ORGANIZATION_ACCESS_TOKEN_PREFIX,
+)
+from polar.organization_access_token.service import (
+    organization_access_token as organization_access_token_service,
+)
+from polar.personal_access_token.dependencies import (
+    auth_header_scheme as personal_access_token_auth_header_scheme,
+)
+from polar.personal_access_token.service import (
+    personal_access_token as personal_access_token_service,
 )
-from polar.personal_access_token.dependencies import get_optional_personal_access_token
 from polar.postgres import AsyncSession, get_db_session
+from polar.redis import Redis, get_redis
 from polar.sentry import set_sentry_user
 
 from .models import (
@@ -36,6 +56,8 @@ from .models import (
     is_anonymous,
 )
 from .service import auth as auth_service
+from .token_cache import CachedToken, TokenCache
+from .token_usage import TokenUsageBuffer
 
 
 async def get_user_session(
@@ -44,26 +66,204 @@ async def get_user_session(
     return await auth_service.authenticate(session, request)
 
 
+def get_token_type(token: str) -> TokenType:
+    """
+    Get the type of a bearer token from its prefix,
+    so it's looked up in exactly one backend.
+    """
+    if token.startswith(tuple(ACCESS_TOKEN_PREFIX.values())):
+        return TokenType.access_token
+    if token.startswith(ORGANIZATION_ACCESS_TOKEN_PREFIX):
+        return TokenType.organization_access_token
+    if token.startswith(CUSTOMER_SESSION_TOKEN_PREFIX):
+        return TokenType.customer_session_token
+    # Personal access tokens, including legacy ones without prefix
+    return TokenType.personal_access_token
+
+
+async def _load_token(
+    session: AsyncSession, token: str, token_type: TokenType
+) -> tuple[Subject, CachedToken] | None:
+    if token_type == TokenType.access_token:
+        oauth2_token = await oauth2_token_service.get_by_access_token(session, token)
+        if oauth2_token is None:
+            return None
+        return oauth2_token.sub, CachedToken(
+            token_id=oauth2_token.id,
+            subject_type="user"
+            if isinstance(oauth2_token.sub, User)
+            else "organization",
+            subject_id=oauth2_token.sub.id,
+            scopes=oauth2_token.scopes,
+            expires_at=datetime.fromtimestamp(oauth2_token.expires_at, UTC),
+        )
+
+    if token_type == TokenType.organization_access_token:
+        organization_access_token = (
+            await organization_access_token_service.get_by_token(session, token)
+        )
+        if organization_access_token is None:
+            return None
+        return organization_access_token.organization, CachedToken(
+            token_id=organization_access_token.id,
+            subject_type="organization",
+            subject_id=organization_access_token.organization_id,
+            scopes=organization_access_token.scopes,
+            expires_at=organization_access_token.expires_at,
+        )
+
+    if token_type == TokenType.customer_session_token:
+        customer_session = await customer_session_service.get_by_token(session, token)
+        if customer_session is None:
+            return None
+        return customer_session.customer, CachedToken(
+            token_id=customer_session.id,
+            subject_type="customer",
+            subject_id=customer_session.customer_id,
+            scopes={Scope.customer_portal_write},
+            expires_at=customer_session.expires_at,
+        )
+
+    personal_access_token = await personal_access_token_service.get_by_token(
+        session, token
+    )
+    if personal_access_token is None:
+        return None
+    return personal_access_token.user, CachedToken(
+        token_id=personal_access_token.id,
+        subject_type="user",
+        subject_id=personal_access_token.user_id,
+        scopes=personal_access_token.scopes,
+        expires_at=personal_access_token.expires_at,
+    )
+
+
+_SUBJECT_MODELS: dict[str, type[User | Organization | Customer]] = {
+    "user": User,
+    "organization": Organization,
+    "customer": Customer,
+}
+
+_TOKEN_AUTH_METHODS: dict[TokenType, AuthMethod] = {
+    TokenType.access_token: AuthMethod.OAUTH2_ACCESS_TOKEN,
+    TokenType.personal_access_token: AuthMethod.PERSONAL_ACCESS_TOKEN,
+    TokenType.organization_access_token: AuthMethod.ORGANIZATION_ACCESS_TOKEN,
+    TokenType.customer_session_token: AuthMethod.CUSTOMER_SESSION_TOKEN,
+}
+
+
+async def _authenticate_token(
+    session: AsyncSession, redis: Redis, token: str, token_type: TokenType
+) -> AuthSubject[Subject] | None:
+    # Another backend is responsible for this token
+    if get_token_type(token) != token_type:
+        return None
+
+    token_hash = get_token_hash(token, secret=settings.SECRET)
+    token_cache = TokenCache(redis)
+
+    subject: Subject | None = None
+    cached_token = await token_cache.get(token_hash)
+    if cached_token is not None:
+        subject = await session.get(
+            _SUBJECT_MODELS[cached_token.subject_type], cached_token.subject_id
+        )
+
+    if subject is None or cached_token is None:
+        loaded = await _load_token(session, token, token_type)
+        if loaded is None:
+            return None
+        subject, cached_token = loaded
+        await token_cache.set(token_hash, cached_token)
+
+    if token_type in {
+        TokenType.personal_access_token,
+        TokenType.organization_access_token,
+    }:
+        await TokenUsageBuffer(redis).record(
+            token_type, cached_token.token_id, utc_now()
+        )
+
+    return AuthSubject(subject, cached_token.scopes, _TOKEN_AUTH_METHODS[token_type])
+
+
+async def get_optional_oauth2_credentials(
+    authorization: str = Depends(openid_scheme),
+    session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
+) -> tuple[AuthSubject[Subject] | None, bool]:
+    scheme, token = get_authorization_scheme_param(authorization)
+    if not authorization or scheme.lower() != "bearer":
+        return None, False
+    return await _authenticate_token(
+        session, redis, token, TokenType.access_token
+    ), True
+
+
+async def get_optional_personal_access_token_credentials(
+    auth_header: HTTPAuthorizationCredentials | None = Depends(
+        personal_access_token_auth_header_scheme
+    ),
+    session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
+) -> tuple[AuthSubject[Subject] | None, bool]:
+    if auth_header is None:
+        return None, False
+    return await _authenticate_token(
+        session, redis, auth_header.credentials, TokenType.personal_access_token
+    ), True
+
+
+async def get_optional_organization_access_token_credentials(
+    auth_header: HTTPAuthorizationCredentials | None = Depends(
+        organization_access_token_auth_header_scheme
+    ),
+    session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
+) -> tuple[AuthSubject[Subject] | None, bool]:
+    if auth_header is None:
+        return None, False
+    return await _authenticate_token(
+        session, redis, auth_header.credentials, TokenType.organization_access_token
+    ), True
+
+
+async def get_optional_customer_session_credentials(
+    auth_header: HTTPAuthorizationCredentials | None = Depends(
+        customer_session_auth_header_scheme
+    ),
+    session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
+) -> tuple[AuthSubject[Subject] | None, bool]:
+    if auth_header is None:
+        return None, False
+    return await _authenticate_token(
+        session, redis, auth_header.credentials, TokenType.customer_session_token
+    ), True
+
+
 async def _get_auth_subject(
-    customer_session_credentials: tuple[CustomerSession | None, bool] = (None, False),
+    customer_session_credentials: tuple[AuthSubject[Subject] | None, bool] = (
+        None,
+        False,
+    ),
     user_session: UserSession | None = None,
-    oauth2_credentials: tuple[OAuth2Token | None, bool] = (None, False),
-    personal_access_token_credentials: tuple[PersonalAccessToken | None, bool] = (
+    oauth2_credentials: tuple[AuthSubject[Subject] | None, bool] = (None, False),
+    personal_access_token_credentials: tuple[AuthSubject[Subject] | None, bool] = (
+        None,
+        False,
+    ),
+    organization_access_token_credentials: tuple[AuthSubject[Subject] | None, bool] = (
         None,
         False,
     ),
-    organization_access_token_credentials: tuple[
-        OrganizationAccessToken | None, bool
-    ] = (None, False),
 ) -> AuthSubject[Subject]:
     # Customer session is prioritized over web session
-    customer_session, customer_session_authorization_set = customer_session_credentials
-    if customer_session:
-        return AuthSubject(
-            customer_session.customer,
-            {Scope.customer_portal_write},
-            AuthMethod.CUSTOMER_SESSION_TOKEN,
-        )
+    customer_session_auth_subject, customer_session_authorization_set = (
+        customer_session_credentials
+    )
+    if customer_session_auth_subject is not None:
+        return customer_session_auth_subject
 
     # Web session
     if user_session is not None:
@@ -77,39 +277,21 @@ async def _get_auth_subject(
             scopes.add(Scope.admin)
         return AuthSubject(user, scopes, AuthMethod.COOKIE)
 
-    oauth2_token, oauth2_authorization_set = oauth2_credentials
-    personal_access_token, personal_access_token_authorization_set = (
-        personal_access_token_credentials
-    )
-    organization_access_token, organization_access_token_authorization_set = (
-        organization_access_token_credentials
-    )
-
-    if oauth2_token:
-        return AuthSubject(
-            oauth2_token.sub, oauth2_token.scopes, AuthMethod.OAUTH2_ACCESS_TOKEN
-        )
-
-    if personal_access_token:
-        return AuthSubject(
-            personal_access_token.user,
-            personal_access_token.scopes,
-            AuthMethod.PERSONAL_ACCESS_TOKEN,
-        )
-
-    if organization_access_token:
-        return AuthSubject(
-            organization_access_token.organization,
-            organization_access_token.scopes,
-            AuthMethod.ORGANIZATION_ACCESS_TOKEN,
-        )
+    # Bearer tokens, only one of them is looked up depending on its prefix
+    for auth_subject, _ in (
+        oauth2_credentials,
+        personal_access_token_credentials,
+        organization_access_token_credentials,
+    ):
+        if auth_subject is not None:
+            return auth_subject
 
     if any(
         (
             customer_session_authorization_set,
-            oauth2_authorization_set,
-            personal_access_token_authorization_set,
-            organization_access_token_authorization_set,
+            oauth2_credentials[1],
+            personal_access_token_credentials[1],
+            organization_access_token_credentials[1],
         )
     ):
         raise InvalidTokenError()
@@ -134,7 +316,7 @@ def _get_auth_subject_factory(
             Parameter(
                 name="oauth2_credentials",
                 kind=Parameter.KEYWORD_ONLY,
-                default=Depends(get_optional_token),
+                default=Depends(get_optional_oauth2_credentials),
             )
         ]
     if User in allowed_subjects:
@@ -147,7 +329,7 @@ def _get_auth_subject_factory(
             Parameter(
                 name="personal_access_token_credentials",
                 kind=Parameter.KEYWORD_ONLY,
-                default=Depends(get_optional_personal_access_token),
+                default=Depends(get_optional_personal_access_token_credentials),
             ),
         ]
     if Organization in allowed_subjects:
@@ -155,7 +337,7 @@ def _get_auth_subject_factory(
             Parameter(
                 name="organization_access_token_credentials",
                 kind=Parameter.KEYWORD_ONLY,
-                default=Depends(get_optional_organization_access_token),
+                default=Depends(get_optional_organization_access_token_credentials),
             )
         ]
     if Customer in allowed_subjects:
@@ -163,7 +345,7 @@ def _get_auth_subject_factory(
             Parameter(
                 name="customer_session_credentials",
                 kind=Parameter.KEYWORD_ONLY,
-                default=Depends(get_optional_customer_session_token),
+                default=Depends(get_optional_customer_session_credentials),
             )
         )
 
@@ -1,10 +1,14 @@
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import TypeVar
+from typing import Any, TypeVar
 
 import structlog
 from fastapi import Request, Response
 from fastapi.responses import RedirectResponse
-from sqlalchemy import delete, select
+from sqlalchemy import delete, inspect, select
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 from polar.config import settings
 from polar.enums import TokenType
@@ -21,6 +25,9 @@ USER_SESSION_TOKEN_PREFIX = "polar_us_"
 
 R = TypeVar("R", bound=Response)
 
+_USER_SESSION_CACHE_MAX_SIZE = 1024
+_user_session_cache: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
 
 class AuthService:
     async def get_login_response(
@@ -49,6 +56,7 @@ class AuthService:
     ) -> RedirectResponse:
         if user_session is not None:
             await session.delete(user_session)
+            _user_session_cache.pop(user_session.token, None)
         response = RedirectResponse(settings.FRONTEND_BASE_URL)
         response = self._set_user_session_cookie(request, response, "", 0)
         return response
@@ -86,6 +94,7 @@ class AuthService:
             return False
 
         await session.delete(user_session)
+        _user_session_cache.pop(user_session.token, None)
 
         log.info(
             "Revoke leaked user session token",
@@ -100,12 +109,69 @@ class AuthService:
         self, session: AsyncSession, token: str, *, expired: bool = False
     ) -> UserSession | None:
         token_hash = get_token_hash(token, secret=settings.SECRET)
+
+        if not expired:
+            user_session = await self._get_cached_user_session(session, token_hash)
+            if user_session is not None:
+                return user_session
+
         statement = select(UserSession).where(UserSession.token == token_hash)
-        result = await session.execute(statement)
         if not expired:
             statement = statement.where(UserSession.expires_at > utc_now())
         result = await session.execute(statement)
-        return result.unique().scalar_one_or_none()
+        user_session = result.unique().scalar_one_or_none()
+
+        if user_session is not None and user_session.expires_at > utc_now():
+            self._cache_user_session(user_session)
+
+        return user_session
+
+    async def _get_cached_user_session(
+        self, session: AsyncSession, token_hash: str
+    ) -> UserSession | None:
+        """
+        Get a session from the in-process cache.
+
+        Only the session columns are cached: the user is always loaded,
+        so changes to it are immediately visible.
+        """
+        cached = _user_session_cache.get(token_hash)
+        if cached is None:
+            return None
+
+        cache_expires_at, values = cached
+        if cache_expires_at <= time.monotonic() or values["expires_at"] <= utc_now():
+            del _user_session_cache[token_hash]
+            return None
+
+        user = await session.get(User, values["user_id"])
+        if user is None:
+            del _user_session_cache[token_hash]
+            return None
+
+        _user_session_cache.move_to_end(token_hash)
+
+        # Attach the session as if it was loaded, without querying it
+        user_session = UserSession(**values)
+        make_transient_to_detached(user_session)
+        set_committed_value(user_session, "user", user)
+        return await session.merge(user_session, load=False)
+
+    def _cache_user_session(self, user_session: UserSession) -> None:
+        cache_expires_at = time.monotonic() + min(
+            settings.USER_SESSION_CACHE_TTL.total_seconds(),
+            (user_session.expires_at - utc_now()).total_seconds(),
+        )
+        _user_session_cache[user_session.token] = (
+            cache_expires_at,
+            {
+                attribute.key: getattr(user_session, attribute.key)
+                for attribute in inspect(UserSession).column_attrs
+            },
+        )
+        _user_session_cache.move_to_end(user_session.token)
+        while len(_user_session_cache) > _USER_SESSION_CACHE_MAX_SIZE:
+            _user_session_cache.popitem(last=False)
 
     async def _create_user_session(
         self, session: AsyncSession, user: User, *, user_agent: str
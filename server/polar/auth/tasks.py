@@ -1,9 +1,26 @@
 import structlog
 
+from polar.enums import TokenType
 from polar.logging import Logger
-from polar.worker import AsyncSessionMaker, CronTrigger, JobContext, task
+from polar.organization_access_token.repository import (
+    OrganizationAccessTokenRepository,
+)
+from polar.personal_access_token.service import (
+    personal_access_token as personal_access_token_service,
+)
+from polar.worker import (
+    AsyncSessionMaker,
+    CronTrigger,
+    JobContext,
+    PolarWorkerContext,
+    QueueName,
+    get_worker_redis,
+    task,
+)
 
 from .service import auth as auth_service
+from .token_cache import TokenCache
+from .token_usage import TokenUsageBuffer
 
 log: Logger = structlog.get_logger()
 
@@ -12,3 +29,30 @@ log: Logger = structlog.get_logger()
 async def auth_delete_expired(ctx: JobContext) -> None:
     async with AsyncSessionMaker(ctx) as session:
         await auth_service.delete_expired(session)
+
+
+@task(
+    "auth.flush_token_usage",
+    cron_trigger=CronTrigger.from_crontab("* * * * *"),
+    keep_result=0,
+)
+async def auth_flush_token_usage(ctx: JobContext) -> None:
+    token_usage_buffer = TokenUsageBuffer(get_worker_redis(ctx))
+    async with AsyncSessionMaker(ctx) as session:
+        await personal_access_token_service.record_usage(
+            session, await token_usage_buffer.read(TokenType.personal_access_token)
+        )
+        repository = OrganizationAccessTokenRepository.from_session(session)
+        await repository.record_usage(
+            await token_usage_buffer.read(TokenType.organization_access_token)
+        )
+    # Committed: the usages can be cleared
+    await token_usage_buffer.ack(TokenType.personal_access_token)
+    await token_usage_buffer.ack(TokenType.organization_access_token)
+
+
+@task("auth.invalidate_token_cache", queue=QueueName.high_priority)
+async def auth_invalidate_token_cache(
+    ctx: JobContext, token_hashes: list[str], polar_context: PolarWorkerContext
+) -> None:
+    await TokenCache(get_worker_redis(ctx)).invalidate(*token_hashes)
@@ -0,0 +1,114 @@
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Literal
+from uuid import UUID
+
+from pydantic import BaseModel
+
+from polar.config import settings
+from polar.kit.utils import utc_now
+from polar.redis import Redis
+from polar.worker import enqueue_job
+
+from .scope import Scope
+
+
+class CachedToken(BaseModel):
+    """What we need to know about a valid token to authenticate a request."""
+
+    token_id: UUID
+    subject_type: Literal["user", "organization", "customer"]
+    subject_id: UUID
+    scopes: set[Scope]
+    expires_at: datetime | None
+
+
+_LOCAL_CACHE_MAX_SIZE = 1024
+_local_cache: OrderedDict[str, tuple[float, CachedToken]] = OrderedDict()
+
+
+class TokenCache:
+    """
+    Two-level cache of valid tokens, keyed by token hash.
+
+    Tokens are first looked up in a small in-process LRU, then in Redis.
+    Invalidation removes the token from Redis and from the local cache
+    of the current process. Other processes may still see the token
+    for `AUTH_TOKEN_LOCAL_CACHE_TTL`, which is why it's kept short.
+
+    Services shouldn't invalidate tokens directly, but through
+    `enqueue_token_cache_invalidation`, so it happens after their transaction
+    is committed.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+    async def get(self, token_hash: str) -> CachedToken | None:
+        local = _local_cache.get(token_hash)
+        if local is not None:
+            local_expires_at, cached_token = local
+            if local_expires_at > time.monotonic() and self._is_valid(cached_token):
+                _local_cache.move_to_end(token_hash)
+                return cached_token
+            del _local_cache[token_hash]
+
+        value = await self.redis.get(self._get_key(token_hash))
+        if value is None:
+            return None
+        cached_token = CachedToken.model_validate_json(value)
+        if not self._is_valid(cached_token):
+            return None
+        self._set_local(token_hash, cached_token)
+        return cached_token
+
+    async def set(self, token_hash: str, cached_token: CachedToken) -> None:
+        ttl = settings.AUTH_TOKEN_CACHE_TTL.total_seconds()
+        if cached_token.expires_at is not None:
+            ttl = min(ttl, (cached_token.expires_at - utc_now()).total_seconds())
+        if ttl < 1:
+            return
+        await self.redis.set(
+            self._get_key(token_hash), cached_token.model_dump_json(), ex=int(ttl)
+        )
+        self._set_local(token_hash, cached_token)
+
+    async def invalidate(self, *token_hashes: str) -> None:
+        if not token_hashes:
+            return
+        for token_hash in token_hashes:
+            _local_cache.pop(token_hash, None)
+        await self.redis.delete(
+            *(self._get_key(token_hash) for token_hash in token_hashes)
+        )
+
+    def _set_local(self, token_hash: str, cached_token: CachedToken) -> None:
+        _local_cache[token_hash] = (
+            time.monotonic() + settings.AUTH_TOKEN_LOCAL_CACHE_TTL.total_seconds(),
+            cached_token,
+        )
+        _local_cache.move_to_end(token_hash)
+        while len(_local_cache) > _LOCAL_CACHE_MAX_SIZE:
+            _local_cache.popitem(last=False)
+
+    def _is_valid(self, cached_token: CachedToken) -> bool:
+        return cached_token.expires_at is None or cached_token.expires_at > utc_now()
+
+    def _get_key(self, token_hash: str) -> str:
+        return f"polar:auth_token:{token_hash}"
+
+
+def enqueue_token_cache_invalidation(*token_hashes: str) -> None:
+    """
+    Invalidate tokens once the current transaction is committed.
+
+    Invalidating before the commit is racy: a concurrent request may still
+    load the token from the database and cache it again. The job is only sent
+    when the current request or task ends, after its transaction is committed.
+    """
+    if token_hashes:
+        enqueue_job("auth.invalidate_token_cache", token_hashes=list(token_hashes))
+
+
+__all__ = ["CachedToken", "TokenCache", "enqueue_token_cache_invalidation"]
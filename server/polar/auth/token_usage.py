@@ -0,0 +1,90 @@
+import time
+from collections import OrderedDict
+from datetime import UTC, datetime
+from uuid import UUID
+
+from polar.config import settings
+from polar.enums import TokenType
+from polar.redis import Redis
+
+_LOCAL_BUFFER_MAX_SIZE = 1024
+
+# Move the buffer to the processing key, unless the previous usages
+# weren't acknowledged, and return the usages to process.
+_READ_SCRIPT = """
+if redis.call("EXISTS", KEYS[2]) == 0 and redis.call("EXISTS", KEYS[1]) == 1 then
+    redis.call("RENAME", KEYS[1], KEYS[2])
+end
+return redis.call("ZRANGE", KEYS[2], 0, -1, "WITHSCORES")
+"""
+_recorded_at: OrderedDict[tuple[TokenType, UUID], float] = OrderedDict()
+
+
+class TokenUsageBuffer:
+    """
+    Buffer of the last usage time of tokens, flushed periodically to the database.
+
+    Usages are stored in a Redis sorted set per token type, keeping the
+    latest timestamp of each token. Each process only pushes the usage
+    of a token once per `AUTH_TOKEN_USAGE_RECORD_INTERVAL`.
+
+    Flushing is done in two steps: `read` moves the buffer to a processing key,
+    and `ack` deletes it once the usages are committed. If the flush fails
+    in between, the next `read` returns the same usages again.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+    async def record(
+        self, token_type: TokenType, token_id: UUID, last_used_at: datetime
+    ) -> None:
+        local_key = (token_type, token_id)
+        now = time.monotonic()
+        recorded_at = _recorded_at.get(local_key)
+        if (
+            recorded_at is not None
+            and now - recorded_at
+            < settings.AUTH_TOKEN_USAGE_RECORD_INTERVAL.total_seconds()
+        ):
+            return
+
+        await self.redis.zadd(
+            self._get_key(token_type),
+            {str(token_id): last_used_at.timestamp()},
+            gt=True,
+        )
+
+        _recorded_at[local_key] = now
+        _recorded_at.move_to_end(local_key)
+        while len(_recorded_at) > _LOCAL_BUFFER_MAX_SIZE:
+            _recorded_at.popitem(last=False)
+
+    async def read(self, token_type: TokenType) -> dict[UUID, datetime]:
+        """
+        Get the buffered usages of a token type, to be processed.
+
+        Usages recorded from now on go to a new buffer. Until `ack` is called,
+        the same usages are returned again.
+        """
+        read_script = self.redis.register_script(_READ_SCRIPT)
+        usages: list[str] = await read_script(
+            keys=[self._get_key(token_type), self._get_processing_key(token_type)]
+        )
+        return {
+            UUID(token_id): datetime.fromtimestamp(float(timestamp), UTC)
+            for token_id, timestamp in zip(usages[::2], usages[1::2])
+        }
+
+    async def ack(self, token_type: TokenType) -> None:
+        """Clear the usages returned by `read`, once they're processed."""
+        await self.redis.delete(self._get_processing_key(token_type))
+
+    def _get_key(self, token_type: TokenType) -> str:
+        return f"polar:token_usage:{token_type}"
+
+    def _get_processing_key(self, token_type: TokenType) -> str:
+        return f"polar:token_usage:{token_type}:processing"
+
+
+__all__ = ["TokenUsageBuffer"]
@@ -0,0 +1,163 @@
+import asyncio
+from typing import Literal
+from uuid import UUID
+
+import structlog
+
+from polar.config import settings
+from polar.logging import Logger
+from polar.models import Benefit
+from polar.redis import Redis
+from polar.worker import (
+    AsyncSessionMaker,
+    JobContext,
+    enqueue_job,
+    flush_enqueued_jobs,
+    get_worker_redis,
+)
+
+from ..registry import get_benefit_strategy_class
+from ..strategies import BenefitRetriableError
+from .repository import BenefitGrantRepository
+from .service import benefit_grant as benefit_grant_service
+
+log: Logger = structlog.get_logger()
+
+BulkAction = Literal["update", "delete"]
+
+# Tasks processing a single grant, used when a grant hits a retriable error
+# during a bulk run
+_SINGLE_GRANT_TASKS: dict[BulkAction, str] = {
+    "update": "benefit.update",
+    "delete": "benefit.delete_grant",
+}
+
+
+class BulkProgress:
+    """
+    Progress of a bulk run, stored in Redis.
+
+    The cursor is the last grant ID of the last processed chunk,
+    so a retried job resumes where it stopped.
+    """
+
+    def __init__(self, redis: Redis, run_id: str) -> None:
+        self.redis = redis
+        self.key = f"polar:benefit_grant_bulk:{run_id}"
+
+    async def get_cursor(self) -> UUID | None:
+        cursor = await self.redis.hget(self.key, "cursor")
+        return UUID(cursor) if cursor is not None else None
+
+    async def advance(self, cursor: UUID, *, processed: int, requeued: int) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.key, "cursor", str(cursor))
+            pipe.hincrby(self.key, "processed", processed)
+            pipe.hincrby(self.key, "requeued", requeued)
+            pipe.expire(self.key, 86400)
+            await pipe.execute()
+
+    async def get(self) -> dict[str, str]:
+        return await self.redis.hgetall(self.key)
+
+
+async def _process_grant(ctx: JobContext, action: BulkAction, grant_id: UUID) -> bool:
+    """
+    Process a grant in its own transaction.
+
+    If it hits a retriable error, a job for this grant only is enqueued,
+    so it's retried with the usual logic without holding back the rest of the run.
+    Other errors are raised: they're likely systematic, like a misconfiguration
+    or a provider outage, and would fail the same way for every grant.
+    """
+    redis = get_worker_redis(ctx)
+    try:
+        async with AsyncSessionMaker(ctx) as session:
+            grant = await benefit_grant_service.get(session, grant_id, loaded=True)
+            if grant is None:
+                return True
+            if action == "update":
+                await benefit_grant_service.update_benefit_grant(session, redis, grant)
+            else:
+                await benefit_grant_service.delete_benefit_grant(session, redis, grant)
+    except BenefitRetriableError as e:
+        enqueue_job(
+            _SINGLE_GRANT_TASKS[action],
+            benefit_grant_id=grant_id,
+            _defer_by=e.defer_seconds,
+        )
+        return False
+    return True
+
+
+async def process_benefit_grants(
+    ctx: JobContext, benefit: Benefit, action: BulkAction
+) -> None:
+    """
+    Update or delete all the granted grants of a benefit.
+
+    Grants are streamed by chunks, ordered by ID, and processed concurrently
+    within a chunk, up to the `bulk_concurrency` of the benefit strategy.
+    Jobs enqueued while processing a chunk are flushed right after it.
+
+    If a grant fails with a non-retriable error, the run is aborted once the
+    in-flight grants of the chunk are done, without advancing the progress:
+    the job is retried from this chunk.
+
+    Only benefit updates and deletions go through here. Grants, revocations and
+    cycles triggered by a customer or a subscription still run per grant,
+    since they're bounded by the benefits of a single product or customer.
+    """
+    # Grants are processed in their own sessions, don't touch the benefit afterwards
+    benefit_id = benefit.id
+    progress = BulkProgress(get_worker_redis(ctx), ctx["job_id"])
+    semaphore = asyncio.Semaphore(
+        get_benefit_strategy_class(benefit.type).bulk_concurrency
+    )
+
+    async def _process_grant_bounded(grant_id: UUID) -> bool:
+        async with semaphore:
+            return await _process_grant(ctx, action, grant_id)
+
+    # Binds a job buffer shared with the tasks spawned below
+    await flush_enqueued_jobs(ctx["redis"])
+
+    cursor = await progress.get_cursor()
+    while True:
+        async with AsyncSessionMaker(ctx) as session:
+            repository = BenefitGrantRepository.from_session(session)
+            grant_ids = await repository.list_granted_ids_by_benefit(
+                benefit_id, after=cursor, limit=settings.BENEFIT_GRANT_BULK_CHUNK_SIZE
+            )
+        if not grant_ids:
+            break
+
+        results = await asyncio.gather(
+            *(_process_grant_bounded(grant_id) for grant_id in grant_ids),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, BaseException):
+                log.error(
+                    "Error while processing benefit grants in bulk, aborting",
+                    action=action,
+                    benefit_id=str(benefit_id),
+                    error=str(result),
+                )
+                raise result
+        await flush_enqueued_jobs(ctx["redis"])
+
+        cursor = grant_ids[-1]
+        await progress.advance(
+            cursor, processed=len(results), requeued=results.count(False)
+        )
+
+    log.info(
+        "Benefit grants processed in bulk",
+        action=action,
+        benefit_id=str(benefit_id),
+        **await progress.get(),
+    )
+
+
+__all__ = ["BulkAction", "BulkProgress", "process_benefit_grants"]
@@ -60,6 +60,25 @@ class BenefitGrantRepository(
         )
         return await self.get_all(statement)
 
+    async def list_granted_ids_by_benefit(
+        self, benefit_id: UUID, *, after: UUID | None = None, limit: int
+    ) -> Sequence[UUID]:
+        """List granted IDs of a benefit by ascending ID, after the given one."""
+        statement = (
+            select(BenefitGrant.id)
+            .where(
+                BenefitGrant.benefit_id == benefit_id,
+                BenefitGrant.is_granted.is_(True),
+                BenefitGrant.deleted_at.is_(None),
+            )
+            .order_by(BenefitGrant.id)
+            .limit(limit)
+        )
+        if after is not None:
+            statement = statement.where(BenefitGrant.id > after)
+        result = await self.session.execute(statement)
+        return result.scalars().all()
+
     async def list_granted_by_customer(
         self,
         customer_id: UUID,
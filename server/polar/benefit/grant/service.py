@@ -307,10 +307,8 @@ class BenefitGrantService(ResourceServiceReader[BenefitGrant]):
         if not await benefit_strategy.requires_update(benefit, previous_properties):
             return
 
-        repository = BenefitGrantRepository.from_session(session)
-        grants = await repository.list_granted_by_benefit(benefit)
-        for grant in grants:
-            enqueue_job("benefit.update", benefit_grant_id=grant.id)
+        # Grants are updated by a single bulk job, to not flood the default queue
+        enqueue_job("benefit.update_grants", benefit_id=benefit.id)
 
     async def update_benefit_grant(
         self,
@@ -412,14 +410,6 @@ class BenefitGrantService(ResourceServiceReader[BenefitGrant]):
         )
         return grant
 
-    async def enqueue_benefit_grant_deletions(
-        self, session: AsyncSession, benefit: Benefit
-    ) -> None:
-        repository = BenefitGrantRepository.from_session(session)
-        grants = await repository.list_granted_by_benefit(benefit)
-        for grant in grants:
-            enqueue_job("benefit.delete_grant", benefit_grant_id=grant.id)
-
     async def enqueue_customer_grant_deletions(
         self, session: AsyncSession, customer: Customer
     ) -> None:
@@ -497,6 +487,8 @@ class BenefitGrantService(ResourceServiceReader[BenefitGrant]):
                 )
             ),
         )
+        customer_repository = CustomerRepository.from_session(session)
+        await customer_repository.bump_state_version(grant.customer_id)
         enqueue_job(
             "customer.webhook",
             WebhookEventType.customer_state_changed,
@@ -39,6 +39,12 @@ def get_benefit_strategy(
     return _STRATEGY_CLASS_MAP[type](session, redis)
 
 
+def get_benefit_strategy_class(
+    type: BenefitType,
+) -> type[BenefitServiceProtocol[Any, Any]]:
+    return _STRATEGY_CLASS_MAP[type]
+
+
 __all__ = [
     "BenefitActionRequiredError",
     "BenefitServiceProtocol",
@@ -46,4 +52,5 @@ __all__ = [
     "BenefitRetriableError",
     "BenefitServiceError",
     "get_benefit_strategy",
+    "get_benefit_strategy_class",
 ]
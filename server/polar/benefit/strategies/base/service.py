@@ -68,6 +68,13 @@ class BenefitServiceProtocol(Protocol[BP, BGP]):
 
     should_revoke_individually: bool = False
 
+    bulk_concurrency: int = 10
+    """
+    Maximum number of grants processed concurrently by bulk jobs.
+
+    Lower it for benefits calling rate-limited external APIs.
+    """
+
     def __init__(self, session: AsyncSession, redis: Redis) -> None:
         self.session = session
         self.redis = redis
@@ -28,6 +28,8 @@ log: Logger = structlog.get_logger()
 class BenefitDiscordService(
     BenefitServiceProtocol[BenefitDiscordProperties, BenefitGrantDiscordProperties]
 ):
+    bulk_concurrency = 2
+
     async def grant(
         self,
         benefit: Benefit,
@@ -67,7 +69,11 @@ class BenefitDiscordService(
 
         try:
             await discord_bot_service.add_member(
-                guild_id, role_id, oauth_account.account_id, oauth_account.access_token
+                self.redis,
+                guild_id,
+                role_id,
+                oauth_account.account_id,
+                oauth_account.access_token,
             )
         except httpx.HTTPError as e:
             error_bound_logger = bound_logger.bind(error=str(e))
@@ -118,7 +124,9 @@ class BenefitDiscordService(
             return {}
 
         try:
-            await discord_bot_service.remove_member_role(guild_id, role_id, account_id)
+            await discord_bot_service.remove_member_role(
+                self.redis, guild_id, role_id, account_id
+            )
         except httpx.HTTPError as e:
             error_bound_logger = bound_logger.bind(error=str(e))
             if isinstance(e, httpx.HTTPStatusError):
@@ -147,7 +155,7 @@ class BenefitDiscordService(
         guild_id: str = properties["guild_id"]
         role_id: str = properties["role_id"]
 
-        guild = await discord_bot_service.get_guild(guild_id)
+        guild = await discord_bot_service.get_guild(self.redis, guild_id)
         guild_roles = [role.id for role in guild.roles]
 
         if role_id not in guild_roles:
@@ -162,7 +170,9 @@ class BenefitDiscordService(
                 ]
             )
 
-        if not await discord_bot_service.is_bot_role_above_role(guild_id, role_id):
+        if not await discord_bot_service.is_bot_role_above_role(
+            self.redis, guild_id, role_id
+        ):
             raise BenefitPropertiesValidationError(
                 [
                     {
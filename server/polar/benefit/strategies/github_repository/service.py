@@ -35,6 +35,8 @@ class BenefitGitHubRepositoryService(
         BenefitGitHubRepositoryProperties, BenefitGrantGitHubRepositoryProperties
     ]
 ):
+    bulk_concurrency = 2
+
     async def grant(
         self,
         benefit: Benefit,
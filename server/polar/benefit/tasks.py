@@ -1,4 +1,5 @@
 import uuid
+from datetime import timedelta
 from typing import Literal, Unpack
 
 import structlog
@@ -14,10 +15,12 @@ from polar.worker import (
     AsyncSessionMaker,
     JobContext,
     PolarWorkerContext,
+    QueueName,
     get_worker_redis,
     task,
 )
 
+from .grant.bulk import process_benefit_grants
 from .grant.scope import resolve_scope
 from .grant.service import benefit_grant as benefit_grant_service
 from .strategies import BenefitRetriableError
@@ -25,6 +28,9 @@ from .strategies import BenefitRetriableError
 log: Logger = structlog.get_logger()
 
 GRANT_REVOKE_MAX_TRIES = 16
+# Bulk jobs resume where they stopped when retried
+BULK_TIMEOUT = timedelta(hours=1)
+BULK_MAX_TRIES = 10
 
 
 class BenefitTaskError(PolarTaskError): ...
@@ -185,7 +191,7 @@ async def benefit_revoke(
             raise Retry(e.defer_seconds) from e
 
 
-@task("benefit.update")
+@task("benefit.update", queue=QueueName.bulk)
 async def benefit_update(
     ctx: JobContext,
     benefit_grant_id: uuid.UUID,
@@ -212,6 +218,26 @@ async def benefit_update(
             raise Retry(e.defer_seconds) from e
 
 
+@task(
+    "benefit.update_grants",
+    timeout=BULK_TIMEOUT,
+    max_tries=BULK_MAX_TRIES,
+    queue=QueueName.bulk,
+)
+async def benefit_update_grants(
+    ctx: JobContext,
+    benefit_id: uuid.UUID,
+    polar_context: PolarWorkerContext,
+) -> None:
+    async with AsyncSessionMaker(ctx) as session:
+        benefit_repository = BenefitRepository.from_session(session)
+        benefit = await benefit_repository.get_by_id(benefit_id)
+        if benefit is None:
+            raise BenefitDoesNotExist(benefit_id)
+
+    await process_benefit_grants(ctx, benefit, "update")
+
+
 @task("benefit.enqueue_benefit_grant_cycles")
 async def enqueue_benefit_grant_cycles(
     ctx: JobContext,
@@ -252,7 +278,12 @@ async def benefit_cycle(
             raise Retry(e.defer_seconds) from e
 
 
-@task("benefit.delete")
+@task(
+    "benefit.delete",
+    timeout=BULK_TIMEOUT,
+    max_tries=BULK_MAX_TRIES,
+    queue=QueueName.bulk,
+)
 async def benefit_delete(
     ctx: JobContext,
     benefit_id: uuid.UUID,
@@ -260,15 +291,11 @@ async def benefit_delete(
 ) -> None:
     async with AsyncSessionMaker(ctx) as session:
         benefit_repository = BenefitRepository.from_session(session)
-        benefit = await benefit_repository.get_by_id(
-            benefit_id,
-            options=benefit_repository.get_eager_options(),
-            include_deleted=True,
-        )
+        benefit = await benefit_repository.get_by_id(benefit_id, include_deleted=True)
         if benefit is None:
             raise BenefitDoesNotExist(benefit_id)
 
-        await benefit_grant_service.enqueue_benefit_grant_deletions(session, benefit)
+    await process_benefit_grants(ctx, benefit, "delete")
 
 
 @task("benefit.revoke_customer")
@@ -30,3 +30,11 @@ class BillingEntryRepository(
             .options(*options)
         )
         return await self.get_all(statement)
+
+    async def create_all(
+        self, entries: Sequence[BillingEntry]
+    ) -> Sequence[BillingEntry]:
+        # Flushed together, the entries are inserted in batched statements
+        self.session.add_all(entries)
+        await self.session.flush()
+        return entries
@@ -6,6 +6,7 @@ from polar.worker import (
     CronTrigger,
     JobContext,
     PolarWorkerContext,
+    QueueName,
     task,
 )
 
@@ -16,7 +17,7 @@ from .service import checkout as checkout_service
 class CheckoutTaskError(PolarTaskError): ...
 
 
-@task("checkout.handle_free_success")
+@task("checkout.handle_free_success", queue=QueueName.high_priority)
 async def handle_free_success(
     ctx: JobContext, checkout_id: uuid.UUID, polar_context: PolarWorkerContext
 ) -> None:
@@ -77,6 +77,9 @@ class Settings(BaseSettings):
     USER_SESSION_TTL: timedelta = timedelta(days=31)
     USER_SESSION_COOKIE_KEY: str = "polar_session"
     USER_SESSION_COOKIE_DOMAIN: str = "127.0.0.1"
+    # Sessions are cached in-process, so they may outlive their revocation
+    # in other processes by this duration.
+    USER_SESSION_CACHE_TTL: timedelta = timedelta(seconds=10)
 
     # Customer session
     CUSTOMER_SESSION_TTL: timedelta = timedelta(hours=1)
@@ -115,8 +118,13 @@ class Settings(BaseSettings):
     EMAIL_RENDERER_BINARY_PATH: Annotated[
         Path, AfterValidator(_validate_email_renderer_binary_path)
     ] = Path(__file__).parent.parent / "emails" / "bin" / "react-email-pkg"
+    # Number of renderer processes kept alive by each API or worker process
+    EMAIL_RENDERER_POOL_SIZE: int = 2
+    EMAIL_RENDERER_TIMEOUT: timedelta = timedelta(seconds=30)
     EMAIL_SENDER: EmailSender = EmailSender.logger
     RESEND_API_KEY: str = ""
+    # Emails enqueued together are sent by batches of this size, up to 100 on Resend
+    EMAIL_BATCH_SIZE: int = 100
     EMAIL_FROM_NAME: str = "Polar"
     EMAIL_FROM_EMAIL_ADDRESS: str = "noreply@notifications.polar.sh"
 
@@ -143,6 +151,8 @@ class Settings(BaseSettings):
     DISCORD_BOT_PERMISSIONS: str = (
         "268435459"  # Manage Roles, Kick Members, Create Instant Invite
     )
+    # Number of times a bot request is retried after hitting a rate limit
+    DISCORD_RATE_LIMIT_MAX_RETRIES: int = 3
 
     # Google
     GOOGLE_CLIENT_ID: str = ""
@@ -201,6 +211,44 @@ class Settings(BaseSettings):
     # Application behaviours
     API_PAGINATION_MAX_LIMIT: int = 100
 
+    # Number of events validated and inserted at once during ingestion
+    EVENT_INGEST_CHUNK_SIZE: int = 1000
+    # Maximum size in bytes of a line of a streamed NDJSON ingestion
+    EVENT_INGEST_MAX_LINE_SIZE: int = 1024 * 1024
+    # Window during which meter updates of a customer are coalesced
+    CUSTOMER_METER_UPDATE_DEBOUNCE: timedelta = timedelta(seconds=15)
+    # Number of events processed per checkpoint when creating billing entries
+    METER_BILLING_CHUNK_SIZE: int = 1000
+    # Number of meters whose oldest unbilled event is looked up in a single query
+    METER_BILLING_LAG_BATCH_SIZE: int = 100
+    # Query results ending before this window are closed: they're cached longer,
+    # and invalidated when data is changed in the past
+    RESULT_CACHE_OPEN_WINDOW: timedelta = timedelta(hours=1)
+    RESULT_CACHE_TTL: timedelta = timedelta(days=1)
+    RESULT_CACHE_OPEN_TTL: timedelta = timedelta(minutes=1)
+    # Valid tokens are cached, so authenticated requests skip the token lookup.
+    # The local cache can't be invalidated from other processes, keep it short.
+    AUTH_TOKEN_CACHE_TTL: timedelta = timedelta(minutes=5)
+    AUTH_TOKEN_LOCAL_CACHE_TTL: timedelta = timedelta(seconds=10)
+    # Token usages are buffered and written in bulk, at most once per interval
+    AUTH_TOKEN_USAGE_RECORD_INTERVAL: timedelta = timedelta(seconds=10)
+    # Webhook deliveries share a pooled client per worker. Endpoints failing
+    # repeatedly are parked by a circuit breaker instead of burning retries.
+    WEBHOOK_MAX_CONNECTIONS: int = 200
+    WEBHOOK_ENDPOINT_MAX_CONCURRENCY: int = 10
+    WEBHOOK_CIRCUIT_BREAKER_THRESHOLD: int = 20
+    WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION: timedelta = timedelta(minutes=5)
+    WEBHOOK_CIRCUIT_BREAKER_JITTER: timedelta = timedelta(minutes=1)
+    # Endpoints subscribed to each event are cached per organization and process.
+    # Changes made through the service are seen at once, this bounds the others.
+    WEBHOOK_ENDPOINTS_INDEX_TTL: timedelta = timedelta(minutes=5)
+    # Payloads of older webhook events are purged; deliveries are kept
+    WEBHOOK_PAYLOAD_RETENTION: timedelta = timedelta(days=30)
+    # Customer state snapshots are invalidated by version, the TTL only evicts them
+    CUSTOMER_STATE_CACHE_TTL: timedelta = timedelta(days=1)
+    # Bulk benefit grant jobs stream grants by chunks of this size
+    BENEFIT_GRANT_BULK_CHUNK_SIZE: int = 100
+
     GITHUB_BADGE_EMBED: bool = False
     GITHUB_BADGE_EMBED_DEFAULT_LABEL: str = "Fund"
 
@@ -1,4 +1,4 @@
-from fastapi import Depends, Query
+from fastapi import Depends, Query, Response
 
 from polar.exceptions import ResourceNotFound
 from polar.kit.metadata import MetadataQuery, get_metadata_query_openapi_schema
@@ -8,6 +8,7 @@ from polar.models import Customer
 from polar.openapi import APITag
 from polar.organization.schemas import OrganizationID
 from polar.postgres import AsyncSession, get_db_session
+from polar.redis import Redis, get_redis
 from polar.routing import APIRouter
 
 from . import auth, sorting
@@ -120,7 +121,8 @@ async def get_state(
     id: CustomerID,
     auth_subject: auth.CustomerRead,
     session: AsyncSession = Depends(get_db_session),
-) -> CustomerState:
+    redis: Redis = Depends(get_redis),
+) -> Response:
     """
     Get a customer state by ID.
 
@@ -135,7 +137,11 @@ async def get_state(
     if customer is None:
         raise ResourceNotFound()
 
-    return await customer_service.get_state(session, customer)
+    # The snapshot is already serialized, don't validate it again
+    return Response(
+        await customer_service.get_state_snapshot(session, redis, customer),
+        media_type="application/json",
+    )
 
 
 @router.get(
@@ -148,7 +154,8 @@ async def get_state_external(
     external_id: CustomerExternalID,
     auth_subject: auth.CustomerRead,
     session: AsyncSession = Depends(get_db_session),
-) -> CustomerState:
+    redis: Redis = Depends(get_redis),
+) -> Response:
     """
     Get a customer state by external ID.
 
@@ -163,7 +170,11 @@ async def get_state_external(
     if customer is None:
         raise ResourceNotFound()
 
-    return await customer_service.get_state(session, customer)
+    # The snapshot is already serialized, don't validate it again
+    return Response(
+        await customer_service.get_state_snapshot(session, redis, customer),
+        media_type="application/json",
+    )
 
 
 @router.post(
@@ -1,7 +1,7 @@
 from typing import Any
 from uuid import UUID
 
-from sqlalchemy import Select, func, select
+from sqlalchemy import Select, func, select, update
 
 from polar.auth.models import AuthSubject, Organization, User, is_organization, is_user
 from polar.kit.repository import (
@@ -42,6 +42,7 @@ class CustomerRepository(
         flush: bool = False,
     ) -> Customer:
         customer = await super().update(object, update_dict=update_dict, flush=flush)
+        await self.bump_state_version(customer.id)
         enqueue_job("customer.webhook", WebhookEventType.customer_updated, customer.id)
         return customer
 
@@ -55,9 +56,29 @@ class CustomerRepository(
             customer.user_metadata = user_metadata
             customer.external_id = None
 
+        await self.bump_state_version(customer.id)
         enqueue_job("customer.webhook", WebhookEventType.customer_deleted, customer.id)
         return customer
 
+    async def bump_state_version(self, customer_id: UUID) -> None:
+        """
+        Mark the customer state as changed, invalidating its snapshot.
+
+        The increment is done in SQL, so it's part of the current transaction
+        and concurrent changes can't be lost.
+        """
+        statement = (
+            update(Customer)
+            .where(Customer.id == customer_id)
+            .values(
+                state_version=Customer.state_version + 1,
+                # Not a change of the customer itself
+                modified_at=Customer.modified_at,
+            )
+            .execution_options(synchronize_session="fetch")
+        )
+        await self.session.execute(statement)
+
     async def get_by_id_and_organization(
         self, id: UUID, organization_id: UUID
     ) -> Customer | None:
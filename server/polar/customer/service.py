@@ -16,6 +16,7 @@ from polar.models import BenefitGrant, Customer, Organization, User
 from polar.models.webhook_endpoint import CustomerWebhookEventType, WebhookEventType
 from polar.organization.resolver import get_payload_organization
 from polar.postgres import AsyncSession
+from polar.redis import Redis
 from polar.subscription.repository import SubscriptionRepository
 from polar.webhook.service import webhook as webhook_service
 from polar.webhook.webhooks import WebhookPayloadTypeAdapter
@@ -25,6 +26,7 @@ from .repository import CustomerRepository
 from .schemas.customer import CustomerCreate, CustomerUpdate
 from .schemas.state import CustomerState
 from .sorting import CustomerSortProperty
+from .state_cache import CustomerStateCache
 
 
 class CustomerService:
@@ -232,6 +234,23 @@ class CustomerService:
 
         return CustomerState.model_validate(customer)
 
+    async def get_state_snapshot(
+        self, session: AsyncSession, redis: Redis, customer: Customer
+    ) -> str:
+        """
+        Get the customer state, serialized as JSON.
+
+        The state is computed once per version of the customer state,
+        and then served from the cache until it changes again.
+        """
+        state_cache = CustomerStateCache(redis)
+        state_json = await state_cache.get(customer)
+        if state_json is None:
+            state = await self.get_state(session, customer)
+            state_json = state.model_dump_json()
+            await state_cache.set(customer, state_json)
+        return state_json
+
     async def get_or_create_from_stripe_customer(
         self,
         session: AsyncSession,
@@ -282,12 +301,15 @@ class CustomerService:
     async def webhook(
         self,
         session: AsyncSession,
+        redis: Redis,
         event_type: CustomerWebhookEventType,
         customer: Customer,
     ) -> None:
         data: CustomerState | Customer
         if event_type == WebhookEventType.customer_state_changed:
-            data = await self.get_state(session, customer)
+            data = CustomerState.model_validate_json(
+                await self.get_state_snapshot(session, redis, customer)
+            )
         else:
             data = customer
 
@@ -306,7 +328,7 @@ class CustomerService:
             WebhookEventType.customer_deleted,
         ):
             await self.webhook(
-                session, WebhookEventType.customer_state_changed, customer
+                session, redis, WebhookEventType.customer_state_changed, customer
             )
 
 
@@ -0,0 +1,32 @@
+from polar.config import settings
+from polar.models import Customer
+from polar.redis import Redis
+
+
+class CustomerStateCache:
+    """
+    Cache of customer state snapshots, serialized as JSON.
+
+    Snapshots are keyed by customer and state version. When the state changes,
+    the version is bumped in the database, so the previous snapshot is never
+    served again and simply expires.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+    async def get(self, customer: Customer) -> str | None:
+        return await self.redis.get(self._get_key(customer))
+
+    async def set(self, customer: Customer, state_json: str) -> None:
+        await self.redis.set(
+            self._get_key(customer),
+            state_json,
+            ex=settings.CUSTOMER_STATE_CACHE_TTL,
+        )
+
+    def _get_key(self, customer: Customer) -> str:
+        return f"polar:customer_state:{customer.id}:{customer.state_version}"
+
+
+__all__ = ["CustomerStateCache"]
@@ -9,6 +9,7 @@ from polar.worker import (
     AsyncSessionMaker,
     JobContext,
     PolarWorkerContext,
+    get_worker_redis,
     task,
 )
 
@@ -44,4 +45,6 @@ async def customer_webhook(
         if customer is None:
             raise CustomerDoesNotExist(customer_id)
 
-        await customer_service.webhook(session, event_type, customer)
+        await customer_service.webhook(
+            session, get_worker_redis(ctx), event_type, customer
+        )
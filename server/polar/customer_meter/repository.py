@@ -1,11 +1,16 @@
+from collections.abc import Sequence
+from typing import Any
 from uuid import UUID
 
+from sqlalchemy.dialects import postgresql
+
 from polar.kit.repository import (
     RepositoryBase,
     RepositorySoftDeletionIDMixin,
     RepositorySoftDeletionMixin,
 )
 from polar.kit.repository.base import Options
+from polar.kit.utils import utc_now
 from polar.models import CustomerMeter
 
 
@@ -32,3 +37,50 @@ class CustomerMeterRepository(
             .options(*options)
         )
         return await self.get_one_or_none(statement)
+
+    async def get_all_by_customer(
+        self,
+        customer_id: UUID,
+        meter_ids: Sequence[UUID],
+        *,
+        options: Options = (),
+    ) -> Sequence[CustomerMeter]:
+        statement = (
+            self.get_base_statement()
+            .where(
+                CustomerMeter.customer_id == customer_id,
+                CustomerMeter.meter_id.in_(meter_ids),
+            )
+            .options(*options)
+        )
+        return await self.get_all(statement)
+
+    async def upsert_balances(
+        self, values: Sequence[dict[str, Any]]
+    ) -> Sequence[CustomerMeter]:
+        """
+        Create or update balances of several customer meters in a single statement.
+
+        Each value is expected to contain `customer_id`, `meter_id`,
+        `units_balance` and `last_balanced_event_id`.
+        """
+        if not values:
+            return []
+
+        insert_statement = postgresql.insert(CustomerMeter).values(values)
+        statement = (
+            insert_statement.on_conflict_do_update(
+                index_elements=[CustomerMeter.customer_id, CustomerMeter.meter_id],
+                set_={
+                    "units_balance": insert_statement.excluded.units_balance,
+                    "last_balanced_event_id": (
+                        insert_statement.excluded.last_balanced_event_id
+                    ),
+                    "modified_at": utc_now(),
+                },
+            )
+            .returning(CustomerMeter)
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(statement)
+        return result.scalars().all()
@@ -1,13 +1,16 @@
+import uuid
+from collections.abc import Sequence
+from datetime import datetime
 from decimal import Decimal
+from typing import Any
 
-from sqlalchemy import or_
+from sqlalchemy import Uuid, and_, or_, select, true, type_coerce
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by, array_agg
 from sqlalchemy.orm import joinedload
 
 from polar.event.repository import EventRepository
-from polar.event.system import is_meter_credit_event
 from polar.kit.math import non_negative_running_sum
 from polar.meter.repository import MeterRepository
-from polar.meter.service import meter as meter_service
 from polar.models import Customer, CustomerMeter, Event, Meter
 from polar.models.event import EventSource
 from polar.postgres import AsyncSession
@@ -16,77 +19,137 @@ from .repository import CustomerMeterRepository
 
 
 class CustomerMeterService:
-    async def update_customer(self, session: AsyncSession, customer: Customer) -> None:
+    async def update_customer(
+        self, session: AsyncSession, customer: Customer
+    ) -> Sequence[CustomerMeter]:
         repository = MeterRepository.from_session(session)
-        statement = repository.get_base_statement().order_by(Meter.created_at.asc())
-        async for meter in repository.stream(statement):
-            await self.update_customer_meter(session, customer, meter)
+        meters = await repository.get_all_by_organization(customer.organization_id)
+        customer_meters = await self.update_customer_meters(session, customer, meters)
+        return list(customer_meters.values())
 
     async def update_customer_meter(
         self, session: AsyncSession, customer: Customer, meter: Meter
     ) -> CustomerMeter | None:
-        event_repository = EventRepository.from_session(session)
-        statement = (
-            event_repository.get_base_statement()
-            .where(
-                Event.customer == customer,
-                or_(
-                    # Events matching meter definitions
-                    event_repository.get_meter_clause(meter),
-                    # System events impacting the meter balance
-                    event_repository.get_meter_credit_clause(meter),
-                ),
-            )
-            .order_by(Event.ingested_at.asc())
-        )
+        customer_meters = await self.update_customer_meters(session, customer, [meter])
+        return customer_meters.get(meter.id)
+
+    async def update_customer_meters(
+        self, session: AsyncSession, customer: Customer, meters: Sequence[Meter]
+    ) -> dict[uuid.UUID, CustomerMeter]:
+        """
+        Incrementally update the balances of a customer for the given meters.
+
+        Only the events ingested since the last balanced event of each meter
+        are considered. The deltas of all the meters are computed in a single query
+        over the customer's events, and the balances are written in a single upsert.
+
+        Returns:
+            The customer meters, updated or not, by meter ID.
+        """
+        if not meters:
+            return {}
 
         repository = CustomerMeterRepository.from_session(session)
-        customer_meter = await repository.get_by_customer_and_meter(
-            customer.id,
-            meter.id,
-            options=(joinedload(CustomerMeter.last_balanced_event),),
+        customer_meters: dict[uuid.UUID, CustomerMeter] = {
+            customer_meter.meter_id: customer_meter
+            for customer_meter in await repository.get_all_by_customer(
+                customer.id,
+                [meter.id for meter in meters],
+                options=(joinedload(CustomerMeter.last_balanced_event),),
+            )
+        }
+
+        checkpoints: dict[uuid.UUID, datetime | None] = {}
+        for meter in meters:
+            customer_meter = customer_meters.get(meter.id)
+            checkpoints[meter.id] = (
+                customer_meter.last_balanced_event.ingested_at
+                if customer_meter is not None
+                and customer_meter.last_balanced_event is not None
+                else None
+            )
+
+        event_repository = EventRepository.from_session(session)
+        columns: list[Any] = []
+        for meter in meters:
+            checkpoint = checkpoints[meter.id]
+            new_event_clause = (
+                Event.ingested_at > checkpoint if checkpoint is not None else true()
+            )
+            meter_clause = and_(
+                new_event_clause, event_repository.get_meter_clause(meter)
+            )
+            credit_clause = and_(
+                new_event_clause, event_repository.get_meter_credit_clause(meter)
+            )
+            columns += [
+                # Usage units
+                meter.aggregation.get_sql_column(Event).filter(
+                    meter_clause, Event.source == EventSource.user
+                ),
+                # Credited units, in order, to compute a non-negative running sum
+                array_agg(
+                    aggregate_order_by(
+                        Event.user_metadata["units"].as_integer(),
+                        Event.ingested_at.asc(),
+                    )
+                ).filter(credit_clause),
+                # Last event impacting the balance
+                type_coerce(
+                    array_agg(
+                        aggregate_order_by(Event.id, Event.ingested_at.desc())
+                    ).filter(or_(meter_clause, credit_clause)),
+                    ARRAY(Uuid),
+                )[1],
+            ]
+
+        statement = select(*columns).where(
+            Event.organization_id == customer.organization_id,
+            Event.customer == customer,
         )
-        if (
-            customer_meter is not None
-            and customer_meter.last_balanced_event is not None
-        ):
+        # Skip events older than all the checkpoints
+        if all(checkpoint is not None for checkpoint in checkpoints.values()):
             statement = statement.where(
-                Event.ingested_at > customer_meter.last_balanced_event.ingested_at
+                Event.ingested_at
+                > min(checkpoint for checkpoint in checkpoints.values() if checkpoint)
             )
 
-        events = await event_repository.get_all(statement)
-
-        if not events:
-            return customer_meter
-
-        if customer_meter is None:
-            customer_meter = await repository.create(
-                CustomerMeter(customer=customer, meter=meter)
+        result = await session.execute(statement)
+        row = result.one()
+
+        balances: list[dict[str, Any]] = []
+        for index, meter in enumerate(meters):
+            usage_units, credits, last_event_id = row[index * 3 : index * 3 + 3]
+            # No new event for this meter
+            if last_event_id is None:
+                continue
+
+            customer_meter = customer_meters.get(meter.id)
+            units_balance = (
+                customer_meter.units_balance
+                if customer_meter is not None
+                else Decimal(0)
             )
+            credited_units = non_negative_running_sum(iter(credits or []))
 
-        usage_events = [
-            event.id for event in events if event.source == EventSource.user
-        ]
-        usage_units = await meter_service.get_quantity(session, meter, usage_events)
-
-        credit_events = [event for event in events if is_meter_credit_event(event)]
-        credited_units = non_negative_running_sum(
-            event.user_metadata["units"] for event in credit_events
-        )
+            # 👟
+            new_balance = max(
+                Decimal(0),
+                units_balance + Decimal(usage_units or 0) - credited_units,
+            )
+            balances.append(
+                {
+                    "customer_id": customer.id,
+                    "meter_id": meter.id,
+                    "units_balance": new_balance,
+                    "last_balanced_event_id": last_event_id,
+                }
+            )
 
-        # 👟
-        new_balance = max(
-            Decimal(0),
-            customer_meter.units_balance + Decimal(usage_units) - credited_units,
-        )
+        for customer_meter in await repository.upsert_balances(balances):
+            customer_meters[customer_meter.meter_id] = customer_meter
 
-        return await repository.update(
-            customer_meter,
-            update_dict={
-                "units_balance": new_balance,
-                "last_balanced_event": events[-1],
-            },
-        )
+        return customer_meters
 
 
 customer_meter = CustomerMeterService()
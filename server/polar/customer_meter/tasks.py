@@ -2,7 +2,13 @@ import uuid
 
 from polar.customer.repository import CustomerRepository
 from polar.exceptions import PolarTaskError
-from polar.worker import AsyncSessionMaker, JobContext, PolarWorkerContext, task
+from polar.worker import (
+    AsyncSessionMaker,
+    JobContext,
+    PolarWorkerContext,
+    QueueName,
+    task,
+)
 
 from .service import customer_meter as customer_meter_service
 
@@ -17,7 +23,7 @@ class CustomerDoesNotExist(CustomerMeterTaskError):
         super().__init__(message)
 
 
-@task("customer_meter.update_customer")
+@task("customer_meter.update_customer", queue=QueueName.bulk)
 async def update_customer(
     ctx: JobContext, customer_id: uuid.UUID, polar_context: PolarWorkerContext
 ) -> None:
@@ -1,10 +1,4 @@
-from fastapi import Depends
-from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-
-from polar.models import CustomerSession
-from polar.postgres import AsyncSession, get_db_session
-
-from .service import customer_session as customer_session_service
+from fastapi.security import HTTPBearer
 
 auth_header_scheme = HTTPBearer(
     scheme_name="customer_session",
@@ -16,17 +10,3 @@ auth_header_scheme = HTTPBearer(
         "[Create Customer Session endpoint](/api-reference/customer-portal/sessions/create)."
     ),
 )
-
-
-async def get_optional_customer_session_token(
-    auth_header: HTTPAuthorizationCredentials | None = Depends(auth_header_scheme),
-    session: AsyncSession = Depends(get_db_session),
-) -> tuple[CustomerSession | None, bool]:
-    if auth_header is None:
-        return None, False
-
-    token = await customer_session_service.get_by_token(
-        session, auth_header.credentials
-    )
-
-    return token, True
@@ -5,6 +5,7 @@ from sqlalchemy import delete, select
 from sqlalchemy.orm import joinedload
 
 from polar.auth.models import AuthSubject, Organization, User
+from polar.auth.token_cache import enqueue_token_cache_invalidation
 from polar.config import settings
 from polar.customer.repository import CustomerRepository
 from polar.enums import TokenType
@@ -113,6 +114,7 @@ class CustomerSessionService(ResourceServiceReader[CustomerSession]):
             return False
 
         await session.delete(customer_session)
+        enqueue_token_cache_invalidation(customer_session.token)
 
         log.info(
             "Revoke leaked customer session token",
@@ -1,20 +1,180 @@
+import asyncio
+import itertools
 import json
-import subprocess
 from typing import Any
 
+import structlog
+
 from polar.config import settings
+from polar.logging import Logger
+
+log: Logger = structlog.get_logger()
+
+# Rendered emails are sent back on a single line
+_STREAM_LIMIT = 16 * 1024 * 1024
+
+
+class EmailRendererError(Exception): ...
+
+
+class _EmailRendererProcess:
+    """
+    A long-lived renderer process, running the binary in `--serve` mode.
+
+    Requests and responses are JSON objects, one per line, matched by ID:
+    the process renders them concurrently and answers in completion order.
+    """
+
+    def __init__(self, process: asyncio.subprocess.Process) -> None:
+        self.process = process
+        self._pending: dict[int, asyncio.Future[str]] = {}
+        self._reader = asyncio.create_task(self._read())
+
+    @classmethod
+    async def start(cls) -> "_EmailRendererProcess":
+        process = await asyncio.create_subprocess_exec(
+            settings.EMAIL_RENDERER_BINARY_PATH,
+            "--serve",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=_STREAM_LIMIT,
+        )
+        return cls(process)
+
+    @property
+    def alive(self) -> bool:
+        return self.process.returncode is None and not self._reader.done()
+
+    @property
+    def load(self) -> int:
+        return len(self._pending)
+
+    async def render(self, id: int, template: str, props: dict[str, Any]) -> str:
+        assert self.process.stdin is not None
+        future = asyncio.get_running_loop().create_future()
+        self._pending[id] = future
+        try:
+            request = {"id": id, "template": template, "props": props}
+            self.process.stdin.write(json.dumps(request).encode("utf-8") + b"\n")
+            await self.process.stdin.drain()
+            return await asyncio.wait_for(
+                future, settings.EMAIL_RENDERER_TIMEOUT.total_seconds()
+            )
+        finally:
+            self._pending.pop(id, None)
+
+    async def close(self) -> None:
+        assert self.process.stdin is not None
+        if self.process.returncode is None:
+            self.process.stdin.close()
+            try:
+                await asyncio.wait_for(self.process.wait(), 5)
+            except TimeoutError:
+                self.process.kill()
+                await self.process.wait()
+        await self._reader
+
+    async def _read(self) -> None:
+        assert self.process.stdout is not None
+        while True:
+            try:
+                line = await self.process.stdout.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+            except ValueError as e:
+                # Unreadable output, we can't match responses anymore
+                log.error("email.renderer.invalid_output", error=str(e))
+                self.process.kill()
+                break
+            future = self._pending.get(response.get("id"))
+            if future is None or future.done():
+                continue
+            if "error" in response:
+                future.set_exception(
+                    EmailRendererError(
+                        f"Error in react-email process: {response['error']}"
+                    )
+                )
+            else:
+                future.set_result(response["html"])
+
+        returncode = await self.process.wait()
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(
+                    EmailRendererError(
+                        f"react-email process exited with code {returncode}"
+                    )
+                )
+
+
+class EmailRendererPool:
+    """
+    Pool of long-lived renderer processes, started on demand.
+
+    Each render is sent to the least loaded process, so templates are rendered
+    concurrently without spawning a process per email.
+    Processes that exited are replaced on the next render.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._processes: list[_EmailRendererProcess] = []
+        self._lock = asyncio.Lock()
+        self._ids = itertools.count()
+
+    async def render(self, template: str, props: dict[str, Any]) -> str:
+        process = await self._get_process()
+        return await process.render(next(self._ids), template, props)
+
+    async def close(self) -> None:
+        async with self._lock:
+            processes, self._processes = self._processes, []
+        await asyncio.gather(*(process.close() for process in processes))
+
+    async def _get_process(self) -> _EmailRendererProcess:
+        async with self._lock:
+            self._processes = [p for p in self._processes if p.alive]
+            process = min(self._processes, key=lambda p: p.load, default=None)
+            if process is None or (
+                process.load > 0 and len(self._processes) < self.size
+            ):
+                log.debug("email.renderer.start", pool_size=len(self._processes) + 1)
+                process = await _EmailRendererProcess.start()
+                self._processes.append(process)
+            return process
+
+
+_pool: EmailRendererPool | None = None
+_pool_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _get_pool() -> EmailRendererPool:
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    # Processes pipes are bound to the event loop they were created in
+    if _pool is None or _pool_loop is not loop:
+        _pool = EmailRendererPool(settings.EMAIL_RENDERER_POOL_SIZE)
+        _pool_loop = loop
+    return _pool
+
+
+async def render_email_template(template: str, props: dict[str, Any]) -> str:
+    return await _get_pool().render(template, props)
 
 
-def render_email_template(template: str, props: dict[str, Any]) -> str:
-    process = subprocess.Popen(
-        [settings.EMAIL_RENDERER_BINARY_PATH, template, json.dumps(props)],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-    )
-    stdout, stderr = process.communicate()
-    if process.returncode != 0:
-        raise Exception(f"Error in react-email process: {stderr.decode('utf-8')}")
-    return stdout.decode("utf-8")
+async def close_email_renderer_pool() -> None:
+    global _pool, _pool_loop
+    if _pool is not None and _pool_loop is asyncio.get_running_loop():
+        await _pool.close()
+    _pool = None
+    _pool_loop = None
 
 
-__all__ = ["render_email_template"]
+__all__ = [
+    "EmailRendererError",
+    "EmailRendererPool",
+    "close_email_renderer_pool",
+    "render_email_template",
+]
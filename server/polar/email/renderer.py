@@ -1,5 +1,6 @@
 import datetime
-from collections.abc import Mapping
+import json
+from collections.abc import Mapping, Sequence
 from typing import Any
 
 from jinja2 import (
@@ -8,11 +9,14 @@ from jinja2 import (
     PackageLoader,
     PrefixLoader,
     StrictUndefined,
+    Template,
     select_autoescape,
 )
 
 EMAIL_TEMPLATES_FOLDER_NAME = "email_templates"
 
+_STRING_TEMPLATES_CACHE_MAX_SIZE = 1024
+
 
 class EmailRenderer:
     def __init__(self, extras_templates_packages: Mapping[str, str] = {}) -> None:
@@ -44,12 +48,20 @@ class EmailRenderer:
             ),
             autoescape=select_autoescape(),
             undefined=StrictUndefined,
+            # Templates are packaged with the code, they don't change at runtime
+            auto_reload=False,
         )
+        self._string_templates: dict[str, Template] = {}
+
+    def precompile(self) -> None:
+        """Compile all the package templates, so the first emails don't pay for it."""
+        for name in self.env.list_templates():
+            self.env.get_template(name)
 
     def render_from_string(
         self, subject: str, body: str, context: dict[str, Any]
     ) -> tuple[str, str]:
-        rendered_subject = self.env.from_string(subject).render(context).strip()
+        rendered_subject = self._from_string(subject).render(context).strip()
 
         wrapped_body = f"""
         {{% extends 'base.html' %}}
@@ -61,18 +73,61 @@ class EmailRenderer:
 
         context["current_year"] = datetime.datetime.now().year
 
-        rendered_body = self.env.from_string(wrapped_body).render(context).strip()
+        rendered_body = self._from_string(wrapped_body).render(context).strip()
         return rendered_subject, rendered_body
 
+    def render_batch_from_string(
+        self, emails: Sequence[tuple[str, str, dict[str, Any]]]
+    ) -> list[tuple[str, str]]:
+        """
+        Render several emails from their subject, body and context.
+
+        Identical emails, like a notification sent to all the members
+        of an organization, are rendered only once.
+        """
+        rendered: dict[str, tuple[str, str]] = {}
+        results: list[tuple[str, str]] = []
+        for subject, body, context in emails:
+            key = json.dumps([subject, body, context], sort_keys=True, default=str)
+            if key not in rendered:
+                rendered[key] = self.render_from_string(subject, body, context)
+            results.append(rendered[key])
+        return results
+
     def render_from_template(
         self, subject: str, body_template: str, context: dict[str, Any]
     ) -> tuple[str, str]:
-        rendered_subject = self.env.from_string(subject).render(context).strip()
+        rendered_subject = self._from_string(subject).render(context).strip()
         rendered_body = self.env.get_template(body_template).render(context).strip()
         return rendered_subject, rendered_body
 
+    def _from_string(self, source: str) -> Template:
+        """Compile a template from a string, or get it from the cache."""
+        template = self._string_templates.get(source)
+        if template is None:
+            if len(self._string_templates) >= _STRING_TEMPLATES_CACHE_MAX_SIZE:
+                self._string_templates.clear()
+            template = self.env.from_string(source)
+            self._string_templates[source] = template
+        return template
+
+
+_email_renderers: dict[frozenset[tuple[str, str]], EmailRenderer] = {}
+
 
 def get_email_renderer(
     extras_templates_packages: Mapping[str, str] = {},
 ) -> EmailRenderer:
-    return EmailRenderer(extras_templates_packages)
+    """
+    Get the renderer for a set of templates packages.
+
+    Renderers are created once per process and reused, with their templates
+    compiled upfront.
+    """
+    key = frozenset(extras_templates_packages.items())
+    email_renderer = _email_renderers.get(key)
+    if email_renderer is None:
+        email_renderer = EmailRenderer(extras_templates_packages)
+        email_renderer.precompile()
+        _email_renderers[key] = email_renderer
+    return email_renderer
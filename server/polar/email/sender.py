@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from collections.abc import Sequence
+from typing import Any, TypedDict
 
 import httpx
 import structlog
@@ -8,7 +9,7 @@ from polar.config import EmailSender as EmailSenderType
 from polar.config import settings
 from polar.exceptions import PolarError
 from polar.logging import Logger
-from polar.worker import enqueue_job
+from polar.worker import enqueue_batched_job
 
 log: Logger = structlog.get_logger()
 
@@ -22,9 +23,37 @@ class EmailSenderError(PolarError): ...
 
 
 class SendEmailError(EmailSenderError):
-    def __init__(self, message: str) -> None:
+    def __init__(
+        self, message: str, *, provider_status_code: int | None = None
+    ) -> None:
+        self.provider_status_code = provider_status_code
         super().__init__(message)
 
+    @property
+    def is_rejected(self) -> bool:
+        """Whether the provider rejected the request itself, so retrying is useless."""
+        return (
+            self.provider_status_code is not None
+            and 400 <= self.provider_status_code < 500
+            and self.provider_status_code != 429
+        )
+
+    @property
+    def is_invalid(self) -> bool:
+        """Whether the provider failed to validate the emails we sent."""
+        return self.provider_status_code == 422
+
+
+class Email(TypedDict):
+    to_email_addr: str
+    subject: str
+    html_content: str
+    from_name: str
+    from_email_addr: str
+    email_headers: dict[str, str]
+    reply_to_name: str | None
+    reply_to_email_addr: str | None
+
 
 class EmailSender(ABC):
     @abstractmethod
@@ -42,6 +71,18 @@ class EmailSender(ABC):
     ) -> None:
         pass
 
+    async def send_batch(
+        self, emails: Sequence[Email], *, idempotency_key: str | None = None
+    ) -> None:
+        """
+        Send several emails at once.
+
+        By default, they're sent one by one. Senders supporting it
+        should send them in a single request.
+        """
+        for email in emails:
+            await self.send(**email)
+
 
 class LoggingEmailSender(EmailSender):
     async def send(
@@ -70,7 +111,13 @@ class LoggingEmailSender(EmailSender):
 class ResendEmailSender(EmailSender):
     def __init__(self) -> None:
         super().__init__()
-        self._api_key = settings.RESEND_API_KEY
+        # Shared by all the emails sent by the process, so connections are reused
+        self._client = httpx.AsyncClient(
+            base_url="https://api.resend.com",
+            headers={"Authorization": f"Bearer {settings.RESEND_API_KEY}"},
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+            timeout=httpx.Timeout(20.0, connect=5.0),
+        )
 
     async def send(
         self,
@@ -84,35 +131,29 @@ class ResendEmailSender(EmailSender):
         reply_to_name: str | None = DEFAULT_REPLY_TO_NAME,
         reply_to_email_addr: str | None = DEFAULT_REPLY_TO_EMAIL_ADDRESS,
     ) -> None:
-        payload: dict[str, Any] = {
-            "from": f"{from_name} <{from_email_addr}>",
-            "to": [to_email_addr],
-            "subject": subject,
-            "html": html_content,
-            "headers": email_headers,
-        }
-        if reply_to_name and reply_to_email_addr:
-            payload["reply_to"] = f"{reply_to_name} <{reply_to_email_addr}>"
-
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    "https://api.resend.com/emails",
-                    headers={
-                        "Authorization": f"Bearer {self._api_key}",
-                    },
-                    json=payload,
-                )
-                response.raise_for_status()
-                email = response.json()
-            except httpx.HTTPError as e:
-                log.warning(
-                    "resend.send_error",
-                    to_email_addr=to_email_addr,
-                    subject=subject,
-                    error=e,
-                )
-                raise SendEmailError(str(e)) from e
+        payload = self._get_payload(
+            {
+                "to_email_addr": to_email_addr,
+                "subject": subject,
+                "html_content": html_content,
+                "from_name": from_name,
+                "from_email_addr": from_email_addr,
+                "email_headers": email_headers,
+                "reply_to_name": reply_to_name,
+                "reply_to_email_addr": reply_to_email_addr,
+            }
+        )
+
+        try:
+            email = await self._request("/emails", payload)
+        except SendEmailError as e:
+            log.warning(
+                "resend.send_error",
+                to_email_addr=to_email_addr,
+                subject=subject,
+                error=e,
+            )
+            raise
 
         log.info(
             "resend.send",
@@ -121,13 +162,67 @@ class ResendEmailSender(EmailSender):
             email_id=email["id"],
         )
 
+    async def send_batch(
+        self, emails: Sequence[Email], *, idempotency_key: str | None = None
+    ) -> None:
+        try:
+            response = await self._request(
+                "/emails/batch",
+                [self._get_payload(email) for email in emails],
+                idempotency_key=idempotency_key,
+            )
+        except SendEmailError as e:
+            log.warning("resend.send_batch_error", count=len(emails), error=e)
+            raise
 
-def get_email_sender() -> EmailSender:
-    if settings.EMAIL_SENDER == EmailSenderType.resend:
-        return ResendEmailSender()
+        log.info(
+            "resend.send_batch",
+            count=len(emails),
+            email_ids=[email["id"] for email in response["data"]],
+        )
 
-    # Logging in development
-    return LoggingEmailSender()
+    def _get_payload(self, email: Email) -> dict[str, Any]:
+        payload: dict[str, Any] = {
+            "from": f"{email['from_name']} <{email['from_email_addr']}>",
+            "to": [email["to_email_addr"]],
+            "subject": email["subject"],
+            "html": email["html_content"],
+            "headers": email["email_headers"],
+        }
+        if email["reply_to_name"] and email["reply_to_email_addr"]:
+            payload["reply_to"] = (
+                f"{email['reply_to_name']} <{email['reply_to_email_addr']}>"
+            )
+        return payload
+
+    async def _request(
+        self, path: str, payload: Any, *, idempotency_key: str | None = None
+    ) -> Any:
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else {}
+        try:
+            response = await self._client.post(path, json=payload, headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise SendEmailError(
+                str(e), provider_status_code=e.response.status_code
+            ) from e
+        except httpx.HTTPError as e:
+            raise SendEmailError(str(e)) from e
+        return response.json()
+
+
+_email_sender: EmailSender | None = None
+
+
+def get_email_sender() -> EmailSender:
+    global _email_sender
+    if _email_sender is None:
+        if settings.EMAIL_SENDER == EmailSenderType.resend:
+            _email_sender = ResendEmailSender()
+        # Logging in development
+        else:
+            _email_sender = LoggingEmailSender()
+    return _email_sender
 
 
 def enqueue_email(
@@ -140,14 +235,19 @@ def enqueue_email(
     reply_to_name: str | None = DEFAULT_REPLY_TO_NAME,
     reply_to_email_addr: str | None = DEFAULT_REPLY_TO_EMAIL_ADDRESS,
 ) -> None:
-    enqueue_job(
-        "email.send",
-        to_email_addr=to_email_addr,
-        subject=subject,
-        html_content=html_content,
-        from_name=from_name,
-        from_email_addr=from_email_addr,
-        email_headers=email_headers,
-        reply_to_name=reply_to_name,
-        reply_to_email_addr=reply_to_email_addr,
-    )
+    """
+    Enqueue an email to be sent by a worker.
+
+    Emails enqueued in the same request or task are sent by batches.
+    """
+    email: Email = {
+        "to_email_addr": to_email_addr,
+        "subject": subject,
+        "html_content": html_content,
+        "from_name": from_name,
+        "from_email_addr": from_email_addr,
+        "email_headers": email_headers,
+        "reply_to_name": reply_to_name,
+        "reply_to_email_addr": reply_to_email_addr,
+    }
+    enqueue_batched_job("email.send_batch", email, batch_size=settings.EMAIL_BATCH_SIZE)
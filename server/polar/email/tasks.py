@@ -1,8 +1,18 @@
+import structlog
 from arq import Retry
 
-from polar.worker import JobContext, PolarWorkerContext, compute_backoff, task
+from polar.logging import Logger
+from polar.worker import (
+    JobContext,
+    PolarWorkerContext,
+    compute_backoff,
+    enqueue_job,
+    task,
+)
 
-from .sender import SendEmailError, get_email_sender
+from .sender import Email, SendEmailError, get_email_sender
+
+log: Logger = structlog.get_logger()
 
 
 @task("email.send", max_tries=10)
@@ -33,3 +43,31 @@ async def email_send(
         )
     except SendEmailError as e:
         raise Retry(compute_backoff(ctx["job_try"])) from e
+
+
+@task("email.send_batch", max_tries=10)
+async def email_send_batch(
+    ctx: JobContext,
+    items: list[Email],
+    polar_context: PolarWorkerContext,
+) -> None:
+    email_sender = get_email_sender()
+
+    try:
+        # Retries of this job don't send the batch twice
+        await email_sender.send_batch(items, idempotency_key=ctx["job_id"])
+    except SendEmailError as e:
+        if not e.is_rejected:
+            raise Retry(compute_backoff(ctx["job_try"])) from e
+
+        # The whole request is refused, e.g. because of a bad API key or domain:
+        # sending the emails separately would fail the same way.
+        if not e.is_invalid:
+            log.error("email.send_batch.failed", count=len(items), error=str(e))
+            raise
+
+        # The provider couldn't validate the batch: likely because of one invalid
+        # email. Send them separately, so the valid ones go through on their own.
+        log.warning("email.send_batch.invalid", count=len(items), error=str(e))
+        for email in items:
+            enqueue_job("email.send", **email)
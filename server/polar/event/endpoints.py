@@ -1,8 +1,10 @@
-from fastapi import Depends, Query
+from fastapi import Depends, Query, Request
 from pydantic import AwareDatetime
 
+from polar.config import settings
 from polar.customer.schemas.customer import CustomerID
 from polar.exceptions import ResourceNotFound
+from polar.kit.http import iter_lines
 from polar.kit.metadata import MetadataQuery, get_metadata_query_openapi_schema
 from polar.kit.pagination import ListResource, PaginationParamsQuery
 from polar.kit.schemas import MultipleQueryFilter
@@ -107,3 +109,46 @@ async def ingest(
 ) -> EventsIngestResponse:
     """Ingest batch of events."""
     return await event_service.ingest(session, auth_subject, ingest)
+
+
+@router.post(
+    "/ingest/stream",
+    summary="Ingest Events Stream",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": {
+                        "anyOf": [
+                            {"$ref": "#/components/schemas/EventCreateCustomer"},
+                            {
+                                "$ref": "#/components/schemas/EventCreateExternalCustomer"
+                            },
+                        ]
+                    }
+                }
+            },
+            "description": (
+                "Newline-delimited JSON stream of events, one event per line. "
+                "Each line accepts the same schema as an event of `POST /ingest`."
+            ),
+        }
+    },
+)
+async def ingest_stream(
+    request: Request,
+    auth_subject: auth.EventWrite,
+    session: AsyncSession = Depends(get_db_session),
+) -> EventsIngestResponse:
+    """
+    Ingest a stream of events, encoded as newline-delimited JSON.
+
+    Prefer this endpoint over `POST /ingest` for large batches:
+    events are validated and inserted by chunks as they are received.
+    """
+    return await event_service.ingest_stream(
+        session,
+        auth_subject,
+        iter_lines(request.stream(), max_line_size=settings.EVENT_INGEST_MAX_LINE_SIZE),
+    )
@@ -1,24 +1,47 @@
+import json
 from collections.abc import Sequence
 from typing import Any
 from uuid import UUID
 
+import asyncpg
 from sqlalchemy import (
+    BigInteger,
     ColumnElement,
     ColumnExpressionArgument,
     Select,
+    Text,
     and_,
+    cast,
+    func,
     insert,
+    literal,
     or_,
     select,
+    text,
+    tuple_,
 )
 
 from polar.auth.models import AuthSubject, Organization, User, is_organization, is_user
 from polar.kit.repository import RepositoryBase, RepositoryIDMixin
+from polar.kit.utils import generate_uuid, utc_now
 from polar.models import Customer, Event, Meter, UserOrganization
 from polar.models.event import EventSource
 
 from .system import SystemEvent
 
+_EVENTS_STAGING_TABLE = "events_staging"
+_EVENTS_COPY_COLUMNS = [
+    "id",
+    "ingested_at",
+    "timestamp",
+    "name",
+    "source",
+    "customer_id",
+    "external_customer_id",
+    "organization_id",
+    "user_metadata",
+]
+
 
 class EventRepository(RepositoryBase[Event], RepositoryIDMixin[Event, UUID]):
     model = Event
@@ -34,6 +57,59 @@ class EventRepository(RepositoryBase[Event], RepositoryIDMixin[Event, UUID]):
         result = await self.session.execute(statement, events)
         return result.scalars().all()
 
+    async def copy_batch(self, events: Sequence[dict[str, Any]]) -> Sequence[UUID]:
+        """
+        Insert a batch of events using PostgreSQL `COPY`.
+
+        Much faster than `insert_batch` for large batches, typically for backfills.
+        Rows are first copied into a temporary staging table, then merged into
+        `events`. IDs are generated client-side, so we don't need `RETURNING`.
+        """
+        ingested_at = utc_now()
+        records: list[tuple[Any, ...]] = []
+        event_ids: list[UUID] = []
+        for event in events:
+            event_id = event.get("id") or generate_uuid()
+            event_ids.append(event_id)
+            records.append(
+                (
+                    event_id,
+                    event.get("ingested_at") or ingested_at,
+                    event.get("timestamp") or ingested_at,
+                    event["name"],
+                    str(event.get("source", EventSource.system)),
+                    event.get("customer_id"),
+                    event.get("external_customer_id"),
+                    event["organization_id"],
+                    json.dumps(event.get("user_metadata") or {}),
+                )
+            )
+
+        await self.session.execute(
+            text(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {_EVENTS_STAGING_TABLE} "
+                "(LIKE events INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+        )
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        driver_connection: asyncpg.Connection = raw_connection.driver_connection
+        await driver_connection.copy_records_to_table(
+            _EVENTS_STAGING_TABLE, records=records, columns=_EVENTS_COPY_COLUMNS
+        )
+
+        columns = ", ".join(_EVENTS_COPY_COLUMNS)
+        await self.session.execute(
+            text(
+                f"INSERT INTO events ({columns}) "
+                f"SELECT {columns} FROM {_EVENTS_STAGING_TABLE} "
+                "ON CONFLICT (id) DO NOTHING"
+            )
+        )
+        await self.session.execute(text(f"TRUNCATE {_EVENTS_STAGING_TABLE}"))
+
+        return event_ids
+
     def get_readable_statement(
         self, auth_subject: AuthSubject[User | Organization]
     ) -> Select[tuple[Event]]:
@@ -92,6 +168,33 @@ class EventRepository(RepositoryBase[Event], RepositoryIDMixin[Event, UUID]):
             Event.user_metadata["meter_id"].astext == str(meter.id),
         )
 
+    def get_committed_clause(self) -> ColumnElement[bool]:
+        """
+        Select the events inserted by finished transactions.
+
+        No event can appear anymore below the oldest running transaction,
+        unlike below an ingestion time. Events ingested before `ingest_xid`
+        was tracked are committed.
+        """
+        finished_xid = cast(
+            cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger
+        )
+        return or_(Event.ingest_xid.is_(None), Event.ingest_xid < finished_xid)
+
+    def get_after_clause(self, event: Event) -> ColumnElement[bool]:
+        """
+        Select the events following `event` in `(ingest_xid, id)` order,
+        events without `ingest_xid` coming first.
+        """
+        if event.ingest_xid is None:
+            return or_(
+                Event.ingest_xid.is_not(None),
+                and_(Event.ingest_xid.is_(None), Event.id > event.id),
+            )
+        return tuple_(Event.ingest_xid, Event.id) > tuple_(
+            literal(event.ingest_xid), literal(event.id)
+        )
+
     def get_meter_statement(self, meter: Meter) -> Select[tuple[Event]]:
         return self.get_base_statement().where(
             Event.organization_id == meter.organization_id,
@@ -2,7 +2,7 @@ from datetime import UTC, datetime
 from typing import Annotated
 
 from fastapi import Path
-from pydantic import UUID4, AfterValidator, AwareDatetime, Field
+from pydantic import UUID4, AfterValidator, AwareDatetime, Field, TypeAdapter
 
 from polar.customer.schemas.customer import Customer
 from polar.kit.metadata import MetadataInputMixin, MetadataOutputMixin
@@ -56,6 +56,7 @@ class EventCreateExternalCustomer(EventCreateBase):
 
 
 EventCreate = EventCreateCustomer | EventCreateExternalCustomer
+EventCreateAdapter: TypeAdapter[EventCreate] = TypeAdapter[EventCreate](EventCreate)
 
 
 class EventsIngest(Schema):
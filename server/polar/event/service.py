@@ -1,11 +1,14 @@
+import itertools
 import uuid
-from collections.abc import Callable, Sequence
+from collections.abc import AsyncIterable, Callable, Sequence
 from datetime import datetime
 from typing import Any
 
+from pydantic import ValidationError as PydanticValidationError
 from sqlalchemy import UnaryExpression, asc, desc, select
 
 from polar.auth.models import AuthSubject, is_organization, is_user
+from polar.config import settings
 from polar.exceptions import PolarError, PolarRequestValidationError, ValidationError
 from polar.kit.metadata import MetadataQuery, apply_metadata_clause
 from polar.kit.pagination import PaginationParams
@@ -13,10 +16,18 @@ from polar.kit.sorting import Sorting
 from polar.models import Customer, Event, Organization, User, UserOrganization
 from polar.models.event import EventSource
 from polar.postgres import AsyncSession
-from polar.worker import enqueue_job
+from polar.redis import Redis
+from polar.result_cache import ResultCache, get_open_since
+from polar.worker import enqueue_debounced_job, enqueue_job
 
 from .repository import EventRepository
-from .schemas import EventCreateCustomer, EventsIngest, EventsIngestResponse
+from .schemas import (
+    EventCreate,
+    EventCreateAdapter,
+    EventCreateCustomer,
+    EventsIngest,
+    EventsIngestResponse,
+)
 from .sorting import EventSortProperty
 
 
@@ -107,19 +118,137 @@ class EventService:
         validate_organization_id = await self._get_organization_validation_function(
             session, auth_subject
         )
-        validate_customer_id = await self._get_customer_validation_function(
+
+        inserted: list[Sequence[uuid.UUID]] = []
+        errors: list[ValidationError] = []
+        for chunk in itertools.batched(
+            enumerate(ingest.events), settings.EVENT_INGEST_CHUNK_SIZE
+        ):
+            chunk_inserted, chunk_errors = await self._ingest_chunk(
+                session,
+                auth_subject,
+                validate_organization_id,
+                [(("body", "events", index), event) for index, event in chunk],
+                dry_run=len(errors) > 0,
+            )
+            inserted.append(chunk_inserted)
+            errors.extend(chunk_errors)
+
+        if len(errors) > 0:
+            raise PolarRequestValidationError(errors)
+
+        return EventsIngestResponse(inserted=self._enqueue_ingested(inserted))
+
+    async def ingest_stream(
+        self,
+        session: AsyncSession,
+        auth_subject: AuthSubject[User | Organization],
+        lines: AsyncIterable[bytes],
+        *,
+        copy: bool = False,
+    ) -> EventsIngestResponse:
+        """
+        Ingest events from a stream of NDJSON lines, one event per line.
+
+        Events are validated and inserted by chunks of `EVENT_INGEST_CHUNK_SIZE`,
+        so memory usage doesn't depend on the size of the stream.
+        Once an error is found, the remaining lines are still validated
+        so all the errors are reported, but nothing is inserted anymore.
+        `event.ingested` jobs are only enqueued if the whole stream is valid:
+        otherwise, the inserted chunks are rolled back with the transaction.
+
+        Set `copy` to insert chunks using PostgreSQL `COPY` instead of `INSERT`.
+        It's meant for bulk imports, like backfills of historic events.
+        """
+        validate_organization_id = await self._get_organization_validation_function(
             session, auth_subject
         )
 
+        inserted: list[Sequence[uuid.UUID]] = []
+        errors: list[ValidationError] = []
+        chunk: list[tuple[tuple[int | str, ...], EventCreate]] = []
+        # Blank lines are skipped, but still counted in the location of errors
+        index = -1
+        async for line in lines:
+            index += 1
+            if not line.strip():
+                continue
+
+            loc: tuple[int | str, ...] = ("body", index)
+            try:
+                chunk.append((loc, EventCreateAdapter.validate_json(line)))
+            except PydanticValidationError as e:
+                errors.extend(
+                    {
+                        "type": error["type"],
+                        "msg": error["msg"],
+                        "loc": (*loc, *error["loc"]),
+                        "input": error["input"],
+                    }
+                    for error in e.errors()
+                )
+
+            if len(chunk) >= settings.EVENT_INGEST_CHUNK_SIZE:
+                chunk_inserted, chunk_errors = await self._ingest_chunk(
+                    session,
+                    auth_subject,
+                    validate_organization_id,
+                    chunk,
+                    dry_run=len(errors) > 0,
+                    copy=copy,
+                )
+                inserted.append(chunk_inserted)
+                errors.extend(chunk_errors)
+                chunk = []
+
+        if len(chunk) > 0:
+            chunk_inserted, chunk_errors = await self._ingest_chunk(
+                session,
+                auth_subject,
+                validate_organization_id,
+                chunk,
+                dry_run=len(errors) > 0,
+                copy=copy,
+            )
+            inserted.append(chunk_inserted)
+            errors.extend(chunk_errors)
+
+        if len(errors) > 0:
+            raise PolarRequestValidationError(errors)
+
+        return EventsIngestResponse(inserted=self._enqueue_ingested(inserted))
+
+    async def _ingest_chunk(
+        self,
+        session: AsyncSession,
+        auth_subject: AuthSubject[User | Organization],
+        validate_organization_id: Callable[
+            [tuple[int | str, ...], uuid.UUID | None], uuid.UUID
+        ],
+        chunk: Sequence[tuple[tuple[int | str, ...], EventCreate]],
+        *,
+        dry_run: bool = False,
+        copy: bool = False,
+    ) -> tuple[Sequence[uuid.UUID], Sequence[ValidationError]]:
+        validate_customer_id = await self._get_customer_validation_function(
+            session,
+            auth_subject,
+            {
+                event_create.customer_id
+                for _, event_create in chunk
+                if isinstance(event_create, EventCreateCustomer)
+            },
+        )
+
         events: list[dict[str, Any]] = []
         errors: list[ValidationError] = []
-        for index, event_create in enumerate(ingest.events):
+        for loc, event_create in chunk:
             try:
                 organization_id = validate_organization_id(
-                    index, event_create.organization_id
+                    loc, event_create.organization_id
                 )
                 if isinstance(event_create, EventCreateCustomer):
-                    validate_customer_id(index, event_create.customer_id)
+                    validate_customer_id(loc, event_create.customer_id)
             except EventIngestValidationError as e:
                 errors.extend(e.errors)
                 continue
@@ -134,20 +263,44 @@ class EventService:
                     }
                 )
 
-        if len(errors) > 0:
-            raise PolarRequestValidationError(errors)
+        # Don't bother inserting if the whole ingestion is going to be rejected
+        if dry_run or len(errors) > 0 or len(events) == 0:
+            return [], errors
 
         repository = EventRepository.from_session(session)
-        event_ids = await repository.insert_batch(events)
-
-        enqueue_job("event.ingested", event_ids=event_ids)
-
-        return EventsIngestResponse(inserted=len(events))
+        if copy:
+            event_ids = await repository.copy_batch(events)
+        else:
+            event_ids = await repository.insert_batch(events)
+
+        return event_ids, errors
+
+    def _enqueue_ingested(self, inserted: Sequence[Sequence[uuid.UUID]]) -> int:
+        """
+        Enqueue an `event.ingested` job per inserted chunk, once the ingestion
+        is known to succeed. Jobs are only sent after the transaction is committed.
+        """
+        count = 0
+        for event_ids in inserted:
+            if event_ids:
+                enqueue_job("event.ingested", event_ids=event_ids)
+                count += len(event_ids)
+        return count
 
     async def ingested(
-        self, session: AsyncSession, event_ids: Sequence[uuid.UUID]
+        self, session: AsyncSession, redis: Redis, event_ids: Sequence[uuid.UUID]
     ) -> None:
         repository = EventRepository.from_session(session)
+
+        # Cached results of closed periods are stale if events landed in them
+        backdated_statement = (
+            select(Event.organization_id)
+            .distinct()
+            .where(Event.id.in_(event_ids), Event.timestamp < get_open_since())
+        )
+        result = await session.execute(backdated_statement)
+        await ResultCache(redis).invalidate(result.scalars().all())
+
         statement = repository.get_base_statement().where(
             Event.id.in_(event_ids), Event.customer.is_not(None)
         )
@@ -158,15 +311,20 @@ class EventService:
             customers.add(event.customer)
 
         for customer in customers:
-            enqueue_job("customer_meter.update_customer", customer_id=customer.id)
+            enqueue_debounced_job(
+                "customer_meter.update_customer",
+                debounce_key=str(customer.id),
+                debounce_window=settings.CUSTOMER_METER_UPDATE_DEBOUNCE,
+                customer_id=customer.id,
+            )
 
     async def _get_organization_validation_function(
         self, session: AsyncSession, auth_subject: AuthSubject[User | Organization]
-    ) -> Callable[[int, uuid.UUID | None], uuid.UUID]:
+    ) -> Callable[[tuple[int | str, ...], uuid.UUID | None], uuid.UUID]:
         if is_organization(auth_subject):
 
             def _validate_organization_id_by_organization(
-                index: int, organization_id: uuid.UUID | None
+                loc: tuple[int | str, ...], organization_id: uuid.UUID | None
             ) -> uuid.UUID:
                 if organization_id is not None:
                     raise EventIngestValidationError(
@@ -177,7 +335,7 @@ class EventService:
                                     "Setting organization_id is disallowed "
                                     "when using an organization token."
                                 ),
-                                "loc": ("body", "events", index, "organization_id"),
+                                "loc": (*loc, "organization_id"),
                                 "input": organization_id,
                             }
                         ]
@@ -198,7 +356,7 @@ class EventService:
         allowed_organizations = set(result.scalars().all())
 
         def _validate_organization_id_by_user(
-            index: int, organization_id: uuid.UUID | None
+            loc: tuple[int | str, ...], organization_id: uuid.UUID | None
         ) -> uuid.UUID:
             if organization_id is None:
                 raise EventIngestValidationError(
@@ -206,7 +364,7 @@ class EventService:
                         {
                             "type": "missing",
                             "msg": "organization_id is required.",
-                            "loc": ("body", "events", index, "organization_id"),
+                            "loc": (*loc, "organization_id"),
                             "input": None,
                         }
                     ]
@@ -217,7 +375,7 @@ class EventService:
                         {
                             "type": "organization_id",
                             "msg": "Organization not found.",
-                            "loc": ("body", "events", index, "organization_id"),
+                            "loc": (*loc, "organization_id"),
                             "input": organization_id,
                         }
                     ]
@@ -228,33 +386,42 @@ class EventService:
         return _validate_organization_id_by_user
 
     async def _get_customer_validation_function(
-        self, session: AsyncSession, auth_subject: AuthSubject[User | Organization]
-    ) -> Callable[[int, uuid.UUID], uuid.UUID]:
-        statement = select(Customer.id).where(Customer.deleted_at.is_(None))
-        if is_user(auth_subject):
-            statement = statement.where(
-                Customer.organization_id.in_(
-                    select(UserOrganization.organization_id).where(
-                        UserOrganization.user_id == auth_subject.subject.id,
-                        UserOrganization.deleted_at.is_(None),
+        self,
+        session: AsyncSession,
+        auth_subject: AuthSubject[User | Organization],
+        customer_ids: set[uuid.UUID],
+    ) -> Callable[[tuple[int | str, ...], uuid.UUID], uuid.UUID]:
+        allowed_customers: set[uuid.UUID] = set()
+        if len(customer_ids) > 0:
+            statement = select(Customer.id).where(
+                Customer.deleted_at.is_(None), Customer.id.in_(customer_ids)
+            )
+            if is_user(auth_subject):
+                statement = statement.where(
+                    Customer.organization_id.in_(
+                        select(UserOrganization.organization_id).where(
+                            UserOrganization.user_id == auth_subject.subject.id,
+                            UserOrganization.deleted_at.is_(None),
+                        )
                     )
                 )
-            )
-        else:
-            statement = statement.where(
-                Customer.organization_id == auth_subject.subject.id
-            )
-        result = await session.execute(statement)
-        allowed_customers = set(result.scalars().all())
+            else:
+                statement = statement.where(
+                    Customer.organization_id == auth_subject.subject.id
+                )
+            result = await session.execute(statement)
+            allowed_customers = set(result.scalars().all())
 
-        def _validate_customer_id(index: int, customer_id: uuid.UUID) -> uuid.UUID:
+        def _validate_customer_id(
+            loc: tuple[int | str, ...], customer_id: uuid.UUID
+        ) -> uuid.UUID:
             if customer_id not in allowed_customers:
                 raise EventIngestValidationError(
                     [
                         {
                             "type": "customer_id",
                             "msg": "Customer not found.",
-                            "loc": ("body", "events", index, "customer_id"),
+                            "loc": (*loc, "customer_id"),
                             "input": customer_id,
                         }
                     ]
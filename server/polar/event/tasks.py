@@ -1,7 +1,13 @@
 import uuid
 from collections.abc import Sequence
 
-from polar.worker import AsyncSessionMaker, JobContext, PolarWorkerContext, task
+from polar.worker import (
+    AsyncSessionMaker,
+    JobContext,
+    PolarWorkerContext,
+    get_worker_redis,
+    task,
+)
 
 from .service import event as event_service
 
@@ -11,4 +17,4 @@ async def event_ingested(
     ctx: JobContext, event_ids: Sequence[uuid.UUID], polar_context: PolarWorkerContext
 ) -> None:
     async with AsyncSessionMaker(ctx) as session:
-        await event_service.ingested(session, event_ids)
+        await event_service.ingested(session, get_worker_redis(ctx), event_ids)
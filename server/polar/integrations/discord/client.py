@@ -4,6 +4,9 @@ import httpx
 import structlog
 
 from polar.config import settings
+from polar.redis import Redis
+
+from .ratelimit import DiscordRateLimiter
 
 log = structlog.get_logger()
 
@@ -12,40 +15,45 @@ BASE_URL = "https://discord.com/api/v10"
 
 class DiscordClient:
     def __init__(self, scheme: Literal["Bot", "Bearer"], token: str) -> None:
+        # Shared by all the requests of the process, so connections are reused
         self.client = httpx.AsyncClient(
             base_url=BASE_URL,
             headers={"Authorization": f"{scheme} {token}"},
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=50),
+            timeout=httpx.Timeout(10.0, connect=5.0),
         )
 
-    async def get_me(self) -> dict[str, Any]:
-        response = await self.client.get("/users/@me")
-        self._handle_response(response)
+    async def get_me(self, redis: Redis) -> dict[str, Any]:
+        response = await self._request(redis, "GET", "/users/@me")
         return response.json()
 
-    async def get_guild(self, id: str) -> dict[str, Any]:
-        response = await self.client.get(f"/guilds/{id}")
-        self._handle_response(response)
-
+    async def get_guild(self, redis: Redis, id: str) -> dict[str, Any]:
+        response = await self._request(redis, "GET", "/guilds/{guild_id}", guild_id=id)
         return response.json()
 
     async def add_member(
         self,
+        redis: Redis,
         guild_id: str,
         discord_user_id: str,
         discord_user_access_token: str,
         role_id: str,
         nick: str | None = None,
     ) -> None:
-        endpoint = f"/guilds/{guild_id}/members/{discord_user_id}"
-
         data: dict[str, Any] = {}
         data["access_token"] = discord_user_access_token
         data["roles"] = [role_id]
         if nick:
             data["nick"] = nick
 
-        response = await self.client.put(endpoint, json=data)
-        self._handle_response(response)
+        response = await self._request(
+            redis,
+            "PUT",
+            "/guilds/{guild_id}/members/{user_id}",
+            guild_id=guild_id,
+            user_id=discord_user_id,
+            json=data,
+        )
 
         if response.status_code == 201:
             log.info(
@@ -61,6 +69,7 @@ class DiscordClient:
             discord_user_id=discord_user_id,
         )
         await self.add_member_role(
+            redis,
             guild_id=guild_id,
             discord_user_id=discord_user_id,
             role_id=role_id,
@@ -68,14 +77,19 @@ class DiscordClient:
 
     async def add_member_role(
         self,
+        redis: Redis,
         guild_id: str,
         discord_user_id: str,
         role_id: str,
     ) -> None:
-        endpoint = f"/guilds/{guild_id}/members/{discord_user_id}/roles/{role_id}"
-
-        response = await self.client.put(endpoint)
-        self._handle_response(response)
+        response = await self._request(
+            redis,
+            "PUT",
+            "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+            guild_id=guild_id,
+            user_id=discord_user_id,
+            role_id=role_id,
+        )
 
         log.info(
             "discord.add_member_role.success",
@@ -87,14 +101,19 @@ class DiscordClient:
 
     async def remove_member_role(
         self,
+        redis: Redis,
         guild_id: str,
         discord_user_id: str,
         role_id: str,
     ) -> None:
-        endpoint = f"/guilds/{guild_id}/members/{discord_user_id}/roles/{role_id}"
-
-        response = await self.client.delete(endpoint)
-        self._handle_response(response)
+        response = await self._request(
+            redis,
+            "DELETE",
+            "/guilds/{guild_id}/members/{user_id}/roles/{role_id}",
+            guild_id=guild_id,
+            user_id=discord_user_id,
+            role_id=role_id,
+        )
 
         log.info(
             "discord.remove_member_role.success",
@@ -104,6 +123,41 @@ class DiscordClient:
         )
         return None
 
+    async def _request(
+        self,
+        redis: Redis,
+        method: str,
+        path: str,
+        *,
+        json: dict[str, Any] | None = None,
+        **path_params: str,
+    ) -> httpx.Response:
+        """
+        Send a request, paced by the rate limits shared by all the processes.
+
+        Discord rate limits are per route and per major parameter, the guild,
+        so they are tracked by path template and guild ID.
+        If we still hit a rate limit, the request is retried once it's reset.
+        """
+        rate_limiter = DiscordRateLimiter(redis)
+        route = f"{method} {path}"
+        major = path_params.get("guild_id", "")
+        url = path.format(**path_params)
+
+        retries = 0
+        while True:
+            await rate_limiter.acquire(route, major)
+            response = await self.client.request(method, url, json=json)
+            await rate_limiter.update(route, major, response)
+            if (
+                response.status_code != 429
+                or retries >= settings.DISCORD_RATE_LIMIT_MAX_RETRIES
+            ):
+                break
+            retries += 1
+
+        return self._handle_response(response)
+
     def _handle_response(self, response: httpx.Response) -> httpx.Response:
         response.raise_for_status()
         return response
@@ -2,7 +2,7 @@ from typing import Any
 from uuid import UUID
 
 import structlog
-from fastapi import Request
+from fastapi import Depends, Request
 from fastapi.responses import RedirectResponse
 from httpx_oauth.oauth2 import GetAccessTokenError
 
@@ -12,6 +12,7 @@ from polar.exceptions import Unauthorized
 from polar.kit import jwt
 from polar.kit.http import ReturnTo, add_query_parameters, get_safe_return_url
 from polar.openapi import APITag
+from polar.redis import Redis, get_redis
 from polar.routing import APIRouter
 
 from . import oauth
@@ -134,7 +135,11 @@ async def discord_bot_callback(
 
 
 @router.get("/guild/lookup", response_model=DiscordGuild)
-async def discord_guild_lookup(guild_token: str, auth_subject: WebUser) -> DiscordGuild:
+async def discord_guild_lookup(
+    guild_token: str,
+    auth_subject: WebUser,
+    redis: Redis = Depends(get_redis),
+) -> DiscordGuild:
     try:
         guild_token_data = jwt.decode(
             token=guild_token,
@@ -145,4 +150,4 @@ async def discord_guild_lookup(guild_token: str, auth_subject: WebUser) -> Disco
     except (KeyError, jwt.DecodeError, jwt.ExpiredSignatureError) as e:
         raise Unauthorized() from e
 
-    return await discord_bot_service.get_guild(guild_id)
+    return await discord_bot_service.get_guild(redis, guild_id)
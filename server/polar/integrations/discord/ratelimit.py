@@ -0,0 +1,129 @@
+import asyncio
+import math
+
+import httpx
+import structlog
+
+from polar.logging import Logger
+from polar.redis import Redis
+
+log: Logger = structlog.get_logger()
+
+# Returns how long to wait in milliseconds before sending the request, 0 if we can.
+# If the bucket has requests left, one of them is reserved for the caller.
+_ACQUIRE_SCRIPT = """
+local wait = redis.call('PTTL', KEYS[1])
+if wait > 0 then
+    return wait
+end
+local remaining = redis.call('GET', KEYS[2])
+if not remaining then
+    return 0
+end
+if tonumber(remaining) > 0 then
+    redis.call('DECR', KEYS[2])
+    return 0
+end
+wait = redis.call('PTTL', KEYS[2])
+if wait > 0 then
+    return wait
+end
+return 0
+"""
+
+
+class DiscordRateLimiter:
+    """
+    Discord rate limits, tracked in Redis and shared by all the processes.
+
+    Discord tells us in the response headers to which bucket a route belongs,
+    how many requests are left in this bucket and when it resets.
+    We record them to pace the next requests instead of hitting 429 errors.
+
+    Reference: https://discord.com/developers/docs/topics/rate-limits
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+    async def acquire(self, route: str, major: str) -> None:
+        """Wait until a request to this route is allowed."""
+        while True:
+            bucket = await self.redis.get(self._get_route_key(route))
+            wait = await self.redis.eval(
+                _ACQUIRE_SCRIPT,
+                2,
+                self._get_global_key(),
+                self._get_bucket_key(bucket or route, major),
+            )
+            if wait <= 0:
+                return
+            log.debug("discord.rate_limit.wait", route=route, major=major, wait_ms=wait)
+            await asyncio.sleep(wait / 1000)
+
+    async def update(self, route: str, major: str, response: httpx.Response) -> None:
+        """Record the rate limit state returned by Discord."""
+        headers = response.headers
+        bucket = headers.get("X-RateLimit-Bucket")
+
+        if response.status_code == 429:
+            reset_after = _get_retry_after(response)
+            if (
+                headers.get("X-RateLimit-Global") == "true"
+                or headers.get("X-RateLimit-Scope") == "global"
+            ):
+                await self.redis.set(self._get_global_key(), 1, px=reset_after)
+                log.warning("discord.rate_limit.global", retry_after_ms=reset_after)
+                return
+            # Block the bucket until it resets, even without rate limit headers
+            remaining = 0
+            if bucket is None:
+                bucket = await self.redis.get(self._get_route_key(route))
+            log.warning(
+                "discord.rate_limit.exceeded",
+                route=route,
+                major=major,
+                retry_after_ms=reset_after,
+            )
+        else:
+            remaining_header = headers.get("X-RateLimit-Remaining")
+            reset_after_header = headers.get("X-RateLimit-Reset-After")
+            if bucket is None or remaining_header is None or reset_after_header is None:
+                return
+            remaining = int(remaining_header)
+            reset_after = _get_milliseconds(reset_after_header)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if bucket is not None:
+                pipe.set(self._get_route_key(route), bucket, ex=86400)
+            pipe.set(
+                self._get_bucket_key(bucket or route, major), remaining, px=reset_after
+            )
+            await pipe.execute()
+
+    def _get_global_key(self) -> str:
+        return "polar:discord_rate_limit:global"
+
+    def _get_route_key(self, route: str) -> str:
+        return f"polar:discord_rate_limit:route:{route}"
+
+    def _get_bucket_key(self, bucket: str, major: str) -> str:
+        return f"polar:discord_rate_limit:bucket:{bucket}:{major}"
+
+
+def _get_milliseconds(seconds: str | float) -> int:
+    return max(1, math.ceil(float(seconds) * 1000))
+
+
+def _get_retry_after(response: httpx.Response) -> int:
+    """Get how long to wait in milliseconds after a 429 response."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        try:
+            retry_after = response.json().get("retry_after")
+        except ValueError:
+            pass
+    return _get_milliseconds(retry_after) if retry_after is not None else 1000
+
+
+__all__ = ["DiscordRateLimiter"]
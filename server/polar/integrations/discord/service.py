@@ -4,6 +4,7 @@ from polar.config import settings
 from polar.exceptions import PolarError
 from polar.logging import Logger
 from polar.models import Customer, User
+from polar.redis import Redis
 
 from .client import bot_client
 from .schemas import DiscordGuild, DiscordGuildRole
@@ -48,8 +49,8 @@ class DiscordCustomerExpiredAccessToken(DiscordError):
 
 
 class DiscordBotService:
-    async def get_guild(self, id: str) -> DiscordGuild:
-        guild = await bot_client.get_guild(id)
+    async def get_guild(self, redis: Redis, id: str) -> DiscordGuild:
+        guild = await bot_client.get_guild(redis, id)
 
         roles: list[DiscordGuildRole] = []
         for role in sorted(guild["roles"], key=lambda r: r["position"], reverse=True):
@@ -70,9 +71,15 @@ class DiscordBotService:
         return DiscordGuild(name=guild["name"], roles=roles)
 
     async def add_member(
-        self, guild_id: str, role_id: str, account_id: str, access_token: str
+        self,
+        redis: Redis,
+        guild_id: str,
+        role_id: str,
+        account_id: str,
+        access_token: str,
     ) -> None:
         await bot_client.add_member(
+            redis,
             guild_id=guild_id,
             discord_user_id=account_id,
             discord_user_access_token=access_token,
@@ -80,22 +87,25 @@ class DiscordBotService:
         )
 
     async def remove_member_role(
-        self, guild_id: str, role_id: str, account_id: str
+        self, redis: Redis, guild_id: str, role_id: str, account_id: str
     ) -> None:
         await bot_client.remove_member_role(
+            redis,
             guild_id=guild_id,
             discord_user_id=account_id,
             role_id=role_id,
         )
 
-    async def is_bot_role_above_role(self, guild_id: str, role_id: str) -> bool:
+    async def is_bot_role_above_role(
+        self, redis: Redis, guild_id: str, role_id: str
+    ) -> bool:
         """
         Checks if our bot's role has a higher position than the one we want to grant.
 
         There is a hierarchy in Discord roles. For our bot to grant a specific role,
         it has to be *above* this role.
         """
-        guild = await bot_client.get_guild(guild_id)
+        guild = await bot_client.get_guild(redis, guild_id)
         for role in sorted(guild["roles"], key=lambda r: r["position"]):
             if tags := role.get("tags"):
                 if tags.get("bot_id") == settings.DISCORD_CLIENT_ID:
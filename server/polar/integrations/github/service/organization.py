@@ -22,7 +22,7 @@ from polar.models import ExternalOrganization, User
 from polar.organization.service import organization as organization_service
 from polar.postgres import AsyncSession
 from polar.redis import Redis
-from polar.worker import QueueName, enqueue_job
+from polar.worker import enqueue_job
 
 from .. import client as github
 from .. import types
@@ -248,7 +248,6 @@ class GithubOrganizationService(ExternalOrganizationService):
             enqueue_job(
                 "github.repo.sync.repositories",
                 external_organization.id,
-                queue_name=QueueName.github_crawl,
             )
 
     async def _populate_github_org_metadata(
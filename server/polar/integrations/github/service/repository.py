@@ -9,7 +9,7 @@ from polar.postgres import AsyncSession
 from polar.redis import Redis
 from polar.repository.schemas import RepositoryCreate, RepositoryGitHubUpdate
 from polar.repository.service import RepositoryService
-from polar.worker import QueueName, enqueue_job
+from polar.worker import enqueue_job
 
 from .. import client as github
 from .. import types
@@ -35,7 +35,6 @@ class GithubRepositoryService(RepositoryService):
             "github.repo.sync.issues",
             repository.organization_id,
             repository.id,
-            queue_name=QueueName.github_crawl,
             crawl_with_installation_id=crawl_with_installation_id,
         )
 
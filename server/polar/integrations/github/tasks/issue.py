@@ -23,7 +23,7 @@ from .utils import get_external_organization_and_repo, github_rate_limit_retry
 log = structlog.get_logger()
 
 
-@task("github.issue.sync")
+@task("github.issue.sync", queue=QueueName.github_crawl)
 @github_rate_limit_retry
 async def issue_sync(
     ctx: JobContext,
@@ -60,7 +60,7 @@ async def issue_sync(
 @task(
     "github.issue.sync.cron_refresh_issues",
     cron_trigger=CronTrigger(hour=1, minute=0),
-    cron_trigger_queue=QueueName.github_crawl,
+    queue=QueueName.github_crawl,
 )
 @github_rate_limit_retry
 async def cron_refresh_issues(ctx: JobContext) -> None:
@@ -110,7 +110,6 @@ async def cron_refresh_issues(ctx: JobContext) -> None:
                     issue.id,
                     _job_id=f"github.issue.sync:{issue.id}",
                     _defer_by=random.randint(0, 60 * 5),
-                    queue_name=QueueName.github_crawl,
                 )
 
 
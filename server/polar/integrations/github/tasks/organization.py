@@ -30,11 +30,10 @@ async def cron_org_metadata(ctx: JobContext) -> None:
             enqueue_job(
                 "github.organization.populate_org_metadata",
                 organization_id=org.id,
-                queue_name=QueueName.github_crawl,
             )
 
 
-@task("github.organization.populate_org_metadata")
+@task("github.organization.populate_org_metadata", queue=QueueName.github_crawl)
 @github_rate_limit_retry
 async def populate_org_metadata(
     ctx: JobContext,
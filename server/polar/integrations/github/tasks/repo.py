@@ -5,6 +5,7 @@ from polar.worker import (
     AsyncSessionMaker,
     JobContext,
     PolarWorkerContext,
+    QueueName,
     get_worker_redis,
     task,
 )
@@ -12,7 +13,7 @@ from polar.worker import (
 from .utils import get_external_organization_and_repo, github_rate_limit_retry
 
 
-@task("github.repo.sync.repositories")
+@task("github.repo.sync.repositories", queue=QueueName.github_crawl)
 @github_rate_limit_retry
 async def sync_repositories(
     ctx: JobContext,
@@ -32,7 +33,7 @@ async def sync_repositories(
             )
 
 
-@task("github.repo.sync.issues")
+@task("github.repo.sync.issues", queue=QueueName.github_crawl)
 @github_rate_limit_retry
 async def sync_repository_issues(
     ctx: JobContext,
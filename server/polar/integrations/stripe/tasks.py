@@ -43,6 +43,7 @@ from polar.worker import (
     AsyncSessionMaker,
     JobContext,
     PolarWorkerContext,
+    QueueName,
     compute_backoff,
     task,
 )
@@ -102,7 +103,11 @@ async def account_updated(
                 )
 
 
-@task("stripe.webhook.payment_intent.succeeded", max_tries=MAX_RETRIES)
+@task(
+    "stripe.webhook.payment_intent.succeeded",
+    max_tries=MAX_RETRIES,
+    queue=QueueName.high_priority,
+)
 @stripe_api_connection_error_retry
 async def payment_intent_succeeded(
     ctx: JobContext, event_id: uuid.UUID, polar_context: PolarWorkerContext
@@ -1,3 +1,4 @@
+from collections.abc import AsyncIterable, AsyncIterator
 from typing import Annotated
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
@@ -5,6 +6,7 @@ from fastapi import Depends, Query
 from safe_redirect_url import url_has_allowed_host_and_scheme
 
 from polar.config import settings
+from polar.exceptions import PolarError
 
 
 def get_safe_return_url(return_to: str | None) -> str:
@@ -42,3 +44,33 @@ def add_query_parameters(url: str, **kwargs: str | list[str]) -> str:
             fragment,
         )
     )
+
+
+class LineTooLong(PolarError):
+    def __init__(self, max_line_size: int) -> None:
+        self.max_line_size = max_line_size
+        message = f"Lines can't be longer than {max_line_size} bytes."
+        super().__init__(message, 413)
+
+
+async def iter_lines(
+    stream: AsyncIterable[bytes], *, max_line_size: int
+) -> AsyncIterator[bytes]:
+    """
+    Split a stream of bytes chunks into lines, without loading it entirely in memory.
+
+    Raises `LineTooLong` as soon as a line exceeds `max_line_size` bytes,
+    so a stream without newlines can't be buffered indefinitely.
+    """
+    buffer = b""
+    async for chunk in stream:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if len(line) > max_line_size:
+                raise LineTooLong(max_line_size)
+            yield line
+        if len(buffer) > max_line_size:
+            raise LineTooLong(max_line_size)
+    if buffer:
+        yield buffer
@@ -1,4 +1,4 @@
-from datetime import date, datetime
+from datetime import UTC, date, datetime, timedelta
 from enum import StrEnum
 
 from sqlalchemy import (
@@ -28,6 +28,27 @@ class TimeInterval(StrEnum):
     ) -> Function[datetime]:
         return func.date_trunc(self.value, column)
 
+    def get_period_end(self, timestamp: datetime) -> datetime:
+        """
+        Get the end of the period containing the timestamp, in UTC.
+
+        Same as `date_trunc(interval, timestamp) + interval` in SQL.
+        """
+        timestamp = timestamp.astimezone(UTC)
+        hour = timestamp.replace(minute=0, second=0, microsecond=0)
+        day = hour.replace(hour=0)
+        if self == TimeInterval.hour:
+            return hour + timedelta(hours=1)
+        if self == TimeInterval.day:
+            return day + timedelta(days=1)
+        if self == TimeInterval.week:
+            return day - timedelta(days=day.weekday()) + timedelta(weeks=1)
+        if self == TimeInterval.month:
+            if day.month == 12:
+                return day.replace(year=day.year + 1, month=1, day=1)
+            return day.replace(month=day.month + 1, day=1)
+        return day.replace(year=day.year + 1, month=1, day=1)
+
 
 def get_timestamp_series_cte(
     start_timestamp: datetime, end_timestamp: datetime, interval: TimeInterval
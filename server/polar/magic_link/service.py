@@ -73,7 +73,7 @@ class MagicLinkService(ResourceService[MagicLink, MagicLinkCreate, MagicLinkUpda
 
         url_params = {"token": token, **extra_url_params}
         subject = "Sign in to Polar"
-        body = render_email_template(
+        body = await render_email_template(
             "magic_link",
             {
                 "token_lifetime_minutes": token_lifetime_minutes,
@@ -2,9 +2,20 @@ from enum import StrEnum
 from typing import Annotated, Any, Literal
 
 from pydantic import BaseModel, Discriminator, TypeAdapter
-from sqlalchemy import ColumnExpressionArgument, Dialect, TypeDecorator, func, true
+from sqlalchemy import (
+    ColumnExpressionArgument,
+    Dialect,
+    Numeric,
+    TypeDecorator,
+    cast,
+    func,
+    null,
+    true,
+)
 from sqlalchemy.dialects.postgresql import JSONB
 
+from .filter import get_jsonpath_clause
+
 
 class AggregationFunction(StrEnum):
     cnt = "count"  # `count` is a reserved keyword, so we use `cnt` as key
@@ -20,6 +31,12 @@ class CountAggregation(BaseModel):
     def get_sql_column(self, model: type[Any]) -> Any:
         return func.count(model.id)
 
+    def get_sql_value(self, model: type[Any]) -> Any:
+        return cast(null(), Numeric)
+
+    def get_rollup_sql_column(self, rollup: Any) -> Any:
+        return func.sum(rollup.count)
+
     def get_sql_clause(self, model: type[Any]) -> ColumnExpressionArgument[bool]:
         return true()
 
@@ -34,10 +51,7 @@ class PropertyAggregation(BaseModel):
     property: str
 
     def get_sql_column(self, model: type[Any]) -> Any:
-        try:
-            attr = getattr(model, self.property)
-        except AttributeError:
-            attr = model.user_metadata[self.property].as_integer()
+        attr = self.get_sql_value(model)
         if self.func == AggregationFunction.sum:
             return func.sum(attr)
         elif self.func == AggregationFunction.max:
@@ -48,12 +62,34 @@ class PropertyAggregation(BaseModel):
             return func.avg(attr)
         raise ValueError(f"Unsupported aggregation function: {self.func}")
 
+    def get_sql_value(self, model: type[Any]) -> Any:
+        try:
+            return getattr(model, self.property)
+        except AttributeError:
+            return model.user_metadata[self.property].as_integer()
+
+    def get_rollup_sql_column(self, rollup: Any) -> Any:
+        """
+        Merge partial aggregates, as stored in `MeterRollup`, into the final value.
+        """
+        if self.func == AggregationFunction.sum:
+            return func.sum(rollup.sum)
+        elif self.func == AggregationFunction.max:
+            return func.max(rollup.max)
+        elif self.func == AggregationFunction.min:
+            return func.min(rollup.min)
+        elif self.func == AggregationFunction.avg:
+            return func.sum(rollup.sum) / func.nullif(func.sum(rollup.count), 0)
+        raise ValueError(f"Unsupported aggregation function: {self.func}")
+
     def get_sql_clause(self, model: type[Any]) -> ColumnExpressionArgument[bool]:
         try:
             getattr(model, self.property)
             return true()
         except AttributeError:
-            return func.jsonb_typeof(model.user_metadata[self.property]) == "number"
+            return get_jsonpath_clause(
+                model.user_metadata, self.property, '@.type() == "number"'
+            )
 
 
 _Aggregation = CountAggregation | PropertyAggregation
@@ -12,6 +12,7 @@ from polar.models import Meter
 from polar.openapi import APITag
 from polar.organization.schemas import OrganizationID
 from polar.postgres import AsyncSession, get_db_session
+from polar.redis import Redis, get_redis
 from polar.routing import APIRouter
 
 from . import auth, sorting
@@ -137,6 +138,7 @@ async def quantities(
         description="Filter by external customer ID.",
     ),
     session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
 ) -> MeterQuantities:
     """Get quantities of a meter over a time period."""
     meter = await meter_service.get(session, auth_subject, id)
@@ -167,6 +169,7 @@ async def quantities(
         interval=interval,
         customer_id=customer_id,
         external_customer_id=external_customer_id,
+        redis=redis,
     )
 
 
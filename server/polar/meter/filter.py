@@ -1,19 +1,54 @@
+import json
+import re
 from enum import StrEnum
 from typing import Any
 
 from pydantic import BaseModel, ConfigDict
 from sqlalchemy import (
+    ColumnElement,
     ColumnExpressionArgument,
     Dialect,
     TypeDecorator,
     and_,
-    case,
-    false,
-    func,
+    cast,
+    literal,
     or_,
     true,
 )
-from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import JSONB, JSONPATH
+
+
+def get_jsonpath_clause(
+    column: Any, property: str, predicate: str
+) -> ColumnElement[bool]:
+    """
+    Build a `column @? 'strict $."property" ? (predicate)'` clause.
+
+    The strict mode prevents arrays from being unwrapped, and the `@?` operator
+    returns false instead of failing on a missing property or a type mismatch,
+    so no value is ever cast. Like containment, it can be served by
+    a GIN `jsonb_path_ops` index on the column.
+    """
+    path = f"strict $.{json.dumps(property)} ? ({predicate})"
+    return column.op("@?")(cast(literal(path), JSONPATH))
+
+
+def _like_to_regex(pattern: str) -> str:
+    regex = ""
+    escaped = False
+    for char in pattern:
+        if escaped:
+            regex += re.escape(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            regex += ".*"
+        elif char == "_":
+            regex += "."
+        else:
+            regex += re.escape(char)
+    return regex
 
 
 class FilterOperator(StrEnum):
@@ -35,35 +70,41 @@ class FilterClause(BaseModel):
     def get_sql_clause(self, model: type[Any]) -> ColumnExpressionArgument[bool]:
         try:
             attr = getattr(model, self.property)
-            return self._get_comparison_clause(attr, str(self.value))
         except AttributeError:
-            attr = model.user_metadata[self.property]
-            return case(
-                # The property is a string, compare it with the value as a string
-                (
-                    func.jsonb_typeof(attr) == "string",
-                    self._get_comparison_clause(attr.as_string(), str(self.value)),
-                ),
-                # The property is a number
-                (
-                    func.jsonb_typeof(attr) == "number",
-                    # Compare it with the value if it's an integer
-                    self._get_comparison_clause(attr.as_integer(), self.value)
-                    if isinstance(self.value, int)
-                    # Otherwise return false
-                    else false(),
-                ),
-                # The property is a boolean
-                (
-                    func.jsonb_typeof(attr) == "boolean",
-                    # Compare it with the value if it's a boolean
-                    self._get_comparison_clause(attr.as_boolean(), self.value)
-                    if isinstance(self.value, bool)
-                    # Otherwise return false
-                    else false(),
-                ),
+            return self._get_metadata_clause(model.user_metadata)
+        return self._get_comparison_clause(attr, str(self.value))
+
+    def _get_metadata_clause(self, column: Any) -> ColumnElement[bool]:
+        """
+        Compile the clause into an index-friendly predicate on the metadata column.
+
+        Metadata values are compared as strings, and also as numbers or booleans
+        if the filter value is one, so values of another type never match.
+        Equality is expressed as a containment, other operators as a JSON path filter.
+        """
+        candidates: list[str | int | bool] = [str(self.value)]
+        if not isinstance(self.value, str):
+            candidates.append(self.value)
+
+        if self.operator == FilterOperator.eq:
+            return or_(
+                *(
+                    column.contains({self.property: candidate})
+                    for candidate in candidates
+                )
             )
 
+        if self.operator in {FilterOperator.like, FilterOperator.not_like}:
+            predicate = f"@ like_regex {json.dumps(_like_to_regex(str(self.value)))}"
+            if self.operator == FilterOperator.not_like:
+                predicate = f"!({predicate})"
+        else:
+            operator = _JSONPATH_OPERATORS[self.operator]
+            predicate = " || ".join(
+                f"@ {operator} {json.dumps(candidate)}" for candidate in candidates
+            )
+        return get_jsonpath_clause(column, self.property, predicate)
+
     def _get_comparison_clause(self, attr: Any, value: str | int | bool) -> Any:
         if self.operator == FilterOperator.eq:
             return attr == value
@@ -84,6 +125,15 @@ class FilterClause(BaseModel):
         raise ValueError(f"Unsupported operator: {self.operator}")
 
 
+_JSONPATH_OPERATORS: dict[FilterOperator, str] = {
+    FilterOperator.ne: "!=",
+    FilterOperator.gt: ">",
+    FilterOperator.gte: ">=",
+    FilterOperator.lt: "<",
+    FilterOperator.lte: "<=",
+}
+
+
 class FilterConjunction(StrEnum):
     and_ = "and"
     or_ = "or"
@@ -1,15 +1,90 @@
+from collections.abc import Sequence
 from uuid import UUID
 
-from sqlalchemy import Select, select
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Select,
+    Text,
+    Uuid,
+    cast,
+    delete,
+    exists,
+    func,
+    literal,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm.attributes import set_committed_value
 
 from polar.auth.models import AuthSubject, Organization, User, is_organization, is_user
+from polar.event.repository import EventRepository
 from polar.kit.repository import RepositoryBase, RepositoryIDMixin
-from polar.models import Meter, UserOrganization
+from polar.kit.utils import utc_now
+from polar.models import Customer, Event, Meter, MeterRollup, UserOrganization
 
 
 class MeterRepository(RepositoryBase[Meter], RepositoryIDMixin[Meter, UUID]):
     model = Meter
 
+    async def get_all_by_organization(self, organization_id: UUID) -> Sequence[Meter]:
+        statement = (
+            self.get_base_statement()
+            .where(Meter.organization_id == organization_id)
+            .order_by(Meter.created_at.asc())
+        )
+        return await self.get_all(statement)
+
+    async def lock(self, meter: Meter) -> Meter:
+        """
+        Lock the meter row until the end of the transaction.
+
+        The meter is refreshed, since it may have been changed
+        while we were waiting for the lock.
+        """
+        statement = (
+            self.get_base_statement()
+            .where(Meter.id == meter.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        result = await self.session.execute(statement)
+        return result.scalar_one()
+
+    async def get_ids_to_roll_up(self) -> Sequence[UUID]:
+        """
+        Get the meters which were never rolled up, or whose organization
+        has events inserted since their last rollup.
+        """
+        statement = (
+            select(Meter.id)
+            .where(
+                Meter.deleted_at.is_(None),
+                or_(
+                    Meter.rolled_up_xid.is_(None),
+                    exists().where(
+                        Event.organization_id == Meter.organization_id,
+                        Event.ingest_xid >= Meter.rolled_up_xid,
+                    ),
+                ),
+            )
+            .order_by(Meter.created_at.asc())
+        )
+        result = await self.session.execute(statement)
+        return result.scalars().all()
+
+    async def set_rolled_up_xid(self, meter: Meter, rolled_up_xid: int | None) -> None:
+        # Rollups don't change the meter definition: keep its modification time
+        statement = (
+            update(Meter)
+            .where(Meter.id == meter.id)
+            .values(rolled_up_xid=rolled_up_xid, modified_at=Meter.modified_at)
+        )
+        await self.session.execute(statement)
+        set_committed_value(meter, "rolled_up_xid", rolled_up_xid)
+
     async def get_readable_by_id(
         self, id: UUID, auth_subject: AuthSubject[User | Organization]
     ) -> Meter | None:
@@ -37,3 +112,119 @@ class MeterRepository(RepositoryBase[Meter], RepositoryIDMixin[Meter, UUID]):
             )
 
         return statement
+
+
+class MeterRollupRepository(RepositoryBase[MeterRollup]):
+    model = MeterRollup
+
+    async def get_finished_xid(self) -> int:
+        """
+        Get the ID of the oldest running transaction.
+
+        All the transactions below it are finished, so the events they inserted
+        are either committed and visible to the next statements, or rolled back.
+        """
+        statement = select(
+            cast(
+                cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text),
+                BigInteger,
+            )
+        )
+        result = await self.session.execute(statement)
+        return result.scalar_one()
+
+    async def rollup_events(
+        self, meter: Meter, *, after_xid: int | None, until_xid: int
+    ) -> None:
+        """
+        Aggregate the meter events inserted by transactions from `after_xid`,
+        included, until `until_xid`, excluded, into the hourly rollups,
+        adding them to the existing ones.
+        """
+        event_repository = EventRepository.from_session(self.session)
+        value = meter.aggregation.get_sql_value(Event)
+        timestamp = func.date_trunc("hour", Event.timestamp)
+        events_statement = (
+            select(
+                func.gen_random_uuid(),
+                func.now(),
+                literal(meter.id, Uuid),
+                timestamp,
+                Event.customer_id,
+                Event.external_customer_id,
+                func.count(Event.id),
+                func.sum(value),
+                func.min(value),
+                func.max(value),
+            )
+            .where(
+                Event.organization_id == meter.organization_id,
+                event_repository.get_meter_clause(meter),
+            )
+            .group_by(timestamp, Event.customer_id, Event.external_customer_id)
+        )
+        if after_xid is not None:
+            events_statement = events_statement.where(
+                Event.ingest_xid >= after_xid, Event.ingest_xid < until_xid
+            )
+        else:
+            # Events inserted before transaction IDs were recorded
+            events_statement = events_statement.where(
+                or_(Event.ingest_xid.is_(None), Event.ingest_xid < until_xid)
+            )
+
+        insert_statement = postgresql.insert(MeterRollup).from_select(
+            [
+                MeterRollup.id,
+                MeterRollup.created_at,
+                MeterRollup.meter_id,
+                MeterRollup.timestamp,
+                MeterRollup.customer_id,
+                MeterRollup.external_customer_id,
+                MeterRollup.count,
+                MeterRollup.sum,
+                MeterRollup.min,
+                MeterRollup.max,
+            ],
+            events_statement,
+        )
+        excluded = insert_statement.excluded
+        statement = insert_statement.on_conflict_do_update(
+            constraint="meter_rollups_meter_id_timestamp_customer_key",
+            set_={
+                "count": MeterRollup.count + excluded.count,
+                "sum": func.coalesce(MeterRollup.sum, 0)
+                + func.coalesce(excluded.sum, 0),
+                # LEAST and GREATEST ignore NULL values
+                "min": func.least(MeterRollup.min, excluded.min),
+                "max": func.greatest(MeterRollup.max, excluded.max),
+                "modified_at": utc_now(),
+            },
+        )
+        await self.session.execute(statement)
+
+    async def delete_by_meter(self, meter: Meter) -> None:
+        statement = delete(MeterRollup).where(MeterRollup.meter_id == meter.id)
+        await self.session.execute(statement)
+
+    def get_customer_id_filter_clause(
+        self, customer_id: Sequence[UUID]
+    ) -> ColumnElement[bool]:
+        return or_(
+            MeterRollup.customer_id.in_(customer_id),
+            MeterRollup.external_customer_id.in_(
+                select(Customer.external_id).where(Customer.id.in_(customer_id))
+            ),
+        )
+
+    def get_external_customer_id_filter_clause(
+        self, external_customer_id: Sequence[str]
+    ) -> ColumnElement[bool]:
+        return or_(
+            MeterRollup.external_customer_id.in_(external_customer_id),
+            MeterRollup.customer_id.in_(
+                select(Customer.id).where(
+                    Customer.external_id.in_(external_customer_id)
+                )
+            ),
+        )
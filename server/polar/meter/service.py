@@ -3,37 +3,50 @@ from collections.abc import Sequence
 from datetime import datetime
 from typing import Any
 
+import logfire
 from sqlalchemy import (
     ColumnElement,
     ColumnExpressionArgument,
     UnaryExpression,
-    and_,
+    Uuid,
     asc,
     desc,
     func,
+    literal,
     or_,
     select,
+    union_all,
 )
 from sqlalchemy.orm import joinedload
 
 from polar.auth.models import AuthSubject, Organization, User
 from polar.billing_entry.repository import BillingEntryRepository
+from polar.config import settings
 from polar.event.repository import EventRepository
 from polar.exceptions import PolarRequestValidationError, ValidationError
 from polar.kit.metadata import MetadataQuery, apply_metadata_clause
 from polar.kit.pagination import PaginationParams
 from polar.kit.sorting import Sorting
 from polar.kit.time_queries import TimeInterval, get_timestamp_series_cte
-from polar.models import BillingEntry, Event, Meter, SubscriptionProductPrice
+from polar.kit.utils import utc_now
+from polar.models import BillingEntry, Event, Meter, MeterRollup
 from polar.organization.resolver import get_payload_organization
 from polar.postgres import AsyncSession
+from polar.redis import Redis
+from polar.result_cache import ResultCache
 from polar.subscription.repository import SubscriptionProductPriceRepository
 from polar.worker import enqueue_job
 
-from .repository import MeterRepository
+from .repository import MeterRepository, MeterRollupRepository
 from .schemas import MeterCreate, MeterQuantities, MeterQuantity, MeterUpdate
 from .sorting import MeterSortProperty
 
+meter_billing_lag_gauge = logfire.metric_gauge(
+    "meter.billing.lag",
+    unit="s",
+    description="Age of the oldest unbilled event of a meter.",
+)
+
 
 class MeterService:
     async def list(
@@ -116,7 +129,7 @@ class MeterService:
         event_repository = EventRepository.from_session(session)
         statement = (
             event_repository.get_meter_statement(meter)
-            .order_by(Event.timestamp.desc())
+            .order_by(Event.ingest_xid.desc().nulls_last(), Event.id.desc())
             .limit(1)
         )
         last_billed_event = await event_repository.get_one_or_none(statement)
@@ -159,6 +172,15 @@ class MeterService:
         if meter_update.aggregation is not None:
             update_dict["aggregation"] = meter_update.aggregation
 
+        # Rollups were computed with the previous definition, start over.
+        # Lock the meter, so a concurrent rollup doesn't add to them
+        # buckets computed with the previous definition.
+        if meter_update.filter is not None or meter_update.aggregation is not None:
+            meter = await repository.lock(meter)
+            rollup_repository = MeterRollupRepository.from_session(session)
+            await rollup_repository.delete_by_meter(meter)
+            update_dict["rolled_up_xid"] = None
+
         return await repository.update(meter, update_dict=update_dict)
 
     async def events(
@@ -186,18 +208,95 @@ class MeterService:
         interval: TimeInterval,
         customer_id: Sequence[uuid.UUID] | None = None,
         external_customer_id: Sequence[str] | None = None,
+        redis: Redis | None = None,
     ) -> MeterQuantities:
+        """
+        Compute the quantities of a meter over a time period.
+
+        If `redis` is given, the result is cached.
+        """
+        if redis is not None:
+            return await ResultCache(redis).get_or_compute(
+                "meter_quantities",
+                MeterQuantities,
+                lambda: self.get_quantities(
+                    session,
+                    meter,
+                    start_timestamp=start_timestamp,
+                    end_timestamp=end_timestamp,
+                    interval=interval,
+                    customer_id=customer_id,
+                    external_customer_id=external_customer_id,
+                ),
+                organization_ids=[meter.organization_id],
+                parameters={
+                    # Changes to the meter definition change the key
+                    "meter": meter.id,
+                    "filter": meter.filter.model_dump(mode="json"),
+                    "aggregation": meter.aggregation.model_dump(mode="json"),
+                    "start_timestamp": start_timestamp,
+                    "end_timestamp": end_timestamp,
+                    "interval": interval,
+                    "customer_id": sorted(customer_id or []),
+                    "external_customer_id": sorted(external_customer_id or []),
+                },
+                # The last bucket is open until its end, even if `end_timestamp` isn't
+                end=interval.get_period_end(end_timestamp),
+            )
+
         timestamp_series = get_timestamp_series_cte(
             start_timestamp, end_timestamp, interval
         )
         timestamp_column: ColumnElement[datetime] = timestamp_series.c.timestamp
 
+        # Bounds of the buckets covered by the series
+        lower_bound = interval.sql_date_trunc(literal(start_timestamp))
+        upper_bound = (
+            interval.sql_date_trunc(literal(end_timestamp)) + interval.sql_interval()
+        )
+
+        # Boundary between rolled up and raw events. It's read in the same statement
+        # as the rollups and the events, so all of them come from the same snapshot,
+        # even if a rollup is committed meanwhile.
+        rolled_up_xid = (
+            select(Meter.rolled_up_xid).where(Meter.id == meter.id).scalar_subquery()
+        )
+
+        # Hourly rollups, covering events committed until `rolled_up_xid`
+        rollup_repository = MeterRollupRepository.from_session(session)
+        rollup_clauses: list[ColumnExpressionArgument[bool]] = [
+            rolled_up_xid.is_not(None),
+            MeterRollup.meter_id == meter.id,
+            MeterRollup.timestamp >= lower_bound,
+            MeterRollup.timestamp < upper_bound,
+        ]
+        if customer_id is not None:
+            rollup_clauses.append(
+                rollup_repository.get_customer_id_filter_clause(customer_id)
+            )
+        if external_customer_id is not None:
+            rollup_clauses.append(
+                rollup_repository.get_external_customer_id_filter_clause(
+                    external_customer_id
+                )
+            )
+        rollups_statement = select(
+            MeterRollup.timestamp,
+            MeterRollup.count,
+            MeterRollup.sum,
+            MeterRollup.min,
+            MeterRollup.max,
+        ).where(*rollup_clauses)
+
+        # Raw events which are not rolled up yet
+        event_repository = EventRepository.from_session(session)
         event_clauses: list[ColumnExpressionArgument[bool]] = [
             Event.organization_id == meter.organization_id,
-            interval.sql_date_trunc(Event.timestamp)
-            == interval.sql_date_trunc(timestamp_column),
+            Event.timestamp >= lower_bound,
+            Event.timestamp < upper_bound,
+            # Not rolled up yet: all events are raw
+            or_(rolled_up_xid.is_(None), Event.ingest_xid >= rolled_up_xid),
         ]
-        event_repository = EventRepository.from_session(session)
         if customer_id is not None:
             event_clauses.append(
                 event_repository.get_customer_id_filter_clause(customer_id)
@@ -208,18 +307,33 @@ class MeterService:
                     external_customer_id
                 )
             )
-        event_clauses += [
-            meter.filter.get_sql_clause(Event),
-            # Additional clauses to make sure we work on rows with the right type for aggregation
-            meter.aggregation.get_sql_clause(Event),
-        ]
+        event_clauses.append(event_repository.get_meter_clause(meter))
+        event_value = meter.aggregation.get_sql_value(Event)
+        event_timestamp = func.date_trunc("hour", Event.timestamp)
+        events_statement = (
+            select(
+                event_timestamp,
+                func.count(Event.id),
+                func.sum(event_value),
+                func.min(event_value),
+                func.max(event_value),
+            )
+            .where(*event_clauses)
+            .group_by(event_timestamp)
+        )
 
+        buckets = union_all(rollups_statement, events_statement).subquery()
         statement = (
             select(
                 timestamp_column.label("timestamp"),
-                func.coalesce(meter.aggregation.get_sql_column(Event), 0),
+                func.coalesce(meter.aggregation.get_rollup_sql_column(buckets.c), 0),
+            )
+            .join(
+                buckets,
+                onclause=interval.sql_date_trunc(buckets.c.timestamp)
+                == interval.sql_date_trunc(timestamp_column),
+                isouter=True,
             )
-            .join(Event, onclause=and_(*event_clauses), isouter=True)
             .group_by(timestamp_column)
             .order_by(timestamp_column.asc())
         )
@@ -232,15 +346,155 @@ class MeterService:
             ]
         )
 
+    async def enqueue_rollups(self, session: AsyncSession) -> None:
+        repository = MeterRepository.from_session(session)
+        for meter_id in await repository.get_ids_to_roll_up():
+            enqueue_job("meter.rollup", meter_id, _job_id=f"meter.rollup:{meter_id}")
+
+    async def rollup(
+        self, session: AsyncSession, meter: Meter, *, until_xid: int | None = None
+    ) -> Meter:
+        """
+        Aggregate the events committed since the last rollup into the hourly rollups.
+
+        The rollup is bounded by transaction IDs rather than ingestion times:
+        by default, it stops at the oldest running transaction, so events of
+        long ingestion transactions are picked up once they're committed,
+        and never fall between the rollups and the raw events.
+
+        The meter is locked, like when its definition is updated, so concurrent
+        rollups don't aggregate the same events twice.
+        """
+        repository = MeterRepository.from_session(session)
+        meter = await repository.lock(meter)
+
+        rollup_repository = MeterRollupRepository.from_session(session)
+        if until_xid is None:
+            until_xid = await rollup_repository.get_finished_xid()
+
+        if meter.rolled_up_xid is not None and until_xid <= meter.rolled_up_xid:
+            return meter
+
+        await rollup_repository.rollup_events(
+            meter, after_xid=meter.rolled_up_xid, until_xid=until_xid
+        )
+        await repository.set_rolled_up_xid(meter, until_xid)
+        return meter
+
     async def enqueue_billing(self, session: AsyncSession) -> None:
+        """
+        Enqueue the billing of the meters having unbilled events.
+
+        Meters are sharded by organization: each organization gets a single job,
+        so organizations are billed in parallel across workers, while
+        the meters of an organization are never billed concurrently.
+        """
         repository = MeterRepository.from_session(session)
-        statement = repository.get_base_statement().order_by(Meter.created_at.asc())
-        async for meter in repository.stream(statement):
-            enqueue_job("meter.billing_entries", meter.id)
+        statement = (
+            repository.get_base_statement()
+            .order_by(Meter.created_at.asc())
+            .options(joinedload(Meter.last_billed_event))
+        )
+        meters = await repository.get_all(statement)
+        oldest_unbilled_events = await self.get_oldest_unbilled_events(session, meters)
+
+        now = utc_now()
+        organization_meters: dict[uuid.UUID, list[uuid.UUID]] = {}
+        for meter in meters:
+            oldest_unbilled_event = oldest_unbilled_events.get(meter.id)
+            lag = (
+                (now - oldest_unbilled_event).total_seconds()
+                if oldest_unbilled_event is not None
+                else 0.0
+            )
+            meter_billing_lag_gauge.set(lag, {"meter_id": str(meter.id)})
+            if oldest_unbilled_event is not None:
+                organization_meters.setdefault(meter.organization_id, []).append(
+                    meter.id
+                )
+
+        for organization_id, meter_ids in organization_meters.items():
+            enqueue_job(
+                "meter.organization_billing_entries",
+                organization_id,
+                meter_ids,
+                # Skip the organization if its previous job is still pending
+                _job_id=f"meter.organization_billing_entries:{organization_id}",
+            )
+
+    async def get_oldest_unbilled_events(
+        self, session: AsyncSession, meters: Sequence[Meter]
+    ) -> dict[uuid.UUID, datetime]:
+        """
+        Get the ingestion time of the oldest unbilled event of each meter.
+
+        The meters' `last_billed_event` relationship is expected to be loaded.
+
+        Each meter has its own filter, so it's looked up by its own `UNION ALL`
+        branch. Meters are queried by batches, to bound the number of bind
+        parameters and the planning cost of each query.
+
+        Returns:
+            The ingestion time, by meter ID. Meters without unbilled event are omitted.
+        """
+        oldest_unbilled_events: dict[uuid.UUID, datetime] = {}
+        batch_size = settings.METER_BILLING_LAG_BATCH_SIZE
+        for i in range(0, len(meters), batch_size):
+            oldest_unbilled_events.update(
+                await self._get_oldest_unbilled_events_batch(
+                    session, meters[i : i + batch_size]
+                )
+            )
+        return oldest_unbilled_events
+
+    async def _get_oldest_unbilled_events_batch(
+        self, session: AsyncSession, meters: Sequence[Meter]
+    ) -> dict[uuid.UUID, datetime]:
+        event_repository = EventRepository.from_session(session)
+        statements = []
+        for meter in meters:
+            clauses: list[ColumnExpressionArgument[bool]] = [
+                Event.organization_id == meter.organization_id,
+                or_(
+                    event_repository.get_meter_clause(meter),
+                    event_repository.get_meter_credit_clause(meter),
+                ),
+            ]
+            last_billed_event = meter.last_billed_event
+            if last_billed_event is not None:
+                clauses.append(event_repository.get_after_clause(last_billed_event))
+            statements.append(
+                select(
+                    literal(meter.id, Uuid).label("meter_id"),
+                    func.min(Event.ingested_at).label("ingested_at"),
+                ).where(*clauses)
+            )
+
+        result = await session.execute(union_all(*statements))
+        return {
+            row.meter_id: row.ingested_at
+            for row in result.all()
+            if row.ingested_at is not None
+        }
 
     async def create_billing_entries(
         self, session: AsyncSession, meter: Meter
-    ) -> Sequence[BillingEntry]:
+    ) -> tuple[int, bool]:
+        """
+        Create the billing entries of the next chunk of events
+        ingested since the last billed event.
+
+        Events are walked in `(ingest_xid, id)` keyset chunks, bounded to finished
+        transactions: an event committed late can't land behind the last billed
+        event, as it could with ingestion times. The entries of a chunk
+        are inserted at once and the last billed event is moved to its end. Callers
+        commit after each chunk, so a large backlog doesn't have to fit in memory
+        and an interrupted run resumes from the last chunk.
+
+        Returns:
+            The number of created billing entries,
+            and whether there may be events left to bill.
+        """
         event_repository = EventRepository.from_session(session)
         statement = (
             event_repository.get_base_statement()
@@ -252,52 +506,55 @@ class MeterService:
                     # System events impacting the meter balance
                     event_repository.get_meter_credit_clause(meter),
                 ),
+                event_repository.get_committed_clause(),
             )
-            .order_by(Event.ingested_at.asc())
+            .order_by(Event.ingest_xid.asc().nulls_first(), Event.id.asc())
+            .limit(settings.METER_BILLING_CHUNK_SIZE)
         )
+
+        repository = MeterRepository.from_session(session)
+        subscription_product_price_repository = (
+            SubscriptionProductPriceRepository.from_session(session)
+        )
+        billing_entry_repository = BillingEntryRepository.from_session(session)
+
         last_billed_event = meter.last_billed_event
         if last_billed_event is not None:
             statement = statement.where(
-                Event.ingested_at > last_billed_event.ingested_at
+                event_repository.get_after_clause(last_billed_event)
             )
         events = await event_repository.get_all(statement)
-
-        subscription_product_price_repository = (
-            SubscriptionProductPriceRepository.from_session(session)
+        if not events:
+            return 0, False
+
+        # Retrieve the active prices of all the chunk's customers
+        customer_price_map = (
+            await subscription_product_price_repository.get_by_customers_and_meter(
+                {event.customer.id for event in events if event.customer},
+                meter.id,
+            )
         )
-        customer_price_map: dict[uuid.UUID, SubscriptionProductPrice | None] = {}
 
-        billing_entry_repository = BillingEntryRepository.from_session(session)
         entries: list[BillingEntry] = []
         for event in events:
             customer = event.customer
             assert customer is not None
 
-            # Retrieve an active price for the customer and meter
-            try:
-                subscription_product_price = customer_price_map[customer.id]
-            except KeyError:
-                subscription_product_price = await subscription_product_price_repository.get_by_customer_and_meter(
-                    customer.id, meter.id
-                )
-                customer_price_map[customer.id] = subscription_product_price
+            subscription_product_price = customer_price_map.get(customer.id)
             if subscription_product_price is None:
                 continue
 
-            # Create a billing entry
             entries.append(
-                await billing_entry_repository.create(
-                    BillingEntry.from_metered_event(
-                        customer, subscription_product_price, event
-                    )
+                BillingEntry.from_metered_event(
+                    customer, subscription_product_price, event
                 )
             )
+        await billing_entry_repository.create_all(entries)
 
-        # Update the last billed event
-        meter.last_billed_event = events[-1] if events else last_billed_event
-        session.add(meter)
+        # Checkpoint the last billed event
+        await repository.update(meter, update_dict={"last_billed_event": events[-1]})
 
-        return entries
+        return len(entries), len(events) == settings.METER_BILLING_CHUNK_SIZE
 
     async def get_quantity(
         self, session: AsyncSession, meter: Meter, events: Sequence[uuid.UUID]
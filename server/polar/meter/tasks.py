@@ -26,16 +26,65 @@ async def meter_enqueue_billing(ctx: JobContext) -> None:
         await meter_service.enqueue_billing(session)
 
 
+async def _create_billing_entries(ctx: JobContext, meter_id: uuid.UUID) -> None:
+    # Each chunk is committed in its own transaction,
+    # so an interrupted run resumes from the last chunk
+    has_more = True
+    while has_more:
+        async with AsyncSessionMaker(ctx) as session:
+            repository = MeterRepository.from_session(session)
+            meter = await repository.get_by_id(
+                meter_id, options=(joinedload(Meter.last_billed_event),)
+            )
+            if meter is None:
+                raise MeterDoesNotExist(meter_id)
+
+            _, has_more = await meter_service.create_billing_entries(session, meter)
+
+
 @task("meter.billing_entries")
 async def meter_billing_entries(
     ctx: JobContext, meter_id: uuid.UUID, polar_context: PolarWorkerContext
+) -> None:
+    await _create_billing_entries(ctx, meter_id)
+
+
+@task("meter.organization_billing_entries", keep_result=0)
+async def meter_organization_billing_entries(
+    ctx: JobContext,
+    organization_id: uuid.UUID,
+    meter_ids: list[uuid.UUID],
+    polar_context: PolarWorkerContext,
 ) -> None:
     async with AsyncSessionMaker(ctx) as session:
         repository = MeterRepository.from_session(session)
-        meter = await repository.get_by_id(
-            meter_id, options=(joinedload(Meter.last_billed_event),)
+        statement = (
+            repository.get_base_statement()
+            .with_only_columns(Meter.id)
+            .where(Meter.organization_id == organization_id, Meter.id.in_(meter_ids))
+            .order_by(Meter.created_at.asc())
         )
+        result = await session.execute(statement)
+        organization_meter_ids = result.scalars().all()
+
+    for meter_id in organization_meter_ids:
+        await _create_billing_entries(ctx, meter_id)
+
+
+@task("meter.enqueue_rollups", cron_trigger=CronTrigger.from_crontab("* * * * *"))
+async def meter_enqueue_rollups(ctx: JobContext) -> None:
+    async with AsyncSessionMaker(ctx) as session:
+        await meter_service.enqueue_rollups(session)
+
+
+@task("meter.rollup")
+async def meter_rollup(
+    ctx: JobContext, meter_id: uuid.UUID, polar_context: PolarWorkerContext
+) -> None:
+    async with AsyncSessionMaker(ctx) as session:
+        repository = MeterRepository.from_session(session)
+        meter = await repository.get_by_id(meter_id)
         if meter is None:
             raise MeterDoesNotExist(meter_id)
 
-        await meter_service.create_billing_entries(session, meter)
+        await meter_service.rollup(session, meter)
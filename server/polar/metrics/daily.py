@@ -0,0 +1,385 @@
+import uuid
+from collections.abc import Sequence
+from datetime import date, datetime
+from typing import Any, cast
+
+from sqlalchemy import (
+    CTE,
+    TIMESTAMP,
+    BigInteger,
+    ColumnElement,
+    ColumnExpressionArgument,
+    Date,
+    Select,
+    SQLColumnExpression,
+    Subquery,
+    and_,
+    func,
+    literal,
+    null,
+    or_,
+    select,
+    text,
+    union_all,
+)
+
+from polar.auth.models import AuthSubject, is_organization, is_user
+from polar.kit.time_queries import TimeInterval
+from polar.models import (
+    Order,
+    OrderDailyMetrics,
+    OrderDailyMetricsCheckpoint,
+    Organization,
+    Product,
+    Subscription,
+    User,
+    UserOrganization,
+)
+from polar.models.product import ProductBillingType
+
+from .metrics import get_monthly_recurring_amount_expression
+
+DAILY_INTERVALS: tuple[TimeInterval, ...] = (
+    TimeInterval.day,
+    TimeInterval.week,
+    TimeInterval.month,
+    TimeInterval.year,
+)
+"""Intervals which can be computed from daily metrics."""
+
+ORDER_METRICS_COLUMNS: tuple[str, ...] = (
+    "orders",
+    "revenue",
+    "one_time_products",
+    "one_time_products_revenue",
+    "subscriptions_revenue",
+    *(f"new_subscriptions_revenue_{interval}" for interval in DAILY_INTERVALS),
+    *(f"renewed_subscriptions_{interval}" for interval in DAILY_INTERVALS),
+)
+
+
+def get_order_daily_metrics_statement(
+    *clauses: ColumnExpressionArgument[bool],
+    since: SQLColumnExpression[date] | None = None,
+    until: date | None = None,
+) -> Select[Any]:
+    """
+    Aggregate orders per product and per day.
+
+    Args:
+        clauses: Filters on the orders.
+        since: Only aggregate the days starting at this one, included.
+        It may refer to `OrderDailyMetricsCheckpoint`, joined on the order's product.
+        until: Only aggregate the days before this one, excluded.
+    """
+    day = func.cast(func.date_trunc("day", Order.created_at), Date)
+
+    flags: list[ColumnElement[Any]] = []
+    for interval in DAILY_INTERVALS:
+        started_period = interval.sql_date_trunc(
+            cast(SQLColumnExpression[datetime], Subscription.started_at)
+        )
+        created_period = interval.sql_date_trunc(Order.created_at)
+        flags.append((started_period == created_period).label(f"new_{interval}"))
+        # Flag the first renewal order of each subscription and period,
+        # so the number of renewed subscriptions can be summed
+        flags.append(
+            and_(
+                started_period != created_period,
+                func.row_number().over(
+                    partition_by=(Order.subscription_id, created_period),
+                    order_by=(Order.created_at.asc(), Order.id.asc()),
+                )
+                == 1,
+            ).label(f"renewed_{interval}")
+        )
+
+    orders_statement = (
+        select(
+            Order.product_id,
+            Product.organization_id,
+            day.label("day"),
+            Order.net_amount.label("net_amount"),
+            Order.subscription_id,
+            Subscription.started_at,
+            (since if since is not None else null()).label("since"),
+            *flags,
+        )
+        .join(Product, onclause=Order.product_id == Product.id)
+        .join(
+            Subscription,
+            isouter=True,
+            onclause=Order.subscription_id == Subscription.id,
+        )
+        .join(
+            OrderDailyMetricsCheckpoint,
+            isouter=True,
+            onclause=OrderDailyMetricsCheckpoint.product_id == Order.product_id,
+        )
+        .where(*clauses)
+    )
+    if since is not None:
+        # Periods of the flags may start before `since`
+        window_start = func.least(
+            func.date_trunc("year", since), func.date_trunc("week", since)
+        )
+        orders_statement = orders_statement.where(
+            or_(since.is_(None), Order.created_at >= window_start)
+        )
+    if until is not None:
+        orders_statement = orders_statement.where(Order.created_at < until)
+    orders = orders_statement.subquery()
+
+    statement = select(
+        orders.c.product_id,
+        orders.c.organization_id,
+        orders.c.day,
+        func.count().label("orders"),
+        func.coalesce(func.sum(orders.c.net_amount), 0).label("revenue"),
+        func.count()
+        .filter(orders.c.subscription_id.is_(None))
+        .label("one_time_products"),
+        func.coalesce(
+            func.sum(orders.c.net_amount).filter(orders.c.subscription_id.is_(None)),
+            0,
+        ).label("one_time_products_revenue"),
+        func.coalesce(
+            func.sum(orders.c.net_amount).filter(orders.c.started_at.is_not(None)),
+            0,
+        ).label("subscriptions_revenue"),
+        *(
+            func.coalesce(
+                func.sum(orders.c.net_amount).filter(orders.c[f"new_{interval}"]), 0
+            ).label(f"new_subscriptions_revenue_{interval}")
+            for interval in DAILY_INTERVALS
+        ),
+        *(
+            func.count()
+            .filter(orders.c[f"renewed_{interval}"])
+            .label(f"renewed_subscriptions_{interval}")
+            for interval in DAILY_INTERVALS
+        ),
+    ).group_by(orders.c.product_id, orders.c.organization_id, orders.c.day)
+    if since is not None:
+        statement = statement.where(
+            or_(orders.c.since.is_(None), orders.c.day >= orders.c.since)
+        )
+    return statement
+
+
+def _get_readable_products_statement(
+    auth_subject: AuthSubject[User | Organization],
+    *,
+    organization_id: Sequence[uuid.UUID] | None = None,
+    product_id: Sequence[uuid.UUID] | None = None,
+    billing_type: Sequence[ProductBillingType] | None = None,
+) -> Select[tuple[uuid.UUID]]:
+    statement = select(Product.id)
+
+    if is_user(auth_subject):
+        statement = statement.where(
+            Product.organization_id.in_(
+                select(UserOrganization.organization_id).where(
+                    UserOrganization.user_id == auth_subject.subject.id,
+                    UserOrganization.deleted_at.is_(None),
+                )
+            )
+        )
+    elif is_organization(auth_subject):
+        statement = statement.where(Product.organization_id == auth_subject.subject.id)
+
+    if organization_id is not None:
+        statement = statement.where(Product.organization_id.in_(organization_id))
+
+    if product_id is not None:
+        statement = statement.where(Product.id.in_(product_id))
+
+    if billing_type is not None:
+        statement = statement.where(Product.billing_type.in_(billing_type))
+
+    return statement
+
+
+def _get_orders_periods(
+    timestamp_series: CTE,
+    interval: TimeInterval,
+    readable_products: Select[tuple[uuid.UUID]],
+) -> Subquery:
+    order_metrics_columns = [
+        *ORDER_METRICS_COLUMNS[:5],
+        f"new_subscriptions_revenue_{interval}",
+        f"renewed_subscriptions_{interval}",
+    ]
+
+    # Stored days, and days after the checkpoint computed on the fly
+    stored_days = select(
+        OrderDailyMetrics.day,
+        *(getattr(OrderDailyMetrics, column) for column in order_metrics_columns),
+    ).where(OrderDailyMetrics.product_id.in_(readable_products))
+    live_days_statement = get_order_daily_metrics_statement(
+        Order.product_id.in_(readable_products),
+        since=OrderDailyMetricsCheckpoint.materialized_until,
+    ).subquery()
+    live_days = select(
+        live_days_statement.c.day,
+        *(live_days_statement.c[column] for column in order_metrics_columns),
+    )
+    # Empty periods, so cumulative metrics are computed for each of them
+    empty_periods = select(
+        func.cast(timestamp_series.c.timestamp, Date),
+        *(literal(0, BigInteger) for _ in order_metrics_columns),
+    )
+    days = union_all(stored_days, live_days, empty_periods).subquery()
+
+    period = interval.sql_date_trunc(
+        func.cast(days.c.day, TIMESTAMP(timezone=True))
+    ).label("period")
+    revenue = func.sum(days.c.revenue)
+    return (
+        select(
+            period,
+            func.sum(days.c.orders).label("orders"),
+            revenue.label("revenue"),
+            func.sum(revenue).over(order_by=period).label("cumulative_revenue"),
+            func.sum(days.c.one_time_products).label("one_time_products"),
+            func.sum(days.c.one_time_products_revenue).label(
+                "one_time_products_revenue"
+            ),
+            func.sum(days.c.subscriptions_revenue).label("subscriptions_revenue"),
+            func.sum(days.c[f"new_subscriptions_revenue_{interval}"]).label(
+                "new_subscriptions_revenue"
+            ),
+            func.sum(days.c[f"renewed_subscriptions_{interval}"]).label(
+                "renewed_subscriptions"
+            ),
+        )
+        .group_by(period)
+        .subquery()
+    )
+
+
+def _get_subscriptions_periods(
+    timestamp_series: CTE,
+    interval: TimeInterval,
+    readable_products: Select[tuple[uuid.UUID]],
+) -> Subquery:
+    monthly_amount = get_monthly_recurring_amount_expression()
+    readable_clause = Subscription.product_id.in_(readable_products)
+
+    # Subscriptions without start date are active since forever
+    started_period = func.coalesce(
+        interval.sql_date_trunc(
+            cast(SQLColumnExpression[datetime], Subscription.started_at)
+        ),
+        text("'-infinity'::timestamptz"),
+    )
+    started = (
+        select(
+            started_period.label("period"),
+            func.count().label("started"),
+            func.sum(monthly_amount).label("started_amount"),
+            literal(0, BigInteger).label("ended"),
+            literal(0, BigInteger).label("ended_amount"),
+        )
+        .where(readable_clause)
+        .group_by(started_period)
+    )
+    ended_period = interval.sql_date_trunc(
+        cast(SQLColumnExpression[datetime], Subscription.ended_at)
+    )
+    ended = (
+        select(
+            ended_period,
+            literal(0, BigInteger),
+            null(),
+            func.count(),
+            func.sum(monthly_amount),
+        )
+        .where(readable_clause, Subscription.ended_at.is_not(None))
+        .group_by(ended_period)
+    )
+    empty_periods = select(
+        interval.sql_date_trunc(timestamp_series.c.timestamp),
+        literal(0, BigInteger),
+        null(),
+        literal(0, BigInteger),
+        null(),
+    )
+    deltas = union_all(started, ended, empty_periods).subquery()
+
+    # A subscription is active during a period if it started before its end,
+    # and didn't end before its start.
+    started_sum = func.sum(deltas.c.started)
+    started_amount_sum = func.coalesce(func.sum(deltas.c.started_amount), 0)
+    ended_sum = func.sum(deltas.c.ended)
+    ended_amount_sum = func.coalesce(func.sum(deltas.c.ended_amount), 0)
+    return (
+        select(
+            deltas.c.period,
+            started_sum.label("new_subscriptions"),
+            (
+                func.sum(started_sum).over(order_by=deltas.c.period)
+                - func.coalesce(
+                    func.sum(ended_sum).over(order_by=deltas.c.period, rows=(None, -1)),
+                    0,
+                )
+            ).label("active_subscriptions"),
+            (
+                func.sum(started_amount_sum).over(order_by=deltas.c.period)
+                - func.coalesce(
+                    func.sum(ended_amount_sum).over(
+                        order_by=deltas.c.period, rows=(None, -1)
+                    ),
+                    0,
+                )
+            ).label("monthly_recurring_revenue"),
+        )
+        .group_by(deltas.c.period)
+        .subquery()
+    )
+
+
+def get_daily_metrics_periods(
+    timestamp_series: CTE,
+    interval: TimeInterval,
+    auth_subject: AuthSubject[User | Organization],
+    *,
+    organization_id: Sequence[uuid.UUID] | None = None,
+    product_id: Sequence[uuid.UUID] | None = None,
+    billing_type: Sequence[ProductBillingType] | None = None,
+) -> Subquery:
+    """
+    Compute the metrics of each timestamp of the series from the daily metrics.
+
+    Cumulative metrics are computed with window functions over the periods,
+    so the cost is linear in the number of days and subscriptions,
+    instead of joining every order and subscription on every timestamp.
+    """
+    assert interval in DAILY_INTERVALS
+    timestamp_column: ColumnElement[datetime] = timestamp_series.c.timestamp
+    readable_products = _get_readable_products_statement(
+        auth_subject,
+        organization_id=organization_id,
+        product_id=product_id,
+        billing_type=billing_type,
+    )
+    orders = _get_orders_periods(timestamp_series, interval, readable_products)
+    subscriptions = _get_subscriptions_periods(
+        timestamp_series, interval, readable_products
+    )
+    period = interval.sql_date_trunc(timestamp_column)
+    return (
+        select(
+            timestamp_column.label("timestamp"),
+            *(column for column in orders.c if column.key != "period"),
+            *(column for column in subscriptions.c if column.key != "period"),
+        )
+        .select_from(
+            timestamp_series.join(
+                orders, isouter=True, onclause=orders.c.period == period
+            ).join(
+                subscriptions, isouter=True, onclause=subscriptions.c.period == period
+            )
+        )
+        .subquery()
+    )
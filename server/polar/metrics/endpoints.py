@@ -16,6 +16,7 @@ from polar.openapi import APITag
 from polar.organization.schemas import OrganizationID
 from polar.postgres import AsyncSession, get_db_session
 from polar.product.schemas import ProductID
+from polar.redis import Redis, get_redis
 from polar.routing import APIRouter
 
 from . import auth
@@ -55,6 +56,7 @@ async def get(
         None, title="CustomerID Filter", description="Filter by customer ID."
     ),
     session: AsyncSession = Depends(get_db_session),
+    redis: Redis = Depends(get_redis),
 ) -> MetricsResponse:
     """
     Get metrics about your orders and subscriptions.
@@ -87,6 +89,7 @@ async def get(
         product_id=product_id,
         billing_type=billing_type,
         customer_id=customer_id,
+        redis=redis,
     )
 
 
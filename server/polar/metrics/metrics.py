@@ -2,7 +2,15 @@ from datetime import datetime
 from enum import StrEnum
 from typing import ClassVar, Protocol, cast
 
-from sqlalchemy import ColumnElement, Integer, SQLColumnExpression, case, func
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Numeric,
+    SQLColumnExpression,
+    Subquery,
+    case,
+    func,
+)
 
 from polar.enums import SubscriptionRecurringInterval
 from polar.kit.time_queries import TimeInterval
@@ -16,6 +24,19 @@ class MetricType(StrEnum):
     currency = "currency"
 
 
+def get_monthly_recurring_amount_expression() -> ColumnElement[int]:
+    return case(
+        (
+            Subscription.recurring_interval == SubscriptionRecurringInterval.year,
+            func.round(Subscription.amount / 12),
+        ),
+        (
+            Subscription.recurring_interval == SubscriptionRecurringInterval.month,
+            Subscription.amount,
+        ),
+    )
+
+
 class Metric(Protocol):
     slug: ClassVar[str]
     display_name: ClassVar[str]
@@ -27,6 +48,15 @@ class Metric(Protocol):
         cls, t: ColumnElement[datetime], i: TimeInterval
     ) -> ColumnElement[int]: ...
 
+    @classmethod
+    def get_daily_sql_expression(cls, periods: Subquery) -> ColumnElement[int]:
+        """
+        Expression of the metric over the periods computed from the daily metrics.
+
+        See `polar.metrics.daily.get_daily_metrics_periods`.
+        """
+        return periods.c[cls.slug]
+
 
 class OrdersMetric(Metric):
     slug = "orders"
@@ -79,6 +109,15 @@ class AverageOrderValueMetric(Metric):
     ) -> ColumnElement[int]:
         return func.cast(func.ceil(func.avg(Order.net_amount)), Integer)
 
+    @classmethod
+    def get_daily_sql_expression(cls, periods: Subquery) -> ColumnElement[int]:
+        return func.cast(
+            func.ceil(
+                func.cast(periods.c.revenue, Numeric) / func.nullif(periods.c.orders, 0)
+            ),
+            Integer,
+        )
+
 
 class OneTimeProductsMetric(Metric):
     slug = "one_time_products"
@@ -177,6 +216,10 @@ class RenewedSubscriptionsRevenueMetric(Metric):
             != i.sql_date_trunc(t)
         )
 
+    @classmethod
+    def get_daily_sql_expression(cls, periods: Subquery) -> ColumnElement[int]:
+        return periods.c.subscriptions_revenue - periods.c.new_subscriptions_revenue
+
 
 class ActiveSubscriptionsMetric(Metric):
     slug = "active_subscriptions"
@@ -201,23 +244,7 @@ class MonthlyRecurringRevenueMetric(Metric):
     def get_sql_expression(
         cls, t: ColumnElement[datetime], i: TimeInterval
     ) -> ColumnElement[int]:
-        return func.coalesce(
-            func.sum(
-                case(
-                    (
-                        Subscription.recurring_interval
-                        == SubscriptionRecurringInterval.year,
-                        func.round(Subscription.amount / 12),
-                    ),
-                    (
-                        Subscription.recurring_interval
-                        == SubscriptionRecurringInterval.month,
-                        Subscription.amount,
-                    ),
-                )
-            ),
-            0,
-        )
+        return func.coalesce(func.sum(get_monthly_recurring_amount_expression()), 0)
 
 
 METRICS: list[type[Metric]] = [
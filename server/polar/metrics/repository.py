@@ -0,0 +1,156 @@
+from datetime import date, datetime
+from uuid import UUID
+
+from sqlalchemy import Date, delete, func, literal, select
+from sqlalchemy.dialects import postgresql
+
+from polar.kit.repository import RepositoryBase
+from polar.models import (
+    Order,
+    OrderDailyMetrics,
+    OrderDailyMetricsCheckpoint,
+    Product,
+)
+
+from .daily import ORDER_METRICS_COLUMNS, get_order_daily_metrics_statement
+
+
+class OrderDailyMetricsRepository(RepositoryBase[OrderDailyMetrics]):
+    model = OrderDailyMetrics
+
+    async def get_outdated(self, today: date) -> dict[UUID, date | None]:
+        """
+        Get the products whose daily metrics need to be refreshed.
+
+        Returns:
+            The day from which the metrics of each product need to be refreshed,
+            or `None` if they were never materialized.
+        """
+        outdated: dict[UUID, date | None] = {}
+
+        never_materialized_statement = (
+            select(Order.product_id)
+            .distinct()
+            .where(
+                Order.product_id.not_in(select(OrderDailyMetricsCheckpoint.product_id)),
+            )
+        )
+        for product_id in (
+            await self.session.execute(never_materialized_statement)
+        ).scalars():
+            outdated[product_id] = None
+
+        # Orders modified after the last refresh, e.g. when they're refunded,
+        # are refreshed from their day
+        modified_day = func.min(
+            func.cast(func.date_trunc("day", Order.created_at), Date)
+        )
+        checkpoints_statement = (
+            select(
+                OrderDailyMetricsCheckpoint.product_id,
+                OrderDailyMetricsCheckpoint.materialized_until,
+                modified_day,
+            )
+            .join(
+                Order,
+                isouter=True,
+                onclause=(Order.product_id == OrderDailyMetricsCheckpoint.product_id)
+                & (Order.modified_at > OrderDailyMetricsCheckpoint.refreshed_at),
+            )
+            .group_by(
+                OrderDailyMetricsCheckpoint.product_id,
+                OrderDailyMetricsCheckpoint.materialized_until,
+            )
+        )
+        result = await self.session.execute(checkpoints_statement)
+        for product_id, materialized_until, min_modified_day in result.tuples():
+            days = [
+                day
+                for day in (
+                    materialized_until if materialized_until < today else None,
+                    min_modified_day,
+                )
+                if day is not None
+            ]
+            if days:
+                outdated[product_id] = min(days)
+
+        return outdated
+
+    async def get_modified_organization_ids(self, before: datetime) -> set[UUID]:
+        """
+        Get the organizations having orders created before the given time,
+        and modified after the last refresh of their product.
+        """
+        statement = (
+            select(Product.organization_id)
+            .distinct()
+            .join(Order, onclause=Order.product_id == Product.id)
+            .join(
+                OrderDailyMetricsCheckpoint,
+                onclause=(OrderDailyMetricsCheckpoint.product_id == Product.id)
+                & (Order.modified_at > OrderDailyMetricsCheckpoint.refreshed_at),
+            )
+            .where(Order.created_at < before)
+        )
+        result = await self.session.execute(statement)
+        return set(result.scalars().all())
+
+    async def refresh(self, product_id: UUID, since: date | None, until: date) -> None:
+        """
+        Recompute the daily metrics of a product from `since`, included,
+        until `until`, excluded, and move its checkpoint to `until`.
+        """
+        delete_statement = delete(OrderDailyMetrics).where(
+            OrderDailyMetrics.product_id == product_id
+        )
+        if since is not None:
+            delete_statement = delete_statement.where(OrderDailyMetrics.day >= since)
+        await self.session.execute(delete_statement)
+
+        daily_metrics = get_order_daily_metrics_statement(
+            Order.product_id == product_id,
+            since=literal(since, Date) if since is not None else None,
+            until=until,
+        ).subquery()
+        insert_statement = postgresql.insert(OrderDailyMetrics).from_select(
+            [
+                OrderDailyMetrics.id,
+                OrderDailyMetrics.created_at,
+                OrderDailyMetrics.organization_id,
+                OrderDailyMetrics.product_id,
+                OrderDailyMetrics.day,
+                *(
+                    getattr(OrderDailyMetrics, column)
+                    for column in ORDER_METRICS_COLUMNS
+                ),
+            ],
+            select(
+                func.gen_random_uuid(),
+                func.now(),
+                daily_metrics.c.organization_id,
+                daily_metrics.c.product_id,
+                daily_metrics.c.day,
+                *(daily_metrics.c[column] for column in ORDER_METRICS_COLUMNS),
+            ),
+        )
+        await self.session.execute(insert_statement)
+
+        # `now()` is the start of the transaction:
+        # orders modified while refreshing will be refreshed next time
+        checkpoint_statement = postgresql.insert(OrderDailyMetricsCheckpoint).values(
+            id=func.gen_random_uuid(),
+            created_at=func.now(),
+            product_id=product_id,
+            materialized_until=until,
+            refreshed_at=func.now(),
+        )
+        checkpoint_statement = checkpoint_statement.on_conflict_do_update(
+            index_elements=[OrderDailyMetricsCheckpoint.product_id],
+            set_={
+                "materialized_until": checkpoint_statement.excluded.materialized_until,
+                "refreshed_at": checkpoint_statement.excluded.refreshed_at,
+                "modified_at": func.now(),
+            },
+        )
+        await self.session.execute(checkpoint_statement)
@@ -1,17 +1,23 @@
 import uuid
 from collections.abc import Sequence
 from datetime import UTC, date, datetime
+from typing import Any
 
-from sqlalchemy import ColumnElement, FromClause, select
+from sqlalchemy import CTE, ColumnElement, FromClause, Select, func, select
 
-from polar.auth.models import AuthSubject
+from polar.auth.models import AuthSubject, is_organization
 from polar.kit.time_queries import TimeInterval, get_timestamp_series_cte
-from polar.models import Organization, User
+from polar.kit.utils import utc_now
+from polar.models import Organization, User, UserOrganization
 from polar.models.product import ProductBillingType
 from polar.postgres import AsyncSession
+from polar.redis import Redis
+from polar.result_cache import ResultCache, get_open_since
 
+from .daily import DAILY_INTERVALS, get_daily_metrics_periods
 from .metrics import METRICS
 from .queries import QUERIES
+from .repository import OrderDailyMetricsRepository
 from .schemas import MetricsPeriod, MetricsResponse
 
 
@@ -28,7 +34,50 @@ class MetricsService:
         product_id: Sequence[uuid.UUID] | None = None,
         billing_type: Sequence[ProductBillingType] | None = None,
         customer_id: Sequence[uuid.UUID] | None = None,
+        redis: Redis | None = None,
     ) -> MetricsResponse:
+        """
+        Compute the metrics over a time period.
+
+        If `redis` is given, the result is cached.
+        """
+        if redis is not None:
+            return await ResultCache(redis).get_or_compute(
+                "metrics",
+                MetricsResponse,
+                lambda: self.get_metrics(
+                    session,
+                    auth_subject,
+                    start_date=start_date,
+                    end_date=end_date,
+                    interval=interval,
+                    organization_id=organization_id,
+                    product_id=product_id,
+                    billing_type=billing_type,
+                    customer_id=customer_id,
+                ),
+                organization_ids=await self._get_readable_organization_ids(
+                    session, auth_subject, organization_id
+                ),
+                parameters={
+                    "subject": (
+                        type(auth_subject.subject).__name__,
+                        auth_subject.subject.id,
+                    ),
+                    "start_date": start_date,
+                    "end_date": end_date,
+                    "interval": interval,
+                    "organization_id": sorted(organization_id or []),
+                    "product_id": sorted(product_id or []),
+                    "billing_type": sorted(billing_type or []),
+                    "customer_id": sorted(customer_id or []),
+                },
+                # The last period is open until its end, even if `end_date` isn't
+                end=interval.get_period_end(
+                    datetime(end_date.year, end_date.month, end_date.day, tzinfo=UTC)
+                ),
+            )
+
         start_timestamp = datetime(
             start_date.year, start_date.month, start_date.day, 0, 0, 0, 0, UTC
         )
@@ -39,6 +88,106 @@ class MetricsService:
         timestamp_series = get_timestamp_series_cte(
             start_timestamp, end_timestamp, interval
         )
+
+        statement: Select[Any]
+        if interval in DAILY_INTERVALS and customer_id is None:
+            daily_periods = get_daily_metrics_periods(
+                timestamp_series,
+                interval,
+                auth_subject,
+                organization_id=organization_id,
+                product_id=product_id,
+                billing_type=billing_type,
+            )
+            statement = select(
+                daily_periods.c.timestamp,
+                *(
+                    func.coalesce(
+                        metric.get_daily_sql_expression(daily_periods), 0
+                    ).label(metric.slug)
+                    for metric in METRICS
+                ),
+            ).order_by(daily_periods.c.timestamp.asc())
+        else:
+            statement = self._get_live_metrics_statement(
+                timestamp_series,
+                interval,
+                auth_subject,
+                organization_id=organization_id,
+                product_id=product_id,
+                billing_type=billing_type,
+                customer_id=customer_id,
+            )
+
+        result = await session.stream(statement)
+        periods: list[MetricsPeriod] = []
+        async for row in result:
+            periods.append(MetricsPeriod(**row._asdict()))
+        return MetricsResponse.model_validate(
+            {"periods": periods, "metrics": {m.slug: m for m in METRICS}}
+        )
+
+    async def get_outdated(
+        self, session: AsyncSession
+    ) -> tuple[dict[uuid.UUID, date | None], set[uuid.UUID]]:
+        """
+        Get the products having new or modified orders since their last refresh.
+
+        Returns:
+            The day from which the daily metrics of each product need to be
+            refreshed, and the organizations whose cached metrics of closed periods
+            are stale because their orders were modified.
+        """
+        repository = OrderDailyMetricsRepository.from_session(session)
+        outdated = await repository.get_outdated(utc_now().date())
+        organization_ids = await repository.get_modified_organization_ids(
+            get_open_since()
+        )
+        return outdated, organization_ids
+
+    async def refresh_product(
+        self, session: AsyncSession, product_id: uuid.UUID, since: date | None
+    ) -> None:
+        """Refresh the daily metrics of a product from `since` until today."""
+        repository = OrderDailyMetricsRepository.from_session(session)
+        await repository.refresh(product_id, since, utc_now().date())
+
+    async def invalidate_cache(
+        self, redis: Redis, organization_ids: set[uuid.UUID]
+    ) -> None:
+        await ResultCache(redis).invalidate(organization_ids)
+
+    async def _get_readable_organization_ids(
+        self,
+        session: AsyncSession,
+        auth_subject: AuthSubject[User | Organization],
+        organization_id: Sequence[uuid.UUID] | None,
+    ) -> Sequence[uuid.UUID]:
+        if is_organization(auth_subject):
+            return [auth_subject.subject.id]
+
+        statement = select(UserOrganization.organization_id).where(
+            UserOrganization.user_id == auth_subject.subject.id,
+            UserOrganization.deleted_at.is_(None),
+        )
+        if organization_id is not None:
+            statement = statement.where(
+                UserOrganization.organization_id.in_(organization_id)
+            )
+        result = await session.execute(statement)
+        return result.scalars().all()
+
+    def _get_live_metrics_statement(
+        self,
+        timestamp_series: CTE,
+        interval: TimeInterval,
+        auth_subject: AuthSubject[User | Organization],
+        *,
+        organization_id: Sequence[uuid.UUID] | None = None,
+        product_id: Sequence[uuid.UUID] | None = None,
+        billing_type: Sequence[ProductBillingType] | None = None,
+        customer_id: Sequence[uuid.UUID] | None = None,
+    ) -> Select[Any]:
         timestamp_column: ColumnElement[datetime] = timestamp_series.c.timestamp
 
         queries = [
@@ -62,7 +211,7 @@ class MetricsService:
                 onclause=query.c.timestamp == timestamp_column,
             )
 
-        statement = (
+        return (
             select(
                 timestamp_column.label("timestamp"),
                 *queries,
@@ -71,13 +220,5 @@ class MetricsService:
             .order_by(timestamp_column.asc())
         )
 
-        result = await session.stream(statement)
-        periods: list[MetricsPeriod] = []
-        async for row in result:
-            periods.append(MetricsPeriod(**row._asdict()))
-        return MetricsResponse.model_validate(
-            {"periods": periods, "metrics": {m.slug: m for m in METRICS}}
-        )
-
 
 metrics = MetricsService()
@@ -0,0 +1,24 @@
+from apscheduler.triggers.cron import CronTrigger
+
+from polar.worker import AsyncSessionMaker, JobContext, get_worker_redis, task
+
+from .service import metrics as metrics_service
+
+
+@task(
+    "metrics.refresh",
+    cron_trigger=CronTrigger.from_crontab("*/5 * * * *"),
+    keep_result=0,
+)
+async def metrics_refresh(ctx: JobContext) -> None:
+    async with AsyncSessionMaker(ctx) as session:
+        outdated, organization_ids = await metrics_service.get_outdated(session)
+
+    # Each product is refreshed and committed separately,
+    # so a long refresh doesn't hold a transaction over all the orders
+    for product_id, since in outdated.items():
+        async with AsyncSessionMaker(ctx) as session:
+            await metrics_service.refresh_product(session, product_id, since)
+
+    # Once committed, so concurrent reads can't cache stale results again
+    await metrics_service.invalidate_cache(get_worker_redis(ctx), organization_ids)
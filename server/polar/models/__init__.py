@@ -29,12 +29,14 @@ from .license_key import LicenseKey
 from .license_key_activation import LicenseKeyActivation
 from .magic_link import MagicLink
 from .meter import Meter
+from .meter_rollup import MeterRollup
 from .notification import Notification
 from .oauth2_authorization_code import OAuth2AuthorizationCode
 from .oauth2_client import OAuth2Client
 from .oauth2_grant import OAuth2Grant
 from .oauth2_token import OAuth2Token
 from .order import Order
+from .order_daily_metrics import OrderDailyMetrics, OrderDailyMetricsCheckpoint
 from .order_item import OrderItem
 from .organization import Organization
 from .organization_access_token import OrganizationAccessToken
@@ -100,6 +102,7 @@ __all__ = [
     "LicenseKeyActivation",
     "MagicLink",
     "Meter",
+    "MeterRollup",
     "Notification",
     "OAuth2AuthorizationCode",
     "OAuth2Client",
@@ -107,6 +110,8 @@ __all__ = [
     "OAuth2Token",
     "OAuthAccount",
     "Order",
+    "OrderDailyMetrics",
+    "OrderDailyMetricsCheckpoint",
     "OrderItem",
     "Organization",
     "OrganizationAccessToken",
@@ -10,6 +10,7 @@ from sqlalchemy import (
     Column,
     ForeignKey,
     Index,
+    Integer,
     String,
     UniqueConstraint,
     Uuid,
@@ -125,6 +126,16 @@ class Customer(MetadataMixin, RecordModel):
         nullable=False,
     )
 
+    state_version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    """
+    Incremented every time the customer state changes,
+    i.e. the customer, its subscriptions or its benefit grants.
+
+    It identifies the current snapshot of the customer state.
+    """
+
     @declared_attr
     def organization(cls) -> Mapped["Organization"]:
         return relationship("Organization", lazy="raise")
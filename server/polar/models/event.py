@@ -5,14 +5,17 @@ from uuid import UUID
 
 from sqlalchemy import (
     TIMESTAMP,
+    BigInteger,
     ColumnElement,
     ForeignKey,
+    Index,
     String,
     Uuid,
     and_,
     exists,
     or_,
     select,
+    text,
 )
 from sqlalchemy.orm import (
     Mapped,
@@ -92,11 +95,32 @@ class CustomerComparator(Relationship.Comparator[Customer]):
 
 class Event(Model, MetadataMixin):
     __tablename__ = "events"
+    __table_args__ = (
+        Index("ix_events_organization_id_ingest_xid", "organization_id", "ingest_xid"),
+        # Serves the containment and JSON path predicates of meter filters
+        Index(
+            "ix_events_user_metadata",
+            "user_metadata",
+            postgresql_using="gin",
+            postgresql_ops={"user_metadata": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[UUID] = mapped_column(Uuid, primary_key=True, default=generate_uuid)
     ingested_at: Mapped[datetime.datetime] = mapped_column(
         TIMESTAMP(timezone=True), nullable=False, default=utc_now, index=True
     )
+    ingest_xid: Mapped[int | None] = mapped_column(
+        BigInteger,
+        nullable=True,
+        server_default=text("pg_current_xact_id()::text::bigint"),
+    )
+    """
+    ID of the transaction which inserted the event.
+
+    Unlike `ingested_at`, it tells whether the event is committed: all the
+    transactions below the oldest running one are finished.
+    """
     timestamp: Mapped[datetime.datetime] = mapped_column(
         TIMESTAMP(timezone=True), nullable=False, default=utc_now, index=True
     )
@@ -1,7 +1,7 @@
 from typing import TYPE_CHECKING
 from uuid import UUID
 
-from sqlalchemy import ForeignKey, String, Uuid
+from sqlalchemy import BigInteger, ForeignKey, String, Uuid
 from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
 
 from polar.kit.db.models.base import RecordModel
@@ -24,6 +24,13 @@ class Meter(RecordModel, MetadataMixin):
         Uuid, ForeignKey("events.id"), nullable=True, index=True, default=None
     )
 
+    rolled_up_xid: Mapped[int | None] = mapped_column(
+        BigInteger, nullable=True, default=None
+    )
+    """
+    Events inserted by transactions below this ID are aggregated in `MeterRollup`.
+    """
+
     @declared_attr
     def last_billed_event(cls) -> Mapped["Event | None"]:
         return relationship("Event", lazy="raise_on_sql")
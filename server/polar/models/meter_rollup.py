@@ -0,0 +1,61 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from sqlalchemy import (
+    TIMESTAMP,
+    BigInteger,
+    ForeignKey,
+    Numeric,
+    String,
+    UniqueConstraint,
+    Uuid,
+)
+from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
+
+from polar.kit.db.models.base import RecordModel
+
+if TYPE_CHECKING:
+    from .meter import Meter
+
+
+class MeterRollup(RecordModel):
+    """
+    Pre-aggregated events of a meter, per customer and per hour.
+
+    Maintained incrementally from the events committed until `Meter.rolled_up_xid`.
+    """
+
+    __tablename__ = "meter_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "meter_id",
+            "timestamp",
+            "customer_id",
+            "external_customer_id",
+            name="meter_rollups_meter_id_timestamp_customer_key",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
+
+    meter_id: Mapped[UUID] = mapped_column(
+        Uuid, ForeignKey("meters.id", ondelete="cascade"), nullable=False
+    )
+    timestamp: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False
+    )
+    customer_id: Mapped[UUID | None] = mapped_column(
+        Uuid, ForeignKey("customers.id"), nullable=True, index=True
+    )
+    external_customer_id: Mapped[str | None] = mapped_column(
+        String, nullable=True, index=True
+    )
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    sum: Mapped[Decimal | None] = mapped_column(Numeric, nullable=True, default=None)
+    min: Mapped[Decimal | None] = mapped_column(Numeric, nullable=True, default=None)
+    max: Mapped[Decimal | None] = mapped_column(Numeric, nullable=True, default=None)
+
+    @declared_attr
+    def meter(cls) -> Mapped["Meter"]:
+        return relationship("Meter", lazy="raise")
@@ -0,0 +1,104 @@
+from datetime import date, datetime
+from typing import TYPE_CHECKING
+from uuid import UUID
+
+from sqlalchemy import (
+    TIMESTAMP,
+    BigInteger,
+    Date,
+    ForeignKey,
+    UniqueConstraint,
+    Uuid,
+)
+from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
+
+from polar.kit.db.models.base import RecordModel
+
+if TYPE_CHECKING:
+    from .product import Product
+
+
+class OrderDailyMetrics(RecordModel):
+    """
+    Pre-aggregated orders of a product, per day.
+
+    Metrics depending on the period they're computed for, like new subscriptions
+    revenue, are stored for each interval of at least a day.
+    Days before `OrderDailyMetricsCheckpoint.materialized_until` are stored,
+    the following ones are computed on the fly.
+    """
+
+    __tablename__ = "order_daily_metrics"
+    __table_args__ = (UniqueConstraint("product_id", "day"),)
+
+    organization_id: Mapped[UUID] = mapped_column(
+        Uuid, ForeignKey("organizations.id", ondelete="cascade"), index=True
+    )
+    product_id: Mapped[UUID] = mapped_column(
+        Uuid, ForeignKey("products.id", ondelete="cascade")
+    )
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+
+    orders: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    revenue: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    one_time_products: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    one_time_products_revenue: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    subscriptions_revenue: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+
+    new_subscriptions_revenue_day: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    new_subscriptions_revenue_week: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    new_subscriptions_revenue_month: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    new_subscriptions_revenue_year: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+
+    renewed_subscriptions_day: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    renewed_subscriptions_week: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    renewed_subscriptions_month: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+    renewed_subscriptions_year: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0
+    )
+
+    @declared_attr
+    def product(cls) -> Mapped["Product"]:
+        return relationship("Product", lazy="raise")
+
+
+class OrderDailyMetricsCheckpoint(RecordModel):
+    """
+    State of the materialized daily metrics of a product.
+    """
+
+    __tablename__ = "order_daily_metrics_checkpoints"
+
+    product_id: Mapped[UUID] = mapped_column(
+        Uuid, ForeignKey("products.id", ondelete="cascade"), unique=True
+    )
+    materialized_until: Mapped[date] = mapped_column(Date, nullable=False)
+    """Day until which, excluded, the daily metrics are stored."""
+    refreshed_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), nullable=False
+    )
+    """Time of the last refresh. Orders modified after need to be refreshed."""
+
+    @declared_attr
+    def product(cls) -> Mapped["Product"]:
+        return relationship("Product", lazy="raise")
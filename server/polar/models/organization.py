@@ -164,6 +164,12 @@ class Organization(RecordModel):
         JSONB, nullable=False, default=dict
     )
 
+    # Incremented with each change of the webhook endpoints, in the same transaction,
+    # so processes know their index of the endpoints is outdated once it's committed
+    webhook_endpoints_version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+
     #
     # Fields synced from GitHub
     #
@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from sqlalchemy import Boolean, ForeignKey, Integer, Uuid
+from sqlalchemy import Boolean, ForeignKey, Index, Integer, Uuid
 from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
 
 from polar.kit.db.models.base import RecordModel
@@ -9,6 +9,14 @@ from polar.models.webhook_event import WebhookEvent
 
 class WebhookDelivery(RecordModel):
     __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        Index(
+            "ix_webhook_deliveries_endpoint_id_created_at_id",
+            "webhook_endpoint_id",
+            "created_at",
+            "id",
+        ),
+    )
 
     webhook_endpoint_id: Mapped[UUID] = mapped_column(
         Uuid,
@@ -1,6 +1,6 @@
 from uuid import UUID
 
-from sqlalchemy import Boolean, ForeignKey, Integer, String, Uuid
+from sqlalchemy import Boolean, ForeignKey, Index, Integer, String, Uuid
 from sqlalchemy.orm import Mapped, declared_attr, mapped_column, relationship
 
 from polar.kit.db.models.base import RecordModel
@@ -9,6 +9,14 @@ from polar.models.webhook_endpoint import WebhookEndpoint
 
 class WebhookEvent(RecordModel):
     __tablename__ = "webhook_events"
+    __table_args__ = (
+        # Serves the payload purge, which only looks at the non-purged events
+        Index(
+            "ix_webhook_events_created_at_payload",
+            "created_at",
+            postgresql_where="payload IS NOT NULL",
+        ),
+    )
 
     webhook_endpoint_id: Mapped[UUID] = mapped_column(
         Uuid,
@@ -25,4 +33,5 @@ class WebhookEvent(RecordModel):
 
     succeeded: Mapped[bool | None] = mapped_column(Boolean, nullable=True)
 
-    payload: Mapped[str] = mapped_column(String, nullable=False)
+    # Purged once `WEBHOOK_PAYLOAD_RETENTION` is elapsed
+    payload: Mapped[str | None] = mapped_column(String, nullable=True)
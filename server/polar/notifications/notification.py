@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from collections.abc import Sequence
 from datetime import datetime
 from enum import StrEnum
 from typing import Annotated, Literal
@@ -48,6 +49,15 @@ class NotificationPayloadBase(BaseModel):
         email_renderer = get_email_renderer()
         return email_renderer.render_from_string(self.subject(), self.body(), m)
 
+    @staticmethod
+    def render_batch(
+        payloads: Sequence["NotificationPayloadBase"],
+    ) -> list[tuple[str, str]]:
+        email_renderer = get_email_renderer()
+        return email_renderer.render_batch_from_string(
+            [(p.subject(), p.body(), dict(vars(p))) for p in payloads]
+        )
+
 
 class NotificationBase(Schema):
     id: UUID4
@@ -73,12 +73,28 @@ class NotificationsService:
         notif: PartialNotification,
     ) -> None:
         members = await user_organization_service.list_by_org(session, org_id)
-        for member in members:
-            await self.send_to_user(
-                session=session,
+        if not members:
+            return
+
+        payload = notif.payload.model_dump(mode="json")
+        notifications = [
+            Notification(
                 user_id=member.user_id,
-                notif=notif,
+                type=notif.type,
+                issue_id=notif.issue_id,
+                pledge_id=notif.pledge_id,
+                payload=payload,
             )
+            for member in members
+        ]
+        session.add_all(notifications)
+        await session.flush()
+
+        # Members get the same email, it's rendered once for all of them
+        enqueue_job(
+            "notifications.send_batch",
+            notification_ids=[notification.id for notification in notifications],
+        )
 
     async def send_to_anonymous_email(
         self,
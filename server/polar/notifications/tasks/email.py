@@ -3,13 +3,34 @@ from uuid import UUID
 import structlog
 
 from polar.email.sender import enqueue_email
+from polar.models import Notification
+from polar.notifications.notification import NotificationPayloadBase
 from polar.notifications.service import notifications
+from polar.postgres import AsyncSession
 from polar.user.service.user import user as user_service
 from polar.worker import AsyncSessionMaker, JobContext, PolarWorkerContext, task
 
 log = structlog.get_logger()
 
 
+async def _get_recipient_email(
+    session: AsyncSession, notif: Notification
+) -> str | None:
+    # TODO: support sending to "notif.email_addr"
+
+    # Get users to send to
+    user = await user_service.get(session, notif.user_id)
+    if not user:
+        log.warning("notifications.send.user_not_found", user_id=notif.user_id)
+        return None
+
+    if not user.email:
+        log.warning("notifications.send.user_no_email", user_id=user.id)
+        return None
+
+    return user.email
+
+
 @task("notifications.send")
 async def notifications_send(
     ctx: JobContext,
@@ -23,16 +44,8 @@ async def notifications_send(
                 log.warning("notifications.send.not_found")
                 return
 
-            # TODO: support sending to "notif.email_addr"
-
-            # Get users to send to
-            user = await user_service.get(session, notif.user_id)
-            if not user:
-                log.warning("notifications.send.user_not_found", user_id=notif.user_id)
-                return
-
-            if not user.email:
-                log.warning("notifications.send.user_no_email", user_id=user.id)
+            email = await _get_recipient_email(session, notif)
+            if email is None:
                 return
 
             notification_type = notifications.parse_payload(notif)
@@ -41,13 +54,51 @@ async def notifications_send(
             if not subject or not body:
                 log.error(
                     "notifications.send.could_not_render",
-                    user=user,
+                    user_id=notif.user_id,
                     notif=notif,
                 )
                 return
 
             enqueue_email(
-                to_email_addr=user.email,
+                to_email_addr=email,
                 subject=subject,
                 html_content=body,
             )
+
+
+@task("notifications.send_batch")
+async def notifications_send_batch(
+    ctx: JobContext,
+    notification_ids: list[UUID],
+    polar_context: PolarWorkerContext,
+) -> None:
+    with polar_context.to_execution_context():
+        async with AsyncSessionMaker(ctx) as session:
+            emails: list[str] = []
+            payloads: list[NotificationPayloadBase] = []
+            for notification_id in notification_ids:
+                notif = await notifications.get(session, notification_id)
+                if not notif:
+                    log.warning(
+                        "notifications.send.not_found", notification_id=notification_id
+                    )
+                    continue
+
+                email = await _get_recipient_email(session, notif)
+                if email is None:
+                    continue
+
+                emails.append(email)
+                payloads.append(notifications.parse_payload(notif))
+
+            rendered = NotificationPayloadBase.render_batch(payloads)
+            for email, (subject, body) in zip(emails, rendered, strict=True):
+                if not subject or not body:
+                    log.error("notifications.send.could_not_render", email=email)
+                    continue
+
+                enqueue_email(
+                    to_email_addr=email,
+                    subject=subject,
+                    html_content=body,
+                )
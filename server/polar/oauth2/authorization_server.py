@@ -24,6 +24,7 @@ from sqlalchemy.orm import Session
 from starlette.requests import Request
 from starlette.responses import Response
 
+from polar.auth.token_cache import enqueue_token_cache_invalidation
 from polar.config import settings
 from polar.kit.crypto import generate_token, get_token_hash
 from polar.logging import Logger
@@ -229,6 +230,7 @@ class RevocationEndpoint(_QueryTokenMixin, _RevocationEndpoint):
             token.refresh_token_revoked_at = now  # pyright: ignore
         self.server.session.add(token)
         self.server.session.flush()
+        enqueue_token_cache_invalidation(token.access_token)
 
 
 class IntrospectionEndpoint(_QueryTokenMixin, _IntrospectionEndpoint):
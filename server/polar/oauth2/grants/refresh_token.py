@@ -4,6 +4,7 @@ import typing
 from authlib.oauth2.rfc6749.grants import RefreshTokenGrant as _RefreshTokenGrant
 from sqlalchemy import select
 
+from polar.auth.token_cache import enqueue_token_cache_invalidation
 from polar.config import settings
 from polar.kit.crypto import get_token_hash
 from polar.models import OAuth2Token
@@ -38,3 +39,5 @@ class RefreshTokenGrant(_RefreshTokenGrant):
         refresh_token.refresh_token_revoked_at = int(time.time())  # pyright: ignore
         self.server.session.add(refresh_token)
         self.server.session.flush()
+        # The old access token is revoked along with its refresh token
+        enqueue_token_cache_invalidation(refresh_token.access_token)
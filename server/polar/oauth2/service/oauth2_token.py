@@ -6,6 +6,7 @@ import structlog
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
+from polar.auth.token_cache import enqueue_token_cache_invalidation
 from polar.config import settings
 from polar.email.renderer import get_email_renderer
 from polar.email.sender import enqueue_email
@@ -82,6 +83,7 @@ class OAuth2TokenService(ResourceServiceReader[OAuth2Token]):
         oauth2_token.access_token_revoked_at = int(time.time())  # pyright: ignore
         oauth2_token.refresh_token_revoked_at = int(time.time())  # pyright: ignore
         session.add(oauth2_token)
+        enqueue_token_cache_invalidation(oauth2_token.access_token)
 
         # Notify
         email_renderer = get_email_renderer({"oauth2": "polar.oauth2"})
@@ -1,7 +1,17 @@
 from datetime import datetime
 from uuid import UUID
 
-from sqlalchemy import Select, or_, select, update
+from sqlalchemy import (
+    TIMESTAMP,
+    Select,
+    Uuid,
+    column,
+    func,
+    or_,
+    select,
+    update,
+    values,
+)
 from sqlalchemy.orm import joinedload
 
 from polar.auth.models import AuthSubject, User
@@ -38,11 +48,24 @@ class OrganizationAccessTokenRepository(
             )
         return await self.get_one_or_none(statement)
 
-    async def record_usage(self, id: UUID, last_used_at: datetime) -> None:
+    async def record_usage(self, usages: dict[UUID, datetime]) -> None:
+        """Set the last usage time of several tokens in a single statement."""
+        if not usages:
+            return
+        usages_values = values(
+            column("id", Uuid),
+            column("last_used_at", TIMESTAMP(timezone=True)),
+            name="usages",
+        ).data(list(usages.items()))
         statement = (
             update(OrganizationAccessToken)
-            .where(OrganizationAccessToken.id == id)
-            .values(last_used_at=last_used_at)
+            .where(OrganizationAccessToken.id == usages_values.c.id)
+            .values(
+                last_used_at=func.greatest(
+                    OrganizationAccessToken.last_used_at,
+                    usages_values.c.last_used_at,
+                )
+            )
         )
         await self.session.execute(statement)
 
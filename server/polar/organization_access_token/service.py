@@ -8,6 +8,7 @@ import structlog
 from sqlalchemy import UnaryExpression, asc, desc
 
 from polar.auth.models import AuthSubject
+from polar.auth.token_cache import enqueue_token_cache_invalidation
 from polar.config import settings
 from polar.email.renderer import get_email_renderer
 from polar.email.sender import enqueue_email
@@ -141,15 +142,19 @@ class OrganizationAccessTokenService:
         if update_schema.scopes is not None:
             update_dict["scope"] = " ".join(update_schema.scopes)
 
-        return await repository.update(
+        organization_access_token = await repository.update(
             organization_access_token, update_dict=update_dict
         )
+        # Scopes may have changed
+        enqueue_token_cache_invalidation(organization_access_token.token)
+        return organization_access_token
 
     async def delete(
         self, session: AsyncSession, organization_access_token: OrganizationAccessToken
     ) -> None:
         repository = OrganizationAccessTokenRepository.from_session(session)
         await repository.soft_delete(organization_access_token)
+        enqueue_token_cache_invalidation(organization_access_token.token)
 
     async def revoke_leaked(
         self,
@@ -167,6 +172,7 @@ class OrganizationAccessTokenService:
 
         repository = OrganizationAccessTokenRepository.from_session(session)
         await repository.soft_delete(organization_access_token)
+        enqueue_token_cache_invalidation(organization_access_token.token)
 
         email_renderer = get_email_renderer(
             {"organization_access_token": "polar.organization_access_token"}
@@ -6,6 +6,8 @@ from polar.worker import AsyncSessionMaker, JobContext, PolarWorkerContext, task
 from .repository import OrganizationAccessTokenRepository
 
 
+# Usages are now buffered and flushed by `auth.flush_token_usage`.
+# Kept for one release, to process the jobs enqueued before.
 @task("organization_access_token.record_usage")
 async def record_usage(
     ctx: JobContext,
@@ -15,4 +17,4 @@ async def record_usage(
 ) -> None:
     async with AsyncSessionMaker(ctx) as session:
         repository = OrganizationAccessTokenRepository.from_session(session)
-        await repository.record_usage(organization_access_token_id, last_used_at)
+        await repository.record_usage({organization_access_token_id: last_used_at})
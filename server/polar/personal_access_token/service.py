@@ -3,10 +3,21 @@ from datetime import datetime
 from uuid import UUID
 
 import structlog
-from sqlalchemy import Select, or_, select, update
+from sqlalchemy import (
+    TIMESTAMP,
+    Select,
+    Uuid,
+    column,
+    func,
+    or_,
+    select,
+    update,
+    values,
+)
 from sqlalchemy.orm import joinedload
 
 from polar.auth.models import AuthSubject
+from polar.auth.token_cache import enqueue_token_cache_invalidation
 from polar.config import settings
 from polar.email.renderer import get_email_renderer
 from polar.email.sender import enqueue_email
@@ -73,14 +84,27 @@ class PersonalAccessTokenService(ResourceServiceReader[PersonalAccessToken]):
     ) -> None:
         personal_access_token.set_deleted_at()
         session.add(personal_access_token)
+        enqueue_token_cache_invalidation(personal_access_token.token)
 
     async def record_usage(
-        self, session: AsyncSession, id: UUID, last_used_at: datetime
+        self, session: AsyncSession, usages: dict[UUID, datetime]
     ) -> None:
+        """Set the last usage time of several tokens in a single statement."""
+        if not usages:
+            return
+        usages_values = values(
+            column("id", Uuid),
+            column("last_used_at", TIMESTAMP(timezone=True)),
+            name="usages",
+        ).data(list(usages.items()))
         statement = (
             update(PersonalAccessToken)
-            .where(PersonalAccessToken.id == id)
-            .values(last_used_at=last_used_at)
+            .where(PersonalAccessToken.id == usages_values.c.id)
+            .values(
+                last_used_at=func.greatest(
+                    PersonalAccessToken.last_used_at, usages_values.c.last_used_at
+                )
+            )
         )
         await session.execute(statement)
 
@@ -100,6 +124,7 @@ class PersonalAccessTokenService(ResourceServiceReader[PersonalAccessToken]):
 
         personal_access_token.set_deleted_at()
         session.add(personal_access_token)
+        enqueue_token_cache_invalidation(personal_access_token.token)
 
         email_renderer = get_email_renderer(
             {"personal_access_token": "polar.personal_access_token"}
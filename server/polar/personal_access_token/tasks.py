@@ -6,6 +6,8 @@ from polar.worker import AsyncSessionMaker, JobContext, PolarWorkerContext, task
 from .service import personal_access_token as personal_access_token_service
 
 
+# Usages are now buffered and flushed by `auth.flush_token_usage`.
+# Kept for one release, to process the jobs enqueued before.
 @task("personal_access_token.record_usage")
 async def record_usage(
     ctx: JobContext,
@@ -15,5 +17,5 @@ async def record_usage(
 ) -> None:
     async with AsyncSessionMaker(ctx) as session:
         await personal_access_token_service.record_usage(
-            session, personal_access_token_id, last_used_at
+            session, {personal_access_token_id: last_used_at}
         )
@@ -0,0 +1,135 @@
+import hashlib
+import json
+from collections.abc import Awaitable, Callable, Iterable
+from datetime import datetime
+from typing import Any, TypeVar
+from uuid import UUID
+
+import logfire
+from pydantic import BaseModel
+
+from polar.config import settings
+from polar.kit.utils import utc_now
+from polar.redis import Redis
+
+result_cache_hit_counter = logfire.metric_counter(
+    "result_cache.hit", unit="1", description="Query results served from the cache."
+)
+result_cache_miss_counter = logfire.metric_counter(
+    "result_cache.miss", unit="1", description="Query results computed and cached."
+)
+
+M = TypeVar("M", bound=BaseModel)
+
+
+def get_open_since() -> datetime:
+    """
+    Start of the open period.
+
+    Data may still land in the open period, while data before it is assumed
+    to be immutable, unless explicitly invalidated.
+    """
+    return utc_now() - settings.RESULT_CACHE_OPEN_WINDOW
+
+
+class ResultCache:
+    """
+    Helper class to cache the results of expensive read queries.
+
+    Results are keyed by their parameters and by the generation of the organizations
+    they depend on. Invalidating an organization bumps its generation,
+    so all its results are discarded at once without scanning keys.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+    async def get_or_compute(
+        self,
+        namespace: str,
+        model: type[M],
+        compute: Callable[[], Awaitable[M]],
+        *,
+        organization_ids: Iterable[UUID],
+        parameters: dict[str, Any],
+        end: datetime,
+    ) -> M:
+        """
+        Get a cached result, or compute and cache it.
+
+        Args:
+            namespace: Namespace of the query, e.g. `metrics`.
+            model: Pydantic model of the result.
+            compute: Function computing the result on cache miss.
+            organization_ids: Organizations the result depends on.
+            parameters: Parameters of the query, including the auth scope.
+            end: End of the period covered by the result, i.e. the end of
+            its last bucket. If it's in the open period, the result is cached
+            for a short time.
+        """
+        key = await self._get_key(namespace, organization_ids, parameters)
+
+        cached = await self.redis.get(key)
+        if cached is not None:
+            result_cache_hit_counter.add(1, {"namespace": namespace})
+            return model.model_validate_json(cached)
+
+        result_cache_miss_counter.add(1, {"namespace": namespace})
+        result = await compute()
+        ttl = (
+            settings.RESULT_CACHE_TTL
+            if end < get_open_since()
+            else settings.RESULT_CACHE_OPEN_TTL
+        )
+        await self.redis.set(key, result.model_dump_json(), ex=ttl)
+        return result
+
+    async def invalidate(self, organization_ids: Iterable[UUID]) -> None:
+        """Discard all the cached results of the given organizations."""
+        organization_ids = set(organization_ids)
+        if not organization_ids:
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipeline:
+            for organization_id in organization_ids:
+                pipeline.incr(self._get_generation_key(organization_id))
+            await pipeline.execute()
+
+    async def _get_key(
+        self,
+        namespace: str,
+        organization_ids: Iterable[UUID],
+        parameters: dict[str, Any],
+    ) -> str:
+        sorted_organization_ids = sorted(set(organization_ids))
+        generations: list[str | None] = (
+            await self.redis.mget(
+                [
+                    self._get_generation_key(organization_id)
+                    for organization_id in sorted_organization_ids
+                ]
+            )
+            if sorted_organization_ids
+            else []
+        )
+        payload = json.dumps(
+            {
+                "parameters": parameters,
+                "generations": {
+                    str(organization_id): generation or "0"
+                    for organization_id, generation in zip(
+                        sorted_organization_ids, generations
+                    )
+                },
+            },
+            sort_keys=True,
+            default=str,
+        )
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"polar:result_cache:{namespace}:{digest}"
+
+    def _get_generation_key(self, organization_id: UUID) -> str:
+        return f"polar:result_cache:generation:{organization_id}"
+
+
+__all__ = ["ResultCache", "get_open_since"]
@@ -1,4 +1,4 @@
-from collections.abc import Sequence
+from collections.abc import Iterable, Sequence
 from uuid import UUID
 
 from sqlalchemy.orm import contains_eager
@@ -70,9 +70,15 @@ class SubscriptionProductPriceRepository(
 ):
     model = SubscriptionProductPrice
 
-    async def get_by_customer_and_meter(
-        self, customer_id: UUID, meter_id: UUID
-    ) -> SubscriptionProductPrice | None:
+    async def get_by_customers_and_meter(
+        self, customer_ids: Iterable[UUID], meter_id: UUID
+    ) -> dict[UUID, SubscriptionProductPrice]:
+        """
+        Get the active metered price of several customers for a meter.
+
+        Returns:
+            The prices, by customer ID. Customers without price are omitted.
+        """
         statement = (
             self.get_base_statement()
             .join(
@@ -87,15 +93,20 @@ class SubscriptionProductPriceRepository(
                 ProductPrice.is_metered.is_(True),
                 ProductPriceMeteredUnit.meter_id == meter_id,
                 Subscription.billable.is_(True),
-                Subscription.customer_id == customer_id,
+                Subscription.customer_id.in_(customer_ids),
             )
             # In case customer has several subscriptions, take the earliest one
-            .order_by(Subscription.started_at.asc())
-            .limit(1)
+            .distinct(Subscription.customer_id)
+            .order_by(Subscription.customer_id, Subscription.started_at.asc())
             .options(
                 contains_eager(SubscriptionProductPrice.product_price),
                 contains_eager(SubscriptionProductPrice.subscription),
             )
         )
 
-        return await self.get_one_or_none(statement)
+        return {
+            subscription_product_price.subscription.customer_id: (
+                subscription_product_price
+            )
+            for subscription_product_price in await self.get_all(statement)
+        }
@@ -16,6 +16,7 @@ from polar.auth.models import (
 )
 from polar.checkout.eventstream import CheckoutEvent, publish_checkout_event
 from polar.config import settings
+from polar.customer.repository import CustomerRepository
 from polar.customer_session.service import customer_session as customer_session_service
 from polar.email.renderer import get_email_renderer
 from polar.email.sender import enqueue_email, get_email_sender
@@ -502,6 +503,8 @@ class SubscriptionService(ResourceServiceReader[Subscription]):
         if subscription.active:
             await self._on_subscription_activated(session, subscription)
 
+        customer_repository = CustomerRepository.from_session(session)
+        await customer_repository.bump_state_version(subscription.customer_id)
         enqueue_job(
             "customer.webhook",
             WebhookEventType.customer_state_changed,
@@ -943,6 +946,8 @@ class SubscriptionService(ResourceServiceReader[Subscription]):
         if became_revoked:
             await self._on_subscription_revoked(session, subscription)
 
+        customer_repository = CustomerRepository.from_session(session)
+        await customer_repository.bump_state_version(subscription.customer_id)
         enqueue_job(
             "customer.webhook",
             WebhookEventType.customer_state_changed,
@@ -14,6 +14,7 @@ from polar.integrations.loops import tasks as loops
 from polar.integrations.stripe import tasks as stripe
 from polar.magic_link import tasks as magic_link
 from polar.meter import tasks as meter
+from polar.metrics import tasks as metrics
 from polar.notifications import tasks as notifications
 from polar.order import tasks as order
 from polar.organization import tasks as organization
@@ -39,6 +40,7 @@ __all__ = [
     "github",
     "loops",
     "meter",
+    "metrics",
     "stripe",
     "magic_link",
     "order",
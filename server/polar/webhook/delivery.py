@@ -0,0 +1,152 @@
+import asyncio
+import contextlib
+import random
+import weakref
+from collections.abc import AsyncIterator
+from datetime import timedelta
+from uuid import UUID
+
+import httpx
+
+from polar.config import settings
+from polar.redis import Redis
+from polar.worker import WorkerContext
+
+# Released early when the probe delivery ends, this only covers crashed workers
+_CIRCUIT_BREAKER_PROBE_TIMEOUT = timedelta(seconds=30)
+
+_client: httpx.AsyncClient | None = None
+_endpoint_semaphores: weakref.WeakValueDictionary[UUID, asyncio.Semaphore] = (
+    weakref.WeakValueDictionary()
+)
+
+
+def get_client(ctx: WorkerContext) -> httpx.AsyncClient:
+    """
+    Get the HTTP client shared by the deliveries of the worker.
+
+    Connections, and TLS sessions, are kept alive and reused between deliveries
+    to the same endpoint. HTTP/2 is negotiated when the endpoint supports it.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            ),
+            timeout=httpx.Timeout(20.0, connect=5.0),
+        )
+        ctx["exit_stack"].push_async_callback(_client.aclose)
+    return _client
+
+
+@contextlib.asynccontextmanager
+async def endpoint_concurrency(endpoint_id: UUID) -> AsyncIterator[None]:
+    """Limit the number of concurrent deliveries to an endpoint in the worker."""
+    semaphore = _endpoint_semaphores.get(endpoint_id)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(settings.WEBHOOK_ENDPOINT_MAX_CONCURRENCY)
+        _endpoint_semaphores[endpoint_id] = semaphore
+    async with semaphore:
+        yield
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker of a webhook endpoint, shared by all the workers.
+
+    After `WEBHOOK_CIRCUIT_BREAKER_THRESHOLD` consecutive failures, the circuit
+    opens: deliveries to the endpoint are parked for
+    `WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION` instead of being attempted.
+
+    Once it's elapsed, the circuit is half-open: a single delivery probes the
+    endpoint, while the others stay parked. A success closes the circuit,
+    a failure opens it again. Parked deliveries are spread over
+    `WEBHOOK_CIRCUIT_BREAKER_JITTER`, so they don't all hit the endpoint at once
+    when it recovers.
+    """
+
+    def __init__(self, redis: Redis, endpoint_id: UUID) -> None:
+        self.redis = redis
+        self.endpoint_id = endpoint_id
+
+    async def get_park_delay(self) -> timedelta | None:
+        """
+        Get how long a delivery should be parked,
+        or `None` if it can be attempted.
+        """
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.pttl(self._get_open_key())
+            pipe.exists(self._get_half_open_key())
+            open_ttl, half_open = await pipe.execute()
+
+        if open_ttl > 0:
+            return timedelta(milliseconds=open_ttl) + self._get_jitter()
+
+        # Closed
+        if not half_open:
+            return None
+
+        # Half-open: only the first delivery probes the endpoint
+        if await self.redis.set(
+            self._get_probe_key(), 1, nx=True, px=_CIRCUIT_BREAKER_PROBE_TIMEOUT
+        ):
+            return None
+        probe_ttl = await self.redis.pttl(self._get_probe_key())
+        return timedelta(milliseconds=max(probe_ttl, 0)) + self._get_jitter()
+
+    async def record_success(self) -> None:
+        await self.redis.delete(
+            self._get_failures_key(), self._get_half_open_key(), self._get_probe_key()
+        )
+
+    async def record_failure(self) -> None:
+        failures_key = self._get_failures_key()
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(failures_key)
+            pipe.expire(
+                failures_key, settings.WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION * 2
+            )
+            failures, _ = await pipe.execute()
+
+        threshold = settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD
+        if failures >= threshold:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.set(
+                    self._get_open_key(),
+                    1,
+                    ex=settings.WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION,
+                )
+                pipe.set(
+                    self._get_half_open_key(),
+                    1,
+                    ex=settings.WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION * 2,
+                )
+                pipe.delete(self._get_probe_key())
+                # Half-open: the next failure opens the circuit again
+                pipe.set(
+                    failures_key,
+                    threshold - 1,
+                    ex=settings.WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION * 2,
+                )
+                await pipe.execute()
+
+    def _get_jitter(self) -> timedelta:
+        return settings.WEBHOOK_CIRCUIT_BREAKER_JITTER * random.random()
+
+    def _get_open_key(self) -> str:
+        return f"polar:webhook_circuit_breaker:{self.endpoint_id}:open"
+
+    def _get_half_open_key(self) -> str:
+        return f"polar:webhook_circuit_breaker:{self.endpoint_id}:half_open"
+
+    def _get_probe_key(self) -> str:
+        return f"polar:webhook_circuit_breaker:{self.endpoint_id}:probe"
+
+    def _get_failures_key(self) -> str:
+        return f"polar:webhook_circuit_breaker:{self.endpoint_id}:failures"
+
+
+__all__ = ["CircuitBreaker", "endpoint_concurrency", "get_client"]
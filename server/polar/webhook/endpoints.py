@@ -154,6 +154,14 @@ async def list_webhook_deliveries(
     endpoint_id: UUID4 | None = Query(
         None, description="Filter by webhook endpoint ID."
     ),
+    starting_after: UUID4 | None = Query(
+        None,
+        description=(
+            "Cursor for pagination: only return the deliveries "
+            "created before the delivery with this ID. "
+            "Pages and the total count are then relative to this delivery."
+        ),
+    ),
     session: AsyncSession = Depends(get_db_session),
 ) -> ListResource[WebhookDeliverySchema]:
     """
@@ -162,7 +170,11 @@ async def list_webhook_deliveries(
     Deliveries are all the attempts to deliver a webhook event to an endpoint.
     """
     results, count = await webhook_service.list_deliveries(
-        session, auth_subject, endpoint_id=endpoint_id, pagination=pagination
+        session,
+        auth_subject,
+        endpoint_id=endpoint_id,
+        starting_after=starting_after,
+        pagination=pagination,
     )
 
     return ListResource.from_paginated_results(
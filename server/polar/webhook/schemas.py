@@ -114,7 +114,12 @@ class WebhookEvent(TimestampedSchema):
             " `null` if no delivery has been attempted."
         ),
     )
-    payload: str = Field(description="The payload of the webhook event.")
+    payload: str | None = Field(
+        description=(
+            "The payload of the webhook event."
+            " `null` if it was purged after the retention period."
+        )
+    )
 
 
 class WebhookDelivery(TimestampedSchema):
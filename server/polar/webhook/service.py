@@ -1,12 +1,17 @@
+import time
+from collections import OrderedDict
 from collections.abc import Sequence
+from datetime import datetime
+from typing import NamedTuple
 from uuid import UUID
 
 import structlog
-from sqlalchemy import Select, desc, select, text
+from sqlalchemy import Select, desc, func, select, tuple_, update
 from sqlalchemy.orm import contains_eager, joinedload
 
 from polar.auth.models import AuthSubject, is_organization, is_user
 from polar.checkout.eventstream import CheckoutEvent, publish_checkout_event
+from polar.config import settings
 from polar.exceptions import PolarError, ResourceNotFound
 from polar.kit.db.postgres import AsyncSession
 from polar.kit.pagination import PaginationParams, paginate
@@ -57,6 +62,17 @@ class EventNotSuccessul(WebhookError):
         super().__init__(message)
 
 
+class TargetEndpoint(NamedTuple):
+    id: UUID
+    format: WebhookFormat
+
+
+_ENDPOINTS_INDEX_MAX_SIZE = 10_000
+_endpoints_index: OrderedDict[
+    UUID, tuple[float, int, dict[WebhookEventType, list[TargetEndpoint]]]
+] = OrderedDict()
+
+
 class WebhookService:
     async def list_endpoints(
         self,
@@ -105,6 +121,7 @@ class WebhookService:
         )
         session.add(endpoint)
         await session.flush()
+        await self._increment_endpoints_version(session, endpoint.organization_id)
         return endpoint
 
     async def update_endpoint(
@@ -120,6 +137,7 @@ class WebhookService:
             setattr(endpoint, attr, value)
         session.add(endpoint)
         await session.flush()
+        await self._increment_endpoints_version(session, endpoint.organization_id)
         return endpoint
 
     async def delete_endpoint(
@@ -130,6 +148,7 @@ class WebhookService:
         endpoint.deleted_at = utc_now()
         session.add(endpoint)
         await session.flush()
+        await self._increment_endpoints_version(session, endpoint.organization_id)
         return endpoint
 
     async def list_deliveries(
@@ -138,6 +157,7 @@ class WebhookService:
         auth_subject: AuthSubject[User | Organization],
         *,
         endpoint_id: UUID | None = None,
+        starting_after: UUID | None = None,
         pagination: PaginationParams,
     ) -> tuple[Sequence[WebhookDelivery], int]:
         readable_endpoints_statement = self._get_readable_endpoints_statement(
@@ -153,7 +173,7 @@ class WebhookService:
                 ),
             )
             .options(joinedload(WebhookDelivery.webhook_event))
-            .order_by(desc(WebhookDelivery.created_at))
+            .order_by(desc(WebhookDelivery.created_at), desc(WebhookDelivery.id))
         )
 
         if endpoint_id is not None:
@@ -161,6 +181,16 @@ class WebhookService:
                 WebhookDelivery.webhook_endpoint_id == endpoint_id
             )
 
+        if starting_after is not None:
+            # Keyset pagination: only scan the deliveries after the cursor
+            cursor_statement = select(
+                WebhookDelivery.created_at, WebhookDelivery.id
+            ).where(WebhookDelivery.id == starting_after)
+            statement = statement.where(
+                tuple_(WebhookDelivery.created_at, WebhookDelivery.id)
+                < cursor_statement.scalar_subquery()
+            )
+
         return await paginate(session, statement, pagination=pagination)
 
     async def redeliver_event(
@@ -178,6 +208,8 @@ class WebhookService:
             .where(
                 WebhookEvent.id == id,
                 WebhookEvent.deleted_at.is_(None),
+                # Events whose payload was purged can't be redelivered
+                WebhookEvent.payload.is_not(None),
                 WebhookEndpoint.id.in_(
                     readable_endpoints_statement.with_only_columns(WebhookEndpoint.id)
                 ),
@@ -208,6 +240,9 @@ class WebhookService:
         if event.webhook_endpoint.format != WebhookFormat.raw:
             return
 
+        if event.payload is None:
+            return
+
         payload = WebhookPayloadTypeAdapter.validate_json(event.payload)
 
         if payload.type == WebhookEventType.checkout_updated:
@@ -217,6 +252,46 @@ class WebhookService:
                 {"status": payload.data.status},
             )
 
+    async def count_event_deliveries(
+        self, session: AsyncSession, id: UUID, *, since: datetime
+    ) -> int:
+        statement = select(func.count(WebhookDelivery.id)).where(
+            WebhookDelivery.webhook_event_id == id,
+            WebhookDelivery.created_at >= since,
+        )
+        res = await session.execute(statement)
+        return res.scalar_one()
+
+    async def purge_event_payloads(
+        self, session: AsyncSession, *, before: datetime, batch_size: int
+    ) -> int:
+        """
+        Purge the payload of a batch of events created before the given date.
+
+        The events and their deliveries are kept, so the delivery history
+        of an endpoint is still available.
+
+        Returns:
+            The number of purged events. Below `batch_size`, there are none left.
+        """
+        batch_statement = (
+            select(WebhookEvent.id)
+            .where(
+                # Matches the partial index `ix_webhook_events_created_at_payload`
+                WebhookEvent.created_at < before,
+                WebhookEvent.payload.is_not(None),
+            )
+            .limit(batch_size)
+        )
+        statement = (
+            update(WebhookEvent)
+            .where(WebhookEvent.id.in_(batch_statement.scalar_subquery()))
+            .values(payload=None)
+            .execution_options(synchronize_session=False)
+        )
+        result = await session.execute(statement)
+        return result.rowcount
+
     async def get_event_by_id(
         self, session: AsyncSession, id: UUID
     ) -> WebhookEvent | None:
@@ -243,25 +318,41 @@ class WebhookService:
         target: Organization,
         payload: BaseWebhookPayload,
     ) -> list[WebhookEvent]:
-        events: list[WebhookEvent] = []
-        for e in await self._get_event_target_endpoints(
+        endpoints = await self._get_event_target_endpoints(
             session, event=payload.type, target=target
-        ):
-            try:
-                payload_data = payload.get_payload(e.format, target)
-                event_type = WebhookEvent(
-                    webhook_endpoint_id=e.id, payload=payload_data
+        )
+
+        # Serialize the payload once per format
+        payloads: dict[WebhookFormat, str | None] = {}
+        events: list[WebhookEvent] = []
+        for endpoint in endpoints:
+            if endpoint.format not in payloads:
+                try:
+                    payloads[endpoint.format] = payload.get_payload(
+                        endpoint.format, target
+                    )
+                except UnsupportedTarget as e:
+                    # Log the error but do not raise to not fail the whole request
+                    log.error(e.message)
+                    payloads[endpoint.format] = None
+                except SkipEvent:
+                    payloads[endpoint.format] = None
+
+            payload_data = payloads[endpoint.format]
+            if payload_data is not None:
+                events.append(
+                    WebhookEvent(webhook_endpoint_id=endpoint.id, payload=payload_data)
                 )
-                session.add(event_type)
-                events.append(event_type)
-                await session.flush()
-                enqueue_job("webhook_event.send", webhook_event_id=event_type.id)
-            except UnsupportedTarget as e:
-                # Log the error but do not raise to not fail the whole request
-                log.error(e.message)
-                continue
-            except SkipEvent:
-                continue
+
+        if not events:
+            return events
+
+        # Flush once, so the events are inserted in a single statement
+        session.add_all(events)
+        await session.flush()
+        for event in events:
+            enqueue_job("webhook_event.send", webhook_event_id=event.id)
+
         return events
 
     def _get_readable_endpoints_statement(
@@ -286,20 +377,73 @@ class WebhookService:
 
         return statement
 
+    async def _increment_endpoints_version(
+        self, session: AsyncSession, organization_id: UUID
+    ) -> None:
+        """
+        Outdate the indexes of the organization's endpoints in every process.
+
+        The version is committed with the endpoints change: a process can't see
+        the new version before the new endpoints.
+        """
+        statement = (
+            update(Organization)
+            .where(Organization.id == organization_id)
+            .values(
+                webhook_endpoints_version=Organization.webhook_endpoints_version + 1,
+                # Endpoints are not organization settings: keep its modification time
+                modified_at=Organization.modified_at,
+            )
+        )
+        await session.execute(statement)
+
     async def _get_event_target_endpoints(
         self,
         session: AsyncSession,
         *,
         event: WebhookEventType,
         target: Organization,
-    ) -> Sequence[WebhookEndpoint]:
-        statement = select(WebhookEndpoint).where(
+    ) -> Sequence[TargetEndpoint]:
+        """
+        Get the endpoints of an organization subscribed to an event.
+
+        The endpoints of each organization are indexed by event type in-process.
+        The index is refreshed when the organization's `webhook_endpoints_version`
+        changes, and at least every `WEBHOOK_ENDPOINTS_INDEX_TTL` in case endpoints
+        are changed outside of this service.
+        """
+        version = target.webhook_endpoints_version
+        indexed = _endpoints_index.get(target.id)
+        if (
+            indexed is not None
+            and indexed[0] > time.monotonic()
+            and indexed[1] == version
+        ):
+            _endpoints_index.move_to_end(target.id)
+            return indexed[2].get(event, [])
+
+        statement = select(
+            WebhookEndpoint.id, WebhookEndpoint.format, WebhookEndpoint.events
+        ).where(
             WebhookEndpoint.deleted_at.is_(None),
-            WebhookEndpoint.events.bool_op("@>")(text(f"'[\"{event}\"]'")),
             WebhookEndpoint.organization_id == target.id,
         )
         res = await session.execute(statement)
-        return res.scalars().unique().all()
+        index: dict[WebhookEventType, list[TargetEndpoint]] = {}
+        for id, format, events in res.tuples():
+            for endpoint_event in events:
+                index.setdefault(endpoint_event, []).append(TargetEndpoint(id, format))
+
+        _endpoints_index[target.id] = (
+            time.monotonic() + settings.WEBHOOK_ENDPOINTS_INDEX_TTL.total_seconds(),
+            version,
+            index,
+        )
+        _endpoints_index.move_to_end(target.id)
+        while len(_endpoints_index) > _ENDPOINTS_INDEX_MAX_SIZE:
+            _endpoints_index.popitem(last=False)
+
+        return index.get(event, [])
 
 
 webhook = WebhookService()
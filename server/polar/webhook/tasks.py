@@ -11,27 +11,41 @@ from arq import Retry
 from netaddr import IPAddress
 from standardwebhooks.webhooks import Webhook as StandardWebhook
 
+from polar.config import settings
 from polar.kit.db.postgres import AsyncSession
 from polar.kit.utils import utc_now
 from polar.logging import Logger
 from polar.models.webhook_delivery import WebhookDelivery
 from polar.worker import (
     AsyncSessionMaker,
+    CronTrigger,
     JobContext,
     PolarWorkerContext,
+    QueueName,
     compute_backoff,
     enqueue_job,
+    get_worker_redis,
     task,
 )
 
+from .delivery import CircuitBreaker, endpoint_concurrency, get_client
 from .service import webhook as webhook_service
 
 log: Logger = structlog.get_logger()
 
 MAX_RETRIES = 10
+# Parked deliveries aren't attempted, so they don't count as retries
+MAX_PARKED = 36
+MAX_TRIES = MAX_RETRIES + MAX_PARKED
 
+PURGE_PAYLOADS_BATCH_SIZE = 1000
 
-@task("webhook_event.send", max_tries=MAX_RETRIES)
+
+@task(
+    "webhook_event.send",
+    max_tries=MAX_TRIES,
+    queue=QueueName.high_priority,
+)
 async def webhook_event_send(
     ctx: JobContext,
     webhook_event_id: UUID,
@@ -93,11 +107,45 @@ async def _webhook_event_send(
     if not event:
         raise Exception(f"webhook event not found id={webhook_event_id}")
 
+    if event.payload is None:
+        log.info(
+            "Webhook event payload has been purged, skipping the delivery",
+            webhook_event_id=webhook_event_id,
+        )
+        return
+
     # if not allowed_url(event.webhook_endpoint.url):
     #     raise Exception(
     #         f"invalid webhook url id={webhook_event_id} url={event.webhook_endpoint.url}"
     #     )
 
+    circuit_breaker = CircuitBreaker(get_worker_redis(ctx), event.webhook_endpoint_id)
+    park_delay = await circuit_breaker.get_park_delay()
+    if park_delay is not None:
+        # Out of tries: the job wouldn't be run again
+        if ctx["job_try"] >= MAX_TRIES:
+            log.info(
+                "Webhook endpoint is still failing, giving up the delivery",
+                webhook_endpoint_id=event.webhook_endpoint_id,
+            )
+            event.succeeded = False
+            session.add(event)
+            await session.commit()
+            return
+        log.debug(
+            "Webhook endpoint is failing, parking the delivery",
+            webhook_endpoint_id=event.webhook_endpoint_id,
+        )
+        raise Retry(park_delay)
+
+    # Attempts of this job, excluding the parked ones
+    attempt = (
+        await webhook_service.count_event_deliveries(
+            session, event.id, since=ctx["enqueue_time"]
+        )
+        + 1
+    )
+
     ts = utc_now()
 
     b64secret = base64.b64encode(event.webhook_endpoint.secret.encode("utf-8")).decode(
@@ -121,30 +169,31 @@ async def _webhook_event_send(
     )
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
+        async with endpoint_concurrency(event.webhook_endpoint_id):
+            response = await get_client(ctx).post(
                 event.webhook_endpoint.url,
                 content=event.payload,
                 headers=headers,
-                timeout=20.0,
             )
-            delivery.http_code = response.status_code
-            event.last_http_code = response.status_code
-            response.raise_for_status()
+        delivery.http_code = response.status_code
+        event.last_http_code = response.status_code
+        response.raise_for_status()
     # Error
     except (httpx.HTTPError, SSLError) as e:
         log.debug("An errror occurred while sending a webhook", error=e)
         delivery.succeeded = False
+        await circuit_breaker.record_failure()
         # Permanent failure
-        if ctx["job_try"] >= MAX_RETRIES:
+        if attempt >= MAX_RETRIES or ctx["job_try"] >= MAX_TRIES:
             event.succeeded = False
         # Retry
         else:
-            raise Retry(compute_backoff(ctx["job_try"])) from e
+            raise Retry(compute_backoff(attempt)) from e
     # Success
     else:
         delivery.succeeded = True
         event.succeeded = True
+        await circuit_breaker.record_success()
         enqueue_job("webhook_event.success", webhook_event_id=webhook_event_id)
     # Either way, save the delivery
     finally:
@@ -162,3 +211,19 @@ async def webhook_event_success(
 ) -> None:
     async with AsyncSessionMaker(ctx) as session:
         return await webhook_service.on_event_success(session, webhook_event_id)
+
+
+@task("webhook_event.purge_payloads", cron_trigger=CronTrigger(hour=2, minute=0))
+async def webhook_event_purge_payloads(ctx: JobContext) -> None:
+    before = utc_now() - settings.WEBHOOK_PAYLOAD_RETENTION
+    # Each batch is committed in its own transaction, to keep locks short
+    purged = 0
+    while True:
+        async with AsyncSessionMaker(ctx) as session:
+            batch_purged = await webhook_service.purge_event_payloads(
+                session, before=before, batch_size=PURGE_PAYLOADS_BATCH_SIZE
+            )
+        purged += batch_purged
+        if batch_purged < PURGE_PAYLOADS_BATCH_SIZE:
+            break
+    log.info("Purged webhook event payloads", purged=purged)
@@ -3,9 +3,11 @@ import contextlib
 import contextvars
 import functools
 import random
+import signal
+import time
 import uuid
-from collections.abc import AsyncIterator, Awaitable, Callable
-from datetime import datetime
+from collections.abc import AsyncIterator, Awaitable, Callable, Mapping
+from datetime import UTC, datetime, timedelta
 from enum import Enum
 from typing import Any, ParamSpec, TypeAlias, TypedDict, TypeVar, cast
 
@@ -16,13 +18,17 @@ from apscheduler.triggers.cron import CronTrigger
 from arq import func
 from arq.connections import ArqRedis, RedisSettings
 from arq.connections import create_pool as arq_create_pool
+from arq.constants import job_key_prefix, result_key_prefix
 from arq.cron import CronJob
+from arq.jobs import serialize_job
 from arq.typing import SecondsTimedelta
-from arq.worker import Function
+from arq.utils import timestamp_ms, to_ms, to_unix_ms
+from arq.worker import Function, create_worker
 from pydantic import BaseModel
 
 from polar.config import settings
 from polar.context import ExecutionContext
+from polar.email.react import close_email_renderer_pool
 from polar.kit.db.postgres import (
     AsyncEngine,
     AsyncSession,
@@ -31,6 +37,7 @@ from polar.kit.db.postgres import (
 from polar.kit.db.postgres import (
     AsyncSessionMaker as AsyncSessionMakerType,
 )
+from polar.kit.utils import utc_now
 from polar.logfire import instrument_httpx, instrument_sqlalchemy
 from polar.logging import generate_correlation_id
 from polar.postgres import create_async_engine
@@ -74,7 +81,19 @@ class PolarWorkerContext(BaseModel):
 
 class QueueName(Enum):
     default = "arq:queue"
+    # Latency-critical jobs, like the ones a customer is waiting for
+    high_priority = "arq:queue:high_priority"
     github_crawl = "arq:queue:github_crawl"
+    # Low-priority queue for long-running jobs processing lots of objects
+    bulk = "arq:queue:bulk"
+
+
+# Queue of each task, declared with `@task`
+_task_queues: dict[str, QueueName] = {}
+
+
+def get_task_queue(name: str) -> QueueName:
+    return _task_queues.get(name, QueueName.default)
 
 
 def get_redis_settings() -> RedisSettings:
@@ -104,6 +123,7 @@ class WorkerSettings:
         # Create a dedicated Redis instance instead of sharing the ARQ one,
         # because we need to have decode_responses=True.
         redis = await exit_stack.enter_async_context(create_redis())
+        exit_stack.push_async_callback(close_email_renderer_pool)
 
         ctx.update(
             {
@@ -181,6 +201,91 @@ class WorkerSettingsGitHubCrawl(WorkerSettings):
         return await WorkerSettings.on_job_end(ctx)
 
 
+class WorkerSettingsBulk(WorkerSettings):
+    queue_name: str = QueueName.bulk.value
+    functions: list[Function] = []
+    cron_jobs: list[CronJob] = []
+    health_check_interval = settings.WORKER_HEALTH_CHECK_INTERVAL
+    redis_settings = get_redis_settings()
+
+    @staticmethod
+    async def on_startup(ctx: WorkerContext) -> None:
+        return await WorkerSettings.on_startup(ctx)
+
+    @staticmethod
+    async def on_shutdown(ctx: WorkerContext) -> None:
+        return await WorkerSettings.on_shutdown(ctx)
+
+    @staticmethod
+    async def on_job_start(ctx: JobContext) -> None:
+        return await WorkerSettings.on_job_start(ctx)
+
+    @staticmethod
+    async def on_job_end(ctx: JobContext) -> None:
+        return await WorkerSettings.on_job_end(ctx)
+
+
+def get_queues_max_jobs(
+    weights: Mapping[QueueName, int], max_jobs: int
+) -> dict[QueueName, int]:
+    """
+    Split the job slots of a worker process between queues, by weight.
+
+    Each queue is guaranteed its share of slots, and at least one:
+    a burst of jobs on a queue can't hold back the jobs of the others.
+    """
+    total_weight = sum(weights.values())
+    queues_max_jobs = {
+        queue: max(1, max_jobs * weight // total_weight)
+        for queue, weight in weights.items()
+    }
+    # Give the slots left by rounding to the heaviest queues
+    remaining = max_jobs - sum(queues_max_jobs.values())
+    for queue in sorted(weights, key=lambda q: weights[q], reverse=True)[:remaining]:
+        queues_max_jobs[queue] += 1
+    return queues_max_jobs
+
+
+def run_workers(weights: Mapping[QueueName, int], *, max_jobs: int) -> None:
+    """
+    Run a worker for each queue in the current process.
+
+    Workers run concurrently, each one limited to its share of `max_jobs`.
+    """
+    queues_max_jobs = get_queues_max_jobs(weights, max_jobs)
+    log.info(
+        "polar.worker.run",
+        queues={queue.name: jobs for queue, jobs in queues_max_jobs.items()},
+    )
+    workers = [
+        create_worker(
+            WorkerSettings,  # type: ignore[arg-type]
+            queue_name=queue.value,
+            max_jobs=jobs,
+        )
+        for queue, jobs in queues_max_jobs.items()
+    ]
+
+    # Each worker registers its own signal handlers, only the last one is kept
+    def _handle_signal(signum: signal.Signals) -> None:
+        for worker in workers:
+            worker.handle_sig(signum)
+
+    loop = asyncio.get_event_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, _handle_signal, signum)
+
+    try:
+        loop.run_until_complete(
+            asyncio.gather(*(worker.async_run() for worker in workers))
+        )
+    except asyncio.CancelledError:
+        # happens on shutdown, fine
+        pass
+    finally:
+        loop.run_until_complete(asyncio.gather(*(worker.close() for worker in workers)))
+
+
 class CronTasksScheduler:
     _cron_tasks: list[tuple[str, CronTrigger, QueueName]] = []
 
@@ -236,9 +341,17 @@ async def lifespan() -> AsyncIterator[ArqRedis]:
 def enqueue_job(
     name: str,
     *args: Any,
-    queue_name: QueueName = QueueName.default,
+    queue_name: QueueName | None = None,
     **kwargs: Any,
 ) -> None:
+    """
+    Enqueue a job, sent to Redis when the current request or task ends.
+
+    The job goes to the queue declared by its task, unless `queue_name` is set.
+    """
+    if queue_name is None:
+        queue_name = get_task_queue(name)
+
     ctx = ExecutionContext.current()
     polar_context = PolarWorkerContext(
         is_during_installation=ctx.is_during_installation,
@@ -266,13 +379,170 @@ def enqueue_job(
     log.debug("polar.worker.job_enqueued", name=name, args=args, kwargs=kwargs)
 
 
+def enqueue_debounced_job(
+    name: str,
+    *args: Any,
+    debounce_key: str,
+    debounce_window: timedelta,
+    queue_name: QueueName | None = None,
+    **kwargs: Any,
+) -> None:
+    """
+    Enqueue a job that'll be coalesced with the other jobs
+    having the same name and key during a debounce window.
+
+    Time is split into fixed windows of `debounce_window`. All the jobs enqueued
+    during the same window share the same job ID, so arq only keeps the first one,
+    and are deferred until the end of the window.
+
+    Thus, bursts of calls result in at most one job execution per key and window.
+    Since the job runs after the window ends, it sees all the changes
+    which triggered it. Calls happening while it runs fall into the next window.
+    """
+    window = int(debounce_window.total_seconds())
+    assert window > 0, "debounce_window must be at least one second"
+    window_end = (int(utc_now().timestamp()) // window + 1) * window
+
+    enqueue_job(
+        name,
+        *args,
+        queue_name=queue_name,
+        _job_id=f"{name}:{debounce_key}:{window_end}",
+        _defer_until=datetime.fromtimestamp(window_end, UTC),
+        **kwargs,
+    )
+
+
+def enqueue_batched_job(
+    name: str,
+    item: Any,
+    *,
+    batch_size: int,
+    queue_name: QueueName | None = None,
+) -> None:
+    """
+    Enqueue an item to be processed by a job handling several items at once.
+
+    Items enqueued in the same context are appended to the `items` argument
+    of the last buffered job with the same name, until it holds `batch_size` items.
+    Thus, a request or a task enqueuing many items results in a few jobs.
+    """
+    if queue_name is None:
+        queue_name = get_task_queue(name)
+
+    for job_name, _, kwargs in reversed(_jobs_to_enqueue.get([])):
+        if job_name == name and kwargs["_queue_name"] == queue_name.value:
+            if len(kwargs["items"]) < batch_size:
+                kwargs["items"].append(item)
+                return
+            break
+
+    enqueue_job(name, queue_name=queue_name, items=[item])
+
+
+# Enqueue jobs atomically, following `ArqRedis.enqueue_job` semantics:
+# a job is skipped if a job or a result with the same ID already exists.
+# KEYS are job key, result key and queue of each job,
+# ARGV are job ID, score, expiration in milliseconds and payload of each job.
+# Returns the number of enqueued jobs.
+_ENQUEUE_JOBS_SCRIPT = """
+local enqueued = 0
+for i = 0, #KEYS / 3 - 1 do
+    local job_key = KEYS[i * 3 + 1]
+    if redis.call('EXISTS', job_key, KEYS[i * 3 + 2]) == 0 then
+        redis.call('PSETEX', job_key, ARGV[i * 4 + 3], ARGV[i * 4 + 4])
+        redis.call('ZADD', KEYS[i * 3 + 3], ARGV[i * 4 + 2], ARGV[i * 4 + 1])
+        enqueued = enqueued + 1
+    end
+end
+return enqueued
+"""
+
+# Maximum number of jobs written by a single script call,
+# so we don't block Redis for too long when flushing large buffers
+_ENQUEUE_JOBS_CHUNK_SIZE = 500
+
+
+def _serialize_job(
+    arq_pool: ArqRedis,
+    name: str,
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+    enqueue_time_ms: int,
+) -> tuple[list[str], list[str | int | bytes]]:
+    """
+    Compute the keys and arguments of `_ENQUEUE_JOBS_SCRIPT` for a job,
+    like `ArqRedis.enqueue_job` does.
+    """
+    kwargs = dict(kwargs)
+    job_id: str = kwargs.pop("_job_id", None) or uuid.uuid4().hex
+    queue_name: str = kwargs.pop("_queue_name", None) or arq_pool.default_queue_name
+    defer_until: datetime | None = kwargs.pop("_defer_until", None)
+    defer_by_ms = to_ms(kwargs.pop("_defer_by", None))
+    expires_ms = to_ms(kwargs.pop("_expires", None))
+    job_try: int | None = kwargs.pop("_job_try", None)
+
+    if defer_until is not None:
+        score = to_unix_ms(defer_until)
+    elif defer_by_ms:
+        score = enqueue_time_ms + defer_by_ms
+    else:
+        score = enqueue_time_ms
+    expires_ms = expires_ms or score - enqueue_time_ms + arq_pool.expires_extra_ms
+
+    job = serialize_job(
+        name,
+        args,
+        kwargs,
+        job_try,
+        enqueue_time_ms,
+        serializer=arq_pool.job_serializer,
+    )
+    return (
+        [job_key_prefix + job_id, result_key_prefix + job_id, queue_name],
+        [job_id, score, expires_ms, job],
+    )
+
+
 async def flush_enqueued_jobs(arq_pool: ArqRedis) -> None:
+    """
+    Enqueue the jobs buffered in the current context.
+
+    Jobs are written in bulk with a Lua script, instead of the several
+    round-trips per job of `ArqRedis.enqueue_job`. Like the latter, jobs whose ID
+    is already enqueued, running or has a result are skipped.
+
+    A new empty buffer is then bound to the context. It's shared with the asyncio
+    tasks spawned from it, so the jobs they enqueue are flushed by the next call.
+    """
     if _jobs_to_enqueue_list := _jobs_to_enqueue.get([]):
-        log.debug("polar.worker.flush_enqueued_jobs")
-        for name, args, kwargs in _jobs_to_enqueue_list:
-            await arq_pool.enqueue_job(name, *args, **kwargs)
-            log.debug("polar.worker.job_flushed", name=name, args=args, kwargs=kwargs)
-        _jobs_to_enqueue.set([])
+        start = time.perf_counter()
+        enqueue_time_ms = timestamp_ms()
+        enqueued = 0
+        # Sent by SHA with EVALSHA, the source is only loaded if Redis lacks it
+        enqueue_jobs_script = arq_pool.register_script(_ENQUEUE_JOBS_SCRIPT)
+        for i in range(0, len(_jobs_to_enqueue_list), _ENQUEUE_JOBS_CHUNK_SIZE):
+            keys: list[str] = []
+            argv: list[str | int | bytes] = []
+            for name, args, kwargs in _jobs_to_enqueue_list[
+                i : i + _ENQUEUE_JOBS_CHUNK_SIZE
+            ]:
+                job_keys, job_argv = _serialize_job(
+                    arq_pool, name, args, kwargs, enqueue_time_ms
+                )
+                keys.extend(job_keys)
+                argv.extend(job_argv)
+                log.debug(
+                    "polar.worker.job_flushed", name=name, args=args, kwargs=kwargs
+                )
+            enqueued += await enqueue_jobs_script(keys=keys, args=argv)
+        log.info(
+            "polar.worker.flush_enqueued_jobs",
+            jobs=len(_jobs_to_enqueue_list),
+            enqueued=enqueued,
+            duration_ms=round((time.perf_counter() - start) * 1000, 2),
+        )
+    _jobs_to_enqueue.set([])
 
 
 Params = ParamSpec("Params")
@@ -328,8 +598,9 @@ def task(
     timeout: SecondsTimedelta | None = None,
     keep_result_forever: bool | None = None,
     max_tries: int | None = None,
+    queue: QueueName = QueueName.default,
     cron_trigger: CronTrigger | None = None,
-    cron_trigger_queue: QueueName = QueueName.default,
+    cron_trigger_queue: QueueName | None = None,
 ) -> Callable[
     [Callable[Params, Awaitable[ReturnValue]]], Callable[Params, Awaitable[ReturnValue]]
 ]:
@@ -347,12 +618,15 @@ def task(
             max_tries=max_tries,
         )
 
-        # all tasks are registered on both workers
+        # all tasks are registered on all workers
         WorkerSettings.functions.append(new_task)
         WorkerSettingsGitHubCrawl.functions.append(new_task)
+        WorkerSettingsBulk.functions.append(new_task)
+
+        _task_queues[name] = queue
 
         if cron_trigger is not None:
-            CronTasksScheduler.add_task(name, cron_trigger, cron_trigger_queue)
+            CronTasksScheduler.add_task(name, cron_trigger, cron_trigger_queue or queue)
 
         return wrapped
 
@@ -404,9 +678,13 @@ def compute_backoff(
 __all__ = [
     "WorkerSettings",
     "WorkerSettingsGitHubCrawl",
+    "WorkerSettingsBulk",
+    "run_workers",
     "task",
     "lifespan",
     "enqueue_job",
+    "enqueue_debounced_job",
+    "enqueue_batched_job",
     "JobContext",
     "AsyncSessionMaker",
     "ArqRedis",
@@ -1,11 +1,51 @@
+import typer
+
 from polar import tasks
 from polar.logfire import configure_logfire
 from polar.logging import configure as configure_logging
 from polar.sentry import configure_sentry
-from polar.worker import WorkerSettings, WorkerSettingsGitHubCrawl
+from polar.worker import (
+    QueueName,
+    WorkerSettings,
+    WorkerSettingsBulk,
+    WorkerSettingsGitHubCrawl,
+    run_workers,
+)
 
 configure_sentry()
 configure_logfire("worker")
 configure_logging(logfire=True)
 
-__all__ = ["WorkerSettings", "WorkerSettingsGitHubCrawl", "tasks"]
+__all__ = ["WorkerSettings", "WorkerSettingsBulk", "WorkerSettingsGitHubCrawl", "tasks"]
+
+cli = typer.Typer()
+
+
+def _parse_queue(value: str) -> tuple[QueueName, int]:
+    name, _, weight = value.partition(":")
+    try:
+        return QueueName[name], int(weight or 1)
+    except (KeyError, ValueError) as e:
+        raise typer.BadParameter(
+            f"{value!r} should be a queue name, optionally with a weight, "
+            f"e.g. `high_priority:2`. Queues: {', '.join(q.name for q in QueueName)}"
+        ) from e
+
+
+@cli.command()
+def run(
+    queue: list[str] = typer.Option(
+        ...,
+        "--queue",
+        "-q",
+        help="Queue to process, with its weight: `high_priority:2`. Repeatable.",
+    ),
+    max_jobs: int = typer.Option(
+        20, help="Maximum number of concurrent jobs, split between queues by weight."
+    ),
+) -> None:
+    run_workers(dict(_parse_queue(value) for value in queue), max_jobs=max_jobs)
+
+
+if __name__ == "__main__":
+    cli()
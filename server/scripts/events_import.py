@@ -0,0 +1,116 @@
+import asyncio
+import itertools
+import logging.config
+import uuid
+from collections.abc import AsyncIterator, Sequence
+from functools import wraps
+from pathlib import Path
+from typing import Any
+
+import structlog
+import typer
+from arq.connections import create_pool as arq_create_pool
+from rich.progress import Progress
+
+from polar.auth.models import AuthMethod, AuthSubject
+from polar.event.service import event as event_service
+from polar.exceptions import PolarRequestValidationError
+from polar.kit.db.postgres import create_async_sessionmaker
+from polar.models import Organization
+from polar.postgres import create_async_engine
+from polar.worker import WorkerSettings, flush_enqueued_jobs
+
+cli = typer.Typer()
+
+
+def drop_all(*args: Any, **kwargs: Any) -> Any:
+    raise structlog.DropEvent
+
+
+structlog.configure(processors=[drop_all])
+logging.config.dictConfig(
+    {
+        "version": 1,
+        "disable_existing_loggers": True,
+    }
+)
+
+
+def typer_async(f):  # type: ignore
+    # From https://github.com/tiangolo/typer/issues/85
+    @wraps(f)
+    def wrapper(*args, **kwargs):  # type: ignore
+        return asyncio.run(f(*args, **kwargs))
+
+    return wrapper
+
+
+async def _iter_batch(batch: Sequence[bytes]) -> AsyncIterator[bytes]:
+    for line in batch:
+        yield line
+
+
+@cli.command()
+@typer_async
+async def events_import(
+    organization_id: uuid.UUID,
+    path: Path = typer.Argument(
+        ..., exists=True, dir_okay=False, help="NDJSON file, one event per line."
+    ),
+    batch_size: int = typer.Option(
+        100_000, help="Number of lines imported and committed in a single transaction."
+    ),
+    skip: int = typer.Option(
+        0, help="Number of lines to skip, to resume an interrupted import."
+    ),
+) -> None:
+    engine = create_async_engine("script")
+    sessionmaker = create_async_sessionmaker(engine)
+    arq_pool = await arq_create_pool(WorkerSettings.redis_settings)
+
+    async with sessionmaker() as session:
+        organization = await session.get(Organization, organization_id)
+        if organization is None:
+            typer.echo(f"Organization {organization_id} not found")
+            raise typer.Exit(1)
+    auth_subject = AuthSubject(organization, set(), AuthMethod.NONE)
+
+    imported = 0
+    offset = skip
+    try:
+        with path.open("rb") as file, Progress() as progress:
+            progress_task = progress.add_task("[green]Importing events...")
+            lines = itertools.islice(file, skip, None)
+            while batch := list(itertools.islice(lines, batch_size)):
+                async with sessionmaker() as session:
+                    try:
+                        result = await event_service.ingest_stream(
+                            session, auth_subject, _iter_batch(batch), copy=True
+                        )
+                    except PolarRequestValidationError as e:
+                        await session.rollback()
+                        for error in e.errors():
+                            _, index, *loc = error["loc"]
+                            line = offset + int(index) + 1
+                            typer.echo(
+                                f"Line {line}: {'.'.join(map(str, loc))}: {error['msg']}"
+                            )
+                        typer.echo(f"Import aborted, resume with --skip {offset}")
+                        raise typer.Exit(1)
+                    await session.commit()
+
+                # Only enqueue `event.ingested` jobs once events are committed
+                await flush_enqueued_jobs(arq_pool)
+
+                imported += result.inserted
+                offset += len(batch)
+                progress.update(progress_task, advance=len(batch))
+    finally:
+        await arq_pool.close(True)
+        await engine.dispose()
+
+    typer.echo(f"{imported} events imported")
+
+
+if __name__ == "__main__":
+    cli()
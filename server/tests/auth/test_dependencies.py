@@ -0,0 +1,172 @@
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from pytest_mock import MockerFixture
+
+from polar.auth import token_cache
+from polar.auth.dependencies import _authenticate_token, get_token_type
+from polar.auth.models import AuthMethod
+from polar.auth.scope import Scope
+from polar.auth.tasks import auth_invalidate_token_cache
+from polar.auth.token_cache import TokenCache
+from polar.auth.token_usage import TokenUsageBuffer
+from polar.config import settings
+from polar.enums import TokenType
+from polar.kit.crypto import get_token_hash
+from polar.kit.utils import utc_now
+from polar.models import Organization, OrganizationAccessToken
+from polar.organization_access_token.service import (
+    organization_access_token as organization_access_token_service,
+)
+from polar.postgres import AsyncSession
+from polar.redis import Redis
+from polar.worker import JobContext, _jobs_to_enqueue
+from tests.fixtures.database import SaveFixture
+
+TOKEN = "polar_oat_123"
+
+
+@pytest_asyncio.fixture
+async def organization_access_token(
+    save_fixture: SaveFixture, organization: Organization
+) -> OrganizationAccessToken:
+    organization_access_token = OrganizationAccessToken(
+        comment="Test",
+        token=get_token_hash(TOKEN, secret=settings.SECRET),
+        organization=organization,
+        expires_at=utc_now() + timedelta(days=1),
+        scope="metrics:read",
+    )
+    await save_fixture(organization_access_token)
+    return organization_access_token
+
+
+@pytest.mark.parametrize(
+    ("token", "expected"),
+    [
+        ("polar_at_u_123", TokenType.access_token),
+        ("polar_at_o_123", TokenType.access_token),
+        ("polar_oat_123", TokenType.organization_access_token),
+        ("polar_cst_123", TokenType.customer_session_token),
+        ("polar_pat_123", TokenType.personal_access_token),
+        ("legacy", TokenType.personal_access_token),
+    ],
+)
+def test_get_token_type(token: str, expected: TokenType) -> None:
+    assert get_token_type(token) == expected
+
+
+@pytest.mark.asyncio
+class TestAuthenticateToken:
+    async def test_not_existing(self, session: AsyncSession, redis: Redis) -> None:
+        auth_subject = await _authenticate_token(
+            session, redis, TOKEN, TokenType.organization_access_token
+        )
+        assert auth_subject is None
+
+    async def test_other_prefix(
+        self,
+        mocker: MockerFixture,
+        session: AsyncSession,
+        redis: Redis,
+        organization_access_token: OrganizationAccessToken,
+    ) -> None:
+        get_by_token_spy = mocker.spy(
+            organization_access_token_service.__class__, "get_by_token"
+        )
+
+        for token_type in (
+            TokenType.access_token,
+            TokenType.personal_access_token,
+            TokenType.customer_session_token,
+        ):
+            auth_subject = await _authenticate_token(session, redis, TOKEN, token_type)
+            assert auth_subject is None
+
+        get_by_token_spy.assert_not_called()
+
+    async def test_cached(
+        self,
+        mocker: MockerFixture,
+        session: AsyncSession,
+        redis: Redis,
+        organization: Organization,
+        organization_access_token: OrganizationAccessToken,
+    ) -> None:
+        get_by_token_spy = mocker.spy(
+            organization_access_token_service.__class__, "get_by_token"
+        )
+
+        for _ in range(2):
+            auth_subject = await _authenticate_token(
+                session, redis, TOKEN, TokenType.organization_access_token
+            )
+            assert auth_subject is not None
+            assert auth_subject.subject == organization
+            assert auth_subject.scopes == {Scope.metrics_read}
+            assert auth_subject.method == AuthMethod.ORGANIZATION_ACCESS_TOKEN
+
+        get_by_token_spy.assert_called_once()
+
+        usages = await TokenUsageBuffer(redis).read(TokenType.organization_access_token)
+        assert list(usages) == [organization_access_token.id]
+
+    async def test_invalidated(
+        self,
+        session: AsyncSession,
+        redis: Redis,
+        job_context: JobContext,
+        organization_access_token: OrganizationAccessToken,
+    ) -> None:
+        auth_subject = await _authenticate_token(
+            session, redis, TOKEN, TokenType.organization_access_token
+        )
+        assert auth_subject is not None
+        token_hash = get_token_hash(TOKEN, secret=settings.SECRET)
+        assert await redis.exists(f"polar:auth_token:{token_hash}")
+
+        jobs_token = _jobs_to_enqueue.set([])
+        try:
+            await organization_access_token_service.delete(
+                session, organization_access_token
+            )
+            await session.flush()
+            jobs = _jobs_to_enqueue.get()
+        finally:
+            _jobs_to_enqueue.reset(jobs_token)
+
+        # Invalidated by a job, sent once the transaction is committed:
+        # run it like the worker would, with the arguments added by `enqueue_job`
+        [(name, args, kwargs)] = jobs
+        assert name == "auth.invalidate_token_cache"
+        await auth_invalidate_token_cache(
+            job_context,
+            *args,
+            **{k: v for k, v in kwargs.items() if not k.startswith("_")},
+        )
+        assert not await redis.exists(f"polar:auth_token:{token_hash}")
+
+        token_cache._local_cache.clear()
+        auth_subject = await _authenticate_token(
+            session, redis, TOKEN, TokenType.organization_access_token
+        )
+        assert auth_subject is None
+
+    async def test_cached_in_redis(
+        self,
+        session: AsyncSession,
+        redis: Redis,
+        organization_access_token: OrganizationAccessToken,
+    ) -> None:
+        token_hash = get_token_hash(TOKEN, secret=settings.SECRET)
+        await _authenticate_token(
+            session, redis, TOKEN, TokenType.organization_access_token
+        )
+        assert await redis.exists(f"polar:auth_token:{token_hash}")
+
+        # Another process, with an empty local cache
+        token_cache._local_cache.clear()
+        cached_token = await TokenCache(redis).get(token_hash)
+        assert cached_token is not None
+        assert cached_token.token_id == organization_access_token.id
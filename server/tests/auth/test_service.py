@@ -0,0 +1,107 @@
+from collections.abc import Iterator
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState
+
+from polar.auth import service as auth_service_module
+from polar.auth.service import auth as auth_service
+from polar.config import settings
+from polar.enums import TokenType
+from polar.kit.crypto import get_token_hash
+from polar.kit.utils import utc_now
+from polar.models import User, UserSession
+from polar.postgres import AsyncSession
+from tests.fixtures.database import SaveFixture
+
+TOKEN = "polar_us_123"
+
+
+@pytest.fixture(autouse=True)
+def clear_user_session_cache() -> Iterator[None]:
+    auth_service_module._user_session_cache.clear()
+    yield
+    auth_service_module._user_session_cache.clear()
+
+
+async def create_user_session(
+    save_fixture: SaveFixture, user: User, *, expires_in: timedelta
+) -> UserSession:
+    user_session = UserSession(
+        token=get_token_hash(TOKEN, secret=settings.SECRET),
+        user_agent="Test",
+        user=user,
+        expires_at=utc_now() + expires_in,
+    )
+    await save_fixture(user_session)
+    return user_session
+
+
+@pytest.mark.asyncio
+class TestGetUserSessionByToken:
+    async def test_expired(
+        self, save_fixture: SaveFixture, session: AsyncSession, user: User
+    ) -> None:
+        await create_user_session(save_fixture, user, expires_in=-timedelta(days=1))
+
+        assert await auth_service._get_user_session_by_token(session, TOKEN) is None
+        assert (
+            await auth_service._get_user_session_by_token(session, TOKEN, expired=True)
+            is not None
+        )
+
+    async def test_cached(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        user: User,
+    ) -> None:
+        user_session = await create_user_session(
+            save_fixture, user, expires_in=timedelta(days=1)
+        )
+
+        result = await auth_service._get_user_session_by_token(session, TOKEN)
+        assert result == user_session
+
+        session.expunge_all()
+        statements: list[str] = []
+
+        def record_statement(orm_execute_state: ORMExecuteState) -> None:
+            statements.append(str(orm_execute_state.statement))
+
+        event.listen(session.sync_session, "do_orm_execute", record_statement)
+        try:
+            result = await auth_service._get_user_session_by_token(session, TOKEN)
+        finally:
+            event.remove(session.sync_session, "do_orm_execute", record_statement)
+
+        assert result == user_session
+        assert result is not None
+        assert result.user.id == user.id
+        assert result.expires_at == user_session.expires_at
+        # The session itself isn't queried, only its user
+        assert len(statements) == 1
+        assert "user_sessions" not in statements[0]
+
+    async def test_revoke_leaked(
+        self, save_fixture: SaveFixture, session: AsyncSession, user: User
+    ) -> None:
+        user_session = await create_user_session(
+            save_fixture, user, expires_in=timedelta(days=1)
+        )
+        # Populate the cache
+        await auth_service._get_user_session_by_token(session, TOKEN)
+
+        result = await auth_service.revoke_leaked(
+            session,
+            TOKEN,
+            TokenType.user_session_token,
+            notifier="github",
+            url="https://github.com",
+        )
+        assert result is True
+        await session.flush()
+
+        assert await session.get(UserSession, user_session.id) is None
+        assert await auth_service._get_user_session_by_token(session, TOKEN) is None
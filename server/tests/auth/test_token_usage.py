@@ -0,0 +1,73 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+from pytest_mock import MockerFixture
+
+from polar.auth.token_usage import TokenUsageBuffer
+from polar.enums import TokenType
+from polar.kit.utils import utc_now
+from polar.redis import Redis
+
+
+@pytest.mark.asyncio
+class TestTokenUsageBuffer:
+    async def test_keeps_latest(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.auth.token_usage.settings.AUTH_TOKEN_USAGE_RECORD_INTERVAL",
+            timedelta(0),
+        )
+        buffer = TokenUsageBuffer(redis)
+        token_id = uuid.uuid4()
+        other_token_id = uuid.uuid4()
+        now = utc_now()
+
+        await buffer.record(TokenType.personal_access_token, token_id, now)
+        await buffer.record(
+            TokenType.personal_access_token, token_id, now - timedelta(minutes=1)
+        )
+        await buffer.record(TokenType.organization_access_token, other_token_id, now)
+
+        usages = await buffer.read(TokenType.personal_access_token)
+        assert usages == {token_id: now}
+        await buffer.ack(TokenType.personal_access_token)
+
+        assert await buffer.read(TokenType.personal_access_token) == {}
+        assert await buffer.read(TokenType.organization_access_token) == {
+            other_token_id: now
+        }
+
+    async def test_deduplicated(self, redis: Redis) -> None:
+        buffer = TokenUsageBuffer(redis)
+        token_id = uuid.uuid4()
+        now = utc_now()
+
+        await buffer.record(TokenType.personal_access_token, token_id, now)
+        await buffer.record(
+            TokenType.personal_access_token, token_id, now + timedelta(seconds=1)
+        )
+
+        usages = await buffer.read(TokenType.personal_access_token)
+        assert usages == {token_id: now}
+
+    async def test_read_until_ack(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.auth.token_usage.settings.AUTH_TOKEN_USAGE_RECORD_INTERVAL",
+            timedelta(0),
+        )
+        buffer = TokenUsageBuffer(redis)
+        token_id = uuid.uuid4()
+        other_token_id = uuid.uuid4()
+        now = utc_now()
+
+        await buffer.record(TokenType.personal_access_token, token_id, now)
+        assert await buffer.read(TokenType.personal_access_token) == {token_id: now}
+
+        # Not acknowledged, e.g. the transaction failed: the usages are read again
+        await buffer.record(TokenType.personal_access_token, other_token_id, now)
+        assert await buffer.read(TokenType.personal_access_token) == {token_id: now}
+
+        await buffer.ack(TokenType.personal_access_token)
+        assert await buffer.read(TokenType.personal_access_token) == {
+            other_token_id: now
+        }
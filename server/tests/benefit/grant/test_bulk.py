@@ -0,0 +1,179 @@
+from unittest.mock import MagicMock
+
+import pytest
+from pytest_mock import MockerFixture
+
+from polar.benefit.grant.bulk import BulkProgress, process_benefit_grants
+from polar.benefit.strategies import BenefitRetriableError, BenefitServiceProtocol
+from polar.models import Benefit, BenefitGrant, Organization
+from polar.postgres import AsyncSession
+from polar.worker import JobContext
+from tests.fixtures.database import SaveFixture
+from tests.fixtures.random_objects import create_benefit_grant, create_customer
+
+
+@pytest.fixture(autouse=True)
+def benefit_strategy_mock(mocker: MockerFixture) -> MagicMock:
+    strategy_mock = MagicMock(spec=BenefitServiceProtocol)
+    strategy_mock.grant.return_value = {}
+    strategy_mock.revoke.return_value = {}
+    mock = mocker.patch("polar.benefit.grant.service.get_benefit_strategy")
+    mock.return_value = strategy_mock
+    return strategy_mock
+
+
+@pytest.fixture(autouse=True)
+def bulk_settings(mocker: MockerFixture) -> None:
+    mocker.patch("polar.benefit.grant.bulk.settings.BENEFIT_GRANT_BULK_CHUNK_SIZE", 2)
+    # Tests share a single session, which can't be used concurrently
+    strategy_class_mock = mocker.patch(
+        "polar.benefit.grant.bulk.get_benefit_strategy_class"
+    )
+    strategy_class_mock.return_value.bulk_concurrency = 1
+
+
+@pytest.fixture
+def enqueue_job_mock(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch("polar.benefit.grant.bulk.enqueue_job")
+
+
+async def create_grants(
+    save_fixture: SaveFixture,
+    benefit: Benefit,
+    organization: Organization,
+    *,
+    granted: int,
+    revoked: int = 0,
+) -> list[BenefitGrant]:
+    grants: list[BenefitGrant] = []
+    for i in range(granted + revoked):
+        customer = await create_customer(
+            save_fixture,
+            organization=organization,
+            email=f"customer-{benefit.id}-{i}@example.com",
+            stripe_customer_id=None,
+        )
+        grants.append(
+            await create_benefit_grant(
+                save_fixture, customer, benefit, granted=i < granted
+            )
+        )
+    return grants
+
+
+@pytest.mark.asyncio
+class TestProcessBenefitGrants:
+    async def test_update(
+        self,
+        job_context: JobContext,
+        save_fixture: SaveFixture,
+        organization: Organization,
+        benefit_organization: Benefit,
+        benefit_organization_second: Benefit,
+        benefit_strategy_mock: MagicMock,
+    ) -> None:
+        grants = await create_grants(
+            save_fixture,
+            benefit_organization,
+            organization,
+            granted=3,
+            revoked=1,
+        )
+        await create_grants(
+            save_fixture, benefit_organization_second, organization, granted=1
+        )
+
+        await process_benefit_grants(job_context, benefit_organization, "update")
+
+        assert benefit_strategy_mock.grant.call_count == 3
+        progress = BulkProgress(job_context["raw_redis"], job_context["job_id"])
+        assert await progress.get() == {
+            "cursor": str(max(grant.id for grant in grants if grant.is_granted)),
+            "processed": "3",
+            "requeued": "0",
+        }
+
+    async def test_delete(
+        self,
+        job_context: JobContext,
+        session: AsyncSession,
+        save_fixture: SaveFixture,
+        organization: Organization,
+        benefit_organization: Benefit,
+        benefit_strategy_mock: MagicMock,
+    ) -> None:
+        grants = await create_grants(
+            save_fixture, benefit_organization, organization, granted=3
+        )
+
+        await process_benefit_grants(job_context, benefit_organization, "delete")
+
+        assert benefit_strategy_mock.revoke.call_count == 3
+        for grant in grants:
+            await session.refresh(grant)
+            assert grant.is_revoked
+
+    async def test_resume(
+        self,
+        job_context: JobContext,
+        save_fixture: SaveFixture,
+        organization: Organization,
+        benefit_organization: Benefit,
+        benefit_strategy_mock: MagicMock,
+    ) -> None:
+        grants = await create_grants(
+            save_fixture, benefit_organization, organization, granted=3
+        )
+        grant_ids = sorted(grant.id for grant in grants)
+
+        progress = BulkProgress(job_context["raw_redis"], job_context["job_id"])
+        await progress.advance(grant_ids[1], processed=2, requeued=0)
+
+        await process_benefit_grants(job_context, benefit_organization, "update")
+
+        assert benefit_strategy_mock.grant.call_count == 1
+        assert (await progress.get())["processed"] == "3"
+
+    async def test_retriable_error(
+        self,
+        job_context: JobContext,
+        save_fixture: SaveFixture,
+        organization: Organization,
+        benefit_organization: Benefit,
+        benefit_strategy_mock: MagicMock,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        (grant,) = await create_grants(
+            save_fixture, benefit_organization, organization, granted=1
+        )
+        grant_id = grant.id
+        benefit_strategy_mock.grant.side_effect = BenefitRetriableError(10)
+
+        await process_benefit_grants(job_context, benefit_organization, "update")
+
+        enqueue_job_mock.assert_called_once_with(
+            "benefit.update", benefit_grant_id=grant_id, _defer_by=10
+        )
+        progress = BulkProgress(job_context["raw_redis"], job_context["job_id"])
+        assert (await progress.get())["requeued"] == "1"
+
+    async def test_error(
+        self,
+        job_context: JobContext,
+        save_fixture: SaveFixture,
+        organization: Organization,
+        benefit_organization: Benefit,
+        benefit_strategy_mock: MagicMock,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        await create_grants(save_fixture, benefit_organization, organization, granted=3)
+        benefit_strategy_mock.grant.side_effect = ValueError("Misconfigured")
+
+        with pytest.raises(ValueError):
+            await process_benefit_grants(job_context, benefit_organization, "update")
+
+        # Aborted at the first chunk, without falling back to single-grant jobs
+        assert benefit_strategy_mock.grant.call_count < 3
+        enqueue_job_mock.assert_not_called()
+        progress = BulkProgress(job_context["raw_redis"], job_context["job_id"])
+        assert await progress.get() == {}
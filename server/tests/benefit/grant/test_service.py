@@ -446,45 +446,10 @@ class TestEnqueueBenefitGrantUpdates:
         )
 
         enqueue_job_mock.assert_called_once_with(
-            "benefit.update",
-            benefit_grant_id=granted_grant.id,
+            "benefit.update_grants",
+            benefit_id=benefit_organization.id,
         )
 
-    async def test_required_update_revoked(
-        self,
-        mocker: MockerFixture,
-        session: AsyncSession,
-        redis: Redis,
-        save_fixture: SaveFixture,
-        subscription: Subscription,
-        customer: Customer,
-        benefit_organization: Benefit,
-        benefit_organization_second: Benefit,
-        benefit_strategy_mock: MagicMock,
-    ) -> None:
-        revoked_grant = BenefitGrant(
-            subscription=subscription, customer=customer, benefit=benefit_organization
-        )
-        revoked_grant.set_revoked()
-        await save_fixture(revoked_grant)
-
-        other_benefit_grant = BenefitGrant(
-            subscription=subscription,
-            customer=customer,
-            benefit=benefit_organization_second,
-        )
-        other_benefit_grant.set_granted()
-        await save_fixture(other_benefit_grant)
-
-        enqueue_job_mock = mocker.patch("polar.benefit.grant.service.enqueue_job")
-        benefit_strategy_mock.requires_update.return_value = True
-
-        await benefit_grant_service.enqueue_benefit_grant_updates(
-            session, redis, benefit_organization, {}
-        )
-
-        enqueue_job_mock.assert_not_called()
-
 
 @pytest.mark.asyncio
 class TestUpdateBenefitGrant:
@@ -697,43 +662,6 @@ class TestCycleBenefitGrant:
         assert not updated_grant.is_granted
 
 
-@pytest.mark.asyncio
-class TestEnqueueBenefitGrantDeletions:
-    async def test_valid(
-        self,
-        mocker: MockerFixture,
-        session: AsyncSession,
-        save_fixture: SaveFixture,
-        subscription: Subscription,
-        customer: Customer,
-        benefit_organization: Benefit,
-        benefit_organization_second: Benefit,
-    ) -> None:
-        granted_grant = BenefitGrant(
-            subscription=subscription, customer=customer, benefit=benefit_organization
-        )
-        granted_grant.set_granted()
-        await save_fixture(granted_grant)
-
-        other_benefit_grant = BenefitGrant(
-            subscription=subscription,
-            customer=customer,
-            benefit=benefit_organization_second,
-        )
-        other_benefit_grant.set_granted()
-        await save_fixture(other_benefit_grant)
-
-        enqueue_job_mock = mocker.patch("polar.benefit.grant.service.enqueue_job")
-
-        await benefit_grant_service.enqueue_benefit_grant_deletions(
-            session, benefit_organization
-        )
-
-        enqueue_job_mock.assert_called_once_with(
-            "benefit.delete_grant", benefit_grant_id=granted_grant.id
-        )
-
-
 @pytest.mark.asyncio
 class TestEnqueueCustomerGrantDeletions:
     async def test_valid(
@@ -441,5 +441,6 @@ class TestDelete:
         assert updated_benefit.deleted_at is not None
 
         enqueue_job_mock.assert_called_once_with(
-            "benefit.delete", benefit_id=benefit_organization.id
+            "benefit.delete",
+            benefit_id=benefit_organization.id,
         )
@@ -18,6 +18,7 @@ from polar.benefit.tasks import (  # type: ignore[attr-defined]
     benefit_update,
 )
 from polar.models import Benefit, BenefitGrant, Customer, Subscription
+from polar.models.webhook_endpoint import WebhookEventType
 from polar.postgres import AsyncSession
 from polar.worker import JobContext, PolarWorkerContext
 from tests.fixtures.database import SaveFixture
@@ -331,7 +332,13 @@ class TestBenefitDelete:
             polar_worker_context,
         )
 
-        enqueue_job_mock.assert_called_once()
+        await session.refresh(grant)
+        assert grant.is_revoked
+        enqueue_job_mock.assert_called_once_with(
+            "customer.webhook",
+            WebhookEventType.customer_state_changed,
+            customer.id,
+        )
 
 
 @pytest.mark.asyncio
@@ -23,3 +23,16 @@ async def test_get_by_id(
 
     result = await repository.get_by_id(customer.id, include_deleted=True)
     assert result == customer
+
+
+@pytest.mark.asyncio
+async def test_bump_state_version(
+    customer: Customer, repository: CustomerRepository
+) -> None:
+    modified_at = customer.modified_at
+    state_version = customer.state_version
+
+    await repository.bump_state_version(customer.id)
+
+    assert customer.state_version == state_version + 1
+    assert customer.modified_at == modified_at
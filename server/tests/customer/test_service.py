@@ -5,13 +5,17 @@ from pytest_mock import MockerFixture
 from sqlalchemy.exc import IntegrityError
 
 from polar.auth.models import AuthSubject, is_user
+from polar.customer.repository import CustomerRepository
 from polar.customer.schemas.customer import CustomerCreate, CustomerUpdate
+from polar.customer.schemas.state import CustomerState
+from polar.customer.service import CustomerService
 from polar.customer.service import customer as customer_service
 from polar.exceptions import PolarRequestValidationError
 from polar.kit.pagination import PaginationParams
 from polar.models import Customer, Organization, User, UserOrganization
 from polar.models.webhook_endpoint import CustomerWebhookEventType, WebhookEventType
 from polar.postgres import AsyncSession
+from polar.redis import Redis
 from tests.fixtures.auth import AuthSubjectFixture
 from tests.fixtures.database import SaveFixture
 from tests.fixtures.random_objects import create_customer
@@ -325,11 +329,12 @@ class TestWebhook:
         event_type: CustomerWebhookEventType,
         mocker: MockerFixture,
         session: AsyncSession,
+        redis: Redis,
         customer: Customer,
     ) -> None:
         send_payload_mock = mocker.patch("polar.webhook.service.webhook.send_payload")
 
-        await customer_service.webhook(session, event_type, customer)
+        await customer_service.webhook(session, redis, event_type, customer)
 
         assert send_payload_mock.call_count == 2
 
@@ -337,12 +342,40 @@ class TestWebhook:
         self,
         mocker: MockerFixture,
         session: AsyncSession,
+        redis: Redis,
         customer: Customer,
     ) -> None:
         send_payload_mock = mocker.patch("polar.webhook.service.webhook.send_payload")
 
         await customer_service.webhook(
-            session, WebhookEventType.customer_state_changed, customer
+            session, redis, WebhookEventType.customer_state_changed, customer
         )
 
         assert send_payload_mock.call_count == 1
+
+
+@pytest.mark.asyncio
+class TestGetStateSnapshot:
+    async def test_cached_per_version(
+        self,
+        mocker: MockerFixture,
+        session: AsyncSession,
+        redis: Redis,
+        customer: Customer,
+    ) -> None:
+        get_state_spy = mocker.spy(CustomerService, "get_state")
+
+        snapshot = await customer_service.get_state_snapshot(session, redis, customer)
+        state = CustomerState.model_validate_json(snapshot)
+        assert state.id == customer.id
+        assert get_state_spy.call_count == 1
+
+        cached = await customer_service.get_state_snapshot(session, redis, customer)
+        assert cached == snapshot
+        assert get_state_spy.call_count == 1
+
+        repository = CustomerRepository.from_session(session)
+        await repository.bump_state_version(customer.id)
+
+        await customer_service.get_state_snapshot(session, redis, customer)
+        assert get_state_spy.call_count == 2
@@ -10,6 +10,7 @@ from polar.event.system import SystemEvent
 from polar.kit.utils import utc_now
 from polar.meter.aggregation import (
     AggregationFunction,
+    CountAggregation,
     PropertyAggregation,
 )
 from polar.meter.filter import Filter, FilterClause, FilterConjunction, FilterOperator
@@ -183,3 +184,60 @@ class TestUpdateCustomerMeter:
         assert updated_customer_meter is not None
         assert updated_customer_meter.units_balance == Decimal(30)
         assert updated_customer_meter.last_balanced_event == events[-3]
+
+
+@pytest.mark.asyncio
+class TestUpdateCustomer:
+    async def test_organization_meters(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+        organization_second: Organization,
+        events: list[Event],
+        meter: Meter,
+    ) -> None:
+        count_meter = await create_meter(
+            save_fixture,
+            id=uuid.uuid4(),
+            name="Pro Model Calls",
+            filter=Filter(
+                conjunction=FilterConjunction.and_,
+                clauses=[
+                    FilterClause(
+                        property="model", operator=FilterOperator.eq, value="pro"
+                    )
+                ],
+            ),
+            aggregation=CountAggregation(),
+            organization=customer.organization,
+        )
+        await create_meter(
+            save_fixture,
+            id=uuid.uuid4(),
+            name="Other Organization Meter",
+            organization=organization_second,
+        )
+
+        customer_meters = await customer_meter_service.update_customer(
+            session, customer
+        )
+
+        assert len(customer_meters) == 2
+        balances = {
+            customer_meter.meter_id: customer_meter
+            for customer_meter in customer_meters
+        }
+        assert balances[meter.id].units_balance == Decimal(30)
+        assert balances[meter.id].last_balanced_event == events[-3]
+        assert balances[count_meter.id].units_balance == Decimal(1)
+        assert balances[count_meter.id].last_balanced_event == events[-2]
+
+        # Running it again without new events doesn't change anything
+        customer_meters = await customer_meter_service.update_customer(
+            session, customer
+        )
+        assert {
+            customer_meter.meter_id: customer_meter.units_balance
+            for customer_meter in customer_meters
+        } == {meter.id: Decimal(30), count_meter.id: Decimal(1)}
@@ -0,0 +1,100 @@
+import asyncio
+import stat
+import sys
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from pytest_mock import MockerFixture
+
+from polar.email.react import (
+    EmailRendererError,
+    EmailRendererPool,
+    close_email_renderer_pool,
+    render_email_template,
+)
+
+FAKE_RENDERER = """
+import json
+import os
+import sys
+
+for line in sys.stdin:
+    request = json.loads(line)
+    if request["template"] == "crash":
+        sys.exit(1)
+    if request["template"] == "garbage":
+        sys.stdout.write("<html>placeholder</html>\\n")
+        sys.stdout.flush()
+        continue
+    if request["template"] == "unknown":
+        response = {"id": request["id"], "error": "Template unknown not found"}
+    else:
+        html = f"<html>{request['template']} {os.getpid()}</html>"
+        response = {"id": request["id"], "html": html}
+    sys.stdout.write(json.dumps(response) + "\\n")
+    sys.stdout.flush()
+"""
+
+
+@pytest.fixture(autouse=True)
+def fake_renderer(mocker: MockerFixture, tmp_path: Path) -> None:
+    path = tmp_path / "react-email-pkg"
+    path.write_text(f"#!{sys.executable}\n{FAKE_RENDERER}")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    mocker.patch("polar.email.react.settings.EMAIL_RENDERER_BINARY_PATH", path)
+
+
+@pytest_asyncio.fixture
+async def pool() -> AsyncIterator[EmailRendererPool]:
+    pool = EmailRendererPool(2)
+    yield pool
+    await pool.close()
+
+
+@pytest.mark.asyncio
+class TestEmailRendererPool:
+    async def test_render(self, pool: EmailRendererPool) -> None:
+        html = await pool.render("magic_link", {"url": "https://example.com"})
+        assert html.startswith("<html>magic_link")
+
+    async def test_reuses_processes(self, pool: EmailRendererPool) -> None:
+        results = await asyncio.gather(
+            *(pool.render("magic_link", {}) for _ in range(10))
+        )
+
+        pids = {html.split(" ")[1] for html in results}
+        assert 1 <= len(pids) <= 2
+
+        results = await asyncio.gather(
+            *(pool.render("magic_link", {}) for _ in range(10))
+        )
+        assert {html.split(" ")[1] for html in results} <= pids
+
+    async def test_error(self, pool: EmailRendererPool) -> None:
+        with pytest.raises(EmailRendererError, match="Template unknown not found"):
+            await pool.render("unknown", {})
+
+        assert (await pool.render("magic_link", {})).startswith("<html>")
+
+    async def test_process_exited(self, pool: EmailRendererPool) -> None:
+        with pytest.raises(EmailRendererError, match="exited with code 1"):
+            await pool.render("crash", {})
+
+        assert (await pool.render("magic_link", {})).startswith("<html>")
+
+    async def test_invalid_output(self, pool: EmailRendererPool) -> None:
+        with pytest.raises(EmailRendererError, match="exited with code"):
+            await pool.render("garbage", {})
+
+        assert (await pool.render("magic_link", {})).startswith("<html>")
+
+
+@pytest.mark.asyncio
+async def test_render_email_template() -> None:
+    try:
+        html = await render_email_template("magic_link", {})
+        assert html.startswith("<html>magic_link")
+    finally:
+        await close_email_renderer_pool()
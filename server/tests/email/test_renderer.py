@@ -1,4 +1,6 @@
-from polar.email.renderer import EmailRenderer
+from pytest_mock import MockerFixture
+
+from polar.email.renderer import EmailRenderer, get_email_renderer
 
 email_renderer = EmailRenderer()
 
@@ -14,3 +16,31 @@ def test_render_from_string() -> None:
     assert rendered_subject == "Hello, John!"
     assert rendered_body.startswith("<!DOCTYPE html")
     assert "<p>Hi, John! Welcome to Polar!</p>" in rendered_body
+
+
+def test_render_batch_from_string(mocker: MockerFixture) -> None:
+    render_from_string_spy = mocker.spy(email_renderer, "render_from_string")
+    subject = "Hello, {{ name }}!"
+    body = "<p>Hi, {{ name }}!</p>"
+
+    results = email_renderer.render_batch_from_string(
+        [
+            (subject, body, {"name": "John"}),
+            (subject, body, {"name": "Jane"}),
+            (subject, body, {"name": "John"}),
+        ]
+    )
+
+    assert [subject for subject, _ in results] == [
+        "Hello, John!",
+        "Hello, Jane!",
+        "Hello, John!",
+    ]
+    assert render_from_string_spy.call_count == 2
+
+
+def test_get_email_renderer() -> None:
+    assert get_email_renderer({"order": "polar.order"}) is get_email_renderer(
+        {"order": "polar.order"}
+    )
+    assert get_email_renderer({"order": "polar.order"}) is not get_email_renderer()
@@ -0,0 +1,74 @@
+import json
+
+import httpx
+import pytest
+import respx
+
+from polar.email.sender import Email, ResendEmailSender, SendEmailError
+
+
+def build_email(to_email_addr: str) -> Email:
+    return {
+        "to_email_addr": to_email_addr,
+        "subject": "Hello",
+        "html_content": "<p>Hello</p>",
+        "from_name": "Polar",
+        "from_email_addr": "noreply@polar.sh",
+        "email_headers": {},
+        "reply_to_name": "Polar Support",
+        "reply_to_email_addr": "support@polar.sh",
+    }
+
+
+@pytest.mark.asyncio
+class TestResendEmailSender:
+    async def test_send_batch(self, respx_mock: respx.MockRouter) -> None:
+        route = respx_mock.post("https://api.resend.com/emails/batch").mock(
+            return_value=httpx.Response(
+                200, json={"data": [{"id": "EMAIL_1"}, {"id": "EMAIL_2"}]}
+            )
+        )
+
+        sender = ResendEmailSender()
+        await sender.send_batch(
+            [build_email("a@example.com"), build_email("b@example.com")],
+            idempotency_key="KEY",
+        )
+
+        assert route.call_count == 1
+        request = route.calls.last.request
+        assert request.headers["Idempotency-Key"] == "KEY"
+        payload = json.loads(request.content)
+        assert [email["to"] for email in payload] == [
+            ["a@example.com"],
+            ["b@example.com"],
+        ]
+        assert payload[0]["reply_to"] == "Polar Support <support@polar.sh>"
+
+    @pytest.mark.parametrize(
+        "status_code,is_rejected,is_invalid",
+        [
+            (401, True, False),
+            (403, True, False),
+            (422, True, True),
+            (429, False, False),
+            (500, False, False),
+        ],
+    )
+    async def test_send_batch_error(
+        self,
+        status_code: int,
+        is_rejected: bool,
+        is_invalid: bool,
+        respx_mock: respx.MockRouter,
+    ) -> None:
+        respx_mock.post("https://api.resend.com/emails/batch").mock(
+            return_value=httpx.Response(status_code)
+        )
+
+        sender = ResendEmailSender()
+        with pytest.raises(SendEmailError) as e:
+            await sender.send_batch([build_email("a@example.com")])
+
+        assert e.value.is_rejected is is_rejected
+        assert e.value.is_invalid is is_invalid
@@ -0,0 +1,103 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from arq import Retry
+from pytest_mock import MockerFixture
+
+from polar.email.sender import SendEmailError
+from polar.email.tasks import email_send_batch
+from polar.worker import JobContext, PolarWorkerContext
+from tests.email.test_sender import build_email
+
+
+@pytest.fixture
+def email_sender_mock(mocker: MockerFixture) -> MagicMock:
+    email_sender = MagicMock()
+    email_sender.send_batch = AsyncMock()
+    mocker.patch("polar.email.tasks.get_email_sender", return_value=email_sender)
+    return email_sender
+
+
+@pytest.fixture
+def enqueue_job_mock(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch("polar.email.tasks.enqueue_job")
+
+
+@pytest.mark.asyncio
+class TestEmailSendBatch:
+    async def test_sent(
+        self,
+        job_context: JobContext,
+        polar_worker_context: PolarWorkerContext,
+        email_sender_mock: MagicMock,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        emails = [build_email("a@example.com"), build_email("b@example.com")]
+
+        await email_send_batch(job_context, emails, polar_context=polar_worker_context)
+
+        email_sender_mock.send_batch.assert_awaited_once_with(
+            emails, idempotency_key=job_context["job_id"]
+        )
+        enqueue_job_mock.assert_not_called()
+
+    async def test_transient_error(
+        self,
+        job_context: JobContext,
+        polar_worker_context: PolarWorkerContext,
+        email_sender_mock: MagicMock,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        email_sender_mock.send_batch.side_effect = SendEmailError(
+            "Error", provider_status_code=500
+        )
+
+        with pytest.raises(Retry):
+            await email_send_batch(
+                job_context,
+                [build_email("a@example.com")],
+                polar_context=polar_worker_context,
+            )
+
+        enqueue_job_mock.assert_not_called()
+
+    async def test_invalid(
+        self,
+        job_context: JobContext,
+        polar_worker_context: PolarWorkerContext,
+        email_sender_mock: MagicMock,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        email_sender_mock.send_batch.side_effect = SendEmailError(
+            "Error", provider_status_code=422
+        )
+        emails = [build_email("a@example.com"), build_email("b@example.com")]
+
+        await email_send_batch(job_context, emails, polar_context=polar_worker_context)
+
+        assert enqueue_job_mock.call_count == 2
+        for call, email in zip(enqueue_job_mock.call_args_list, emails):
+            assert call.args == ("email.send",)
+            assert call.kwargs == email
+
+    @pytest.mark.parametrize("status_code", [401, 403])
+    async def test_rejected(
+        self,
+        status_code: int,
+        job_context: JobContext,
+        polar_worker_context: PolarWorkerContext,
+        email_sender_mock: MagicMock,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        email_sender_mock.send_batch.side_effect = SendEmailError(
+            "Error", provider_status_code=status_code
+        )
+
+        with pytest.raises(SendEmailError):
+            await email_send_batch(
+                job_context,
+                [build_email("a@example.com"), build_email("b@example.com")],
+                polar_context=polar_worker_context,
+            )
+
+        enqueue_job_mock.assert_not_called()
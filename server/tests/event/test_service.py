@@ -1,4 +1,5 @@
 import uuid
+from collections.abc import AsyncIterator
 from datetime import timedelta
 from unittest.mock import AsyncMock, call
 
@@ -7,6 +8,7 @@ from pydantic import ValidationError
 from pytest_mock import MockerFixture
 
 from polar.auth.models import AuthSubject, is_user
+from polar.config import settings
 from polar.event.repository import EventRepository
 from polar.event.schemas import (
     EventCreateCustomer,
@@ -20,6 +22,8 @@ from polar.kit.utils import utc_now
 from polar.models import Customer, Organization, User, UserOrganization
 from polar.models.event import EventSource
 from polar.postgres import AsyncSession
+from polar.redis import Redis
+from polar.result_cache import ResultCache
 from tests.fixtures.auth import AuthSubjectFixture
 from tests.fixtures.database import SaveFixture
 from tests.fixtures.random_objects import create_customer, create_event
@@ -30,6 +34,11 @@ def enqueue_job_mock(mocker: MockerFixture) -> AsyncMock:
     return mocker.patch("polar.event.service.enqueue_job")
 
 
+@pytest.fixture
+def enqueue_debounced_job_mock(mocker: MockerFixture) -> AsyncMock:
+    return mocker.patch("polar.event.service.enqueue_debounced_job")
+
+
 @pytest.mark.asyncio
 class TestList:
     @pytest.mark.auth
@@ -385,13 +394,181 @@ class TestIngest:
         )
 
 
+async def _lines(*lines: str) -> AsyncIterator[bytes]:
+    for line in lines:
+        yield line.encode("utf-8")
+
+
+@pytest.mark.asyncio
+class TestIngestStream:
+    @pytest.mark.auth(AuthSubjectFixture(subject="organization"))
+    async def test_invalid_line(
+        self,
+        enqueue_job_mock: AsyncMock,
+        session: AsyncSession,
+        auth_subject: AuthSubject[Organization],
+    ) -> None:
+        with pytest.raises(PolarRequestValidationError) as e:
+            await event_service.ingest_stream(
+                session,
+                auth_subject,
+                _lines(
+                    '{"name": "test", "external_customer_id": "test"}',
+                    "NOT_JSON",
+                    '{"name": "test"}',
+                ),
+            )
+
+        errors = e.value.errors()
+        assert {error["loc"][1] for error in errors} == {1, 2}
+
+    @pytest.mark.auth(AuthSubjectFixture(subject="organization"))
+    async def test_invalid_line_after_inserted_chunk(
+        self,
+        mocker: MockerFixture,
+        enqueue_job_mock: AsyncMock,
+        session: AsyncSession,
+        auth_subject: AuthSubject[Organization],
+    ) -> None:
+        mocker.patch("polar.event.service.settings.EVENT_INGEST_CHUNK_SIZE", 1)
+
+        with pytest.raises(PolarRequestValidationError) as e:
+            await event_service.ingest_stream(
+                session,
+                auth_subject,
+                _lines(
+                    '{"name": "test", "external_customer_id": "test"}',
+                    "",
+                    "NOT_JSON",
+                ),
+            )
+
+        # Blank lines count in the location of errors
+        errors = e.value.errors()
+        assert [error["loc"][1] for error in errors] == [2]
+
+        # The first chunk is rolled back with the transaction
+        enqueue_job_mock.assert_not_called()
+
+    @pytest.mark.auth(
+        AuthSubjectFixture(subject="user"),
+        AuthSubjectFixture(subject="organization"),
+    )
+    async def test_invalid_customer_id(
+        self,
+        mocker: MockerFixture,
+        enqueue_job_mock: AsyncMock,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        auth_subject: AuthSubject[User | Organization],
+        organization: Organization,
+        organization_second: Organization,
+        user_organization: UserOrganization,
+        customer: Customer,
+    ) -> None:
+        mocker.patch("polar.event.service.settings.EVENT_INGEST_CHUNK_SIZE", 1)
+        customer_organization_second = await create_customer(
+            save_fixture, organization=organization_second
+        )
+        organization_id = (
+            f', "organization_id": "{organization.id}"' if is_user(auth_subject) else ""
+        )
+
+        with pytest.raises(PolarRequestValidationError) as e:
+            await event_service.ingest_stream(
+                session,
+                auth_subject,
+                _lines(
+                    f'{{"name": "test", "customer_id": "{customer.id}"{organization_id}}}',
+                    f'{{"name": "test", "customer_id": "{uuid.uuid4()}"{organization_id}}}',
+                    f'{{"name": "test", "customer_id": "{customer_organization_second.id}"{organization_id}}}',
+                ),
+            )
+
+        errors = e.value.errors()
+        assert [error["loc"] for error in errors] == [
+            ("body", 1, "customer_id"),
+            ("body", 2, "customer_id"),
+        ]
+
+    @pytest.mark.auth(AuthSubjectFixture(subject="organization"))
+    async def test_valid(
+        self,
+        mocker: MockerFixture,
+        enqueue_job_mock: AsyncMock,
+        session: AsyncSession,
+        auth_subject: AuthSubject[Organization],
+        customer: Customer,
+    ) -> None:
+        mocker.patch("polar.event.service.settings.EVENT_INGEST_CHUNK_SIZE", 100)
+
+        lines = [
+            f'{{"name": "test", "customer_id": "{customer.id}"}}' for _ in range(150)
+        ]
+        lines += [
+            '{"name": "test", "external_customer_id": "test"}',
+            "",
+            '{"name": "test", "external_customer_id": "test"}',
+        ]
+        result = await event_service.ingest_stream(
+            session, auth_subject, _lines(*lines)
+        )
+
+        assert result.inserted == 152
+
+        event_repository = EventRepository.from_session(session)
+        events = await event_repository.get_all_by_organization(auth_subject.subject.id)
+        assert len(events) == 152
+
+        assert enqueue_job_mock.call_count == 2
+
+    @pytest.mark.auth(AuthSubjectFixture(subject="organization"))
+    async def test_valid_copy(
+        self,
+        mocker: MockerFixture,
+        enqueue_job_mock: AsyncMock,
+        session: AsyncSession,
+        auth_subject: AuthSubject[Organization],
+        customer: Customer,
+    ) -> None:
+        mocker.patch("polar.event.service.settings.EVENT_INGEST_CHUNK_SIZE", 100)
+
+        lines = [
+            f'{{"name": "test", "customer_id": "{customer.id}", "metadata": {{"tokens": 10}}}}'
+            for _ in range(150)
+        ]
+        result = await event_service.ingest_stream(
+            session, auth_subject, _lines(*lines), copy=True
+        )
+
+        assert result.inserted == 150
+
+        event_repository = EventRepository.from_session(session)
+        events = await event_repository.get_all_by_organization(auth_subject.subject.id)
+        assert len(events) == 150
+
+        for event in events:
+            assert event.source == EventSource.user
+            assert event.customer_id == customer.id
+            assert event.user_metadata == {"tokens": 10}
+
+        assert enqueue_job_mock.call_count == 2
+        enqueued_event_ids = {
+            event_id
+            for call in enqueue_job_mock.call_args_list
+            for event_id in call.kwargs["event_ids"]
+        }
+        assert enqueued_event_ids == {event.id for event in events}
+
+
 @pytest.mark.asyncio
 class TestIngested:
     async def test_basic(
         self,
-        enqueue_job_mock: AsyncMock,
+        enqueue_debounced_job_mock: AsyncMock,
         save_fixture: SaveFixture,
         session: AsyncSession,
+        redis: Redis,
         organization: Organization,
         customer: Customer,
         customer_second: Customer,
@@ -423,12 +600,46 @@ class TestIngested:
             ),
         ]
 
-        await event_service.ingested(session, [event.id for event in events])
+        await event_service.ingested(session, redis, [event.id for event in events])
 
-        enqueue_job_mock.assert_has_calls(
+        assert enqueue_debounced_job_mock.call_count == 2
+        enqueue_debounced_job_mock.assert_has_calls(
             [
-                call("customer_meter.update_customer", customer_id=customer.id),
-                call("customer_meter.update_customer", customer_id=customer_second.id),
+                call(
+                    "customer_meter.update_customer",
+                    debounce_key=str(customer.id),
+                    debounce_window=settings.CUSTOMER_METER_UPDATE_DEBOUNCE,
+                    customer_id=customer.id,
+                ),
+                call(
+                    "customer_meter.update_customer",
+                    debounce_key=str(customer_second.id),
+                    debounce_window=settings.CUSTOMER_METER_UPDATE_DEBOUNCE,
+                    customer_id=customer_second.id,
+                ),
             ],
             any_order=True,
         )
+
+    async def test_backdated(
+        self,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        redis: Redis,
+        organization: Organization,
+        organization_second: Organization,
+    ) -> None:
+        invalidate_mock = mocker.patch.object(ResultCache, "invalidate")
+        events = [
+            await create_event(
+                save_fixture,
+                organization=organization,
+                timestamp=utc_now() - timedelta(days=1),
+            ),
+            await create_event(save_fixture, organization=organization_second),
+        ]
+
+        await event_service.ingested(session, redis, [event.id for event in events])
+
+        invalidate_mock.assert_awaited_once_with([organization.id])
@@ -1756,6 +1756,8 @@ async def create_event(
     customer: Customer | None = None,
     external_customer_id: str | None = None,
     metadata: dict[str, str | int | bool] | None = None,
+    ingested_at: datetime | None = None,
+    ingest_xid: int | None = None,
 ) -> Event:
     event = Event(
         timestamp=timestamp or utc_now(),
@@ -1766,6 +1768,11 @@ async def create_event(
         organization=organization,
         user_metadata=metadata or {},
     )
+    if ingested_at is not None:
+        event.ingested_at = ingested_at
+    # By default, set by the database to the ID of the current transaction
+    if ingest_xid is not None:
+        event.ingest_xid = ingest_xid
     await save_fixture(event)
     return event
 
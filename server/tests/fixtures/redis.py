@@ -3,9 +3,13 @@ from collections.abc import AsyncIterator
 import pytest_asyncio
 from fakeredis import FakeAsyncRedis
 
+from polar.auth import token_cache, token_usage
 from polar.redis import Redis
 
 
 @pytest_asyncio.fixture(autouse=True)
 async def redis() -> AsyncIterator[Redis]:
-    yield FakeAsyncRedis()
+    # The in-process token caches front Redis, so they're reset along with it
+    token_cache._local_cache.clear()
+    token_usage._recorded_at.clear()
+    yield FakeAsyncRedis(decode_responses=True)
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
 import json
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Iterator
 from typing import Any
 
+import pytest
 import pytest_asyncio
 from httpx import AsyncClient, Response
 
 from polar.config import settings
 from polar.integrations.github import client as github
+from polar.webhook import service as webhook_service_module
 
 from .vcr import read_cassette
 
@@ -74,3 +76,11 @@ async def github_webhook(
 ) -> AsyncGenerator[TestWebhookFactory, None]:
     factory = TestWebhookFactory(client)
     yield factory
+
+
+@pytest.fixture(autouse=True)
+def clear_webhook_endpoints_index() -> Iterator[None]:
+    # Endpoints are created directly in the database by most tests
+    webhook_service_module._endpoints_index.clear()
+    yield
+    webhook_service_module._endpoints_index.clear()
@@ -0,0 +1,134 @@
+from collections.abc import Awaitable, Callable
+
+import httpx
+import pytest
+import respx
+from pytest_mock import MockerFixture
+
+from polar.integrations.discord.client import BASE_URL, DiscordClient
+from polar.integrations.discord.ratelimit import DiscordRateLimiter
+from polar.redis import Redis
+
+ROUTE = "PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+
+
+@pytest.fixture
+def client() -> DiscordClient:
+    return DiscordClient("Bot", "TOKEN")
+
+
+def _rate_limit_headers(remaining: int, reset_after: float) -> dict[str, str]:
+    return {
+        "X-RateLimit-Bucket": "BUCKET",
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset-After": str(reset_after),
+    }
+
+
+def _reset_rate_limits(redis: Redis) -> Callable[[float], Awaitable[None]]:
+    async def _sleep(delay: float) -> None:
+        await redis.flushall()
+
+    return _sleep
+
+
+@pytest.mark.asyncio
+class TestRateLimit:
+    async def test_records_bucket(
+        self, client: DiscordClient, redis: Redis, respx_mock: respx.MockRouter
+    ) -> None:
+        respx_mock.put(f"{BASE_URL}/guilds/GUILD/members/USER/roles/ROLE").mock(
+            return_value=httpx.Response(204, headers=_rate_limit_headers(2, 10))
+        )
+
+        await client.add_member_role(
+            redis, guild_id="GUILD", discord_user_id="USER", role_id="ROLE"
+        )
+
+        rate_limiter = DiscordRateLimiter(redis)
+        assert await redis.get(rate_limiter._get_route_key(ROUTE)) == "BUCKET"
+        bucket_key = rate_limiter._get_bucket_key("BUCKET", "GUILD")
+        assert await redis.get(bucket_key) == "2"
+        assert await redis.pttl(bucket_key) > 0
+
+        # Another guild doesn't share the bucket
+        await rate_limiter.acquire(ROUTE, "OTHER_GUILD")
+        assert await redis.get(bucket_key) == "2"
+
+        await rate_limiter.acquire(ROUTE, "GUILD")
+        assert await redis.get(bucket_key) == "1"
+
+    async def test_waits_for_exhausted_bucket(
+        self,
+        mocker: MockerFixture,
+        client: DiscordClient,
+        redis: Redis,
+        respx_mock: respx.MockRouter,
+    ) -> None:
+        sleep_mock = mocker.patch(
+            "polar.integrations.discord.ratelimit.asyncio.sleep",
+            side_effect=_reset_rate_limits(redis),
+        )
+        route = respx_mock.put(f"{BASE_URL}/guilds/GUILD/members/USER/roles/ROLE").mock(
+            return_value=httpx.Response(204, headers=_rate_limit_headers(0, 10))
+        )
+
+        for _ in range(2):
+            await client.add_member_role(
+                redis, guild_id="GUILD", discord_user_id="USER", role_id="ROLE"
+            )
+
+        assert route.call_count == 2
+        sleep_mock.assert_called_once()
+        assert sleep_mock.call_args[0][0] > 0
+
+    async def test_retries_too_many_requests(
+        self,
+        mocker: MockerFixture,
+        client: DiscordClient,
+        redis: Redis,
+        respx_mock: respx.MockRouter,
+    ) -> None:
+        sleep_mock = mocker.patch(
+            "polar.integrations.discord.ratelimit.asyncio.sleep",
+            side_effect=_reset_rate_limits(redis),
+        )
+        route = respx_mock.put(f"{BASE_URL}/guilds/GUILD/members/USER/roles/ROLE").mock(
+            side_effect=[
+                httpx.Response(429, json={"retry_after": 1.5}),
+                httpx.Response(204),
+            ]
+        )
+
+        await client.add_member_role(
+            redis, guild_id="GUILD", discord_user_id="USER", role_id="ROLE"
+        )
+
+        assert route.call_count == 2
+        sleep_mock.assert_called_once()
+        assert 0 < sleep_mock.call_args[0][0] <= 1.5
+
+    async def test_global_rate_limit(
+        self,
+        mocker: MockerFixture,
+        client: DiscordClient,
+        redis: Redis,
+        respx_mock: respx.MockRouter,
+    ) -> None:
+        respx_mock.put(f"{BASE_URL}/guilds/GUILD/members/USER/roles/ROLE").mock(
+            return_value=httpx.Response(
+                429, headers={"Retry-After": "2", "X-RateLimit-Global": "true"}
+            )
+        )
+        mocker.patch(
+            "polar.integrations.discord.client.settings.DISCORD_RATE_LIMIT_MAX_RETRIES",
+            0,
+        )
+
+        with pytest.raises(httpx.HTTPStatusError):
+            await client.add_member_role(
+                redis, guild_id="GUILD", discord_user_id="USER", role_id="ROLE"
+            )
+
+        rate_limiter = DiscordRateLimiter(redis)
+        assert await redis.pttl(rate_limiter._get_global_key()) > 0
@@ -1,6 +1,8 @@
+from collections.abc import AsyncIterator
+
 import pytest
 
-from polar.kit.http import get_safe_return_url
+from polar.kit.http import LineTooLong, get_safe_return_url, iter_lines
 
 
 @pytest.mark.asyncio
@@ -14,3 +16,58 @@ async def test_get_safe_return_url() -> None:
     assert get_safe_return_url("") == "http://127.0.0.1:3000/"
 
     assert get_safe_return_url("https://whatever.com/hey") == "http://127.0.0.1:3000/"
+
+
+async def _chunks(*chunks: bytes) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _iter_lines(*chunks: bytes, max_line_size: int = 1024) -> list[bytes]:
+    return [
+        line async for line in iter_lines(_chunks(*chunks), max_line_size=max_line_size)
+    ]
+
+
+@pytest.mark.asyncio
+class TestIterLines:
+    async def test_split_across_chunks(self) -> None:
+        assert await _iter_lines(b'{"a"', b": 1}\n{", b'"b": 2}\n') == [
+            b'{"a": 1}',
+            b'{"b": 2}',
+        ]
+
+    async def test_several_lines_per_chunk(self) -> None:
+        assert await _iter_lines(b"a\nb\n\nc\n") == [b"a", b"b", b"", b"c"]
+
+    async def test_trailing_line_without_newline(self) -> None:
+        assert await _iter_lines(b"a\nb", b"c") == [b"a", b"bc"]
+
+    async def test_empty(self) -> None:
+        assert await _iter_lines() == []
+        assert await _iter_lines(b"") == []
+
+    async def test_max_line_size(self) -> None:
+        assert await _iter_lines(b"abcd\n", b"ef", max_line_size=4) == [
+            b"abcd",
+            b"ef",
+        ]
+
+    async def test_line_too_long(self) -> None:
+        with pytest.raises(LineTooLong):
+            await _iter_lines(b"abcde\nf", max_line_size=4)
+
+    async def test_line_too_long_without_newline(self) -> None:
+        # Raised before the stream ends, instead of buffering it entirely
+        chunks_read = 0
+
+        async def _stream() -> AsyncIterator[bytes]:
+            nonlocal chunks_read
+            for _ in range(10):
+                chunks_read += 1
+                yield b"abc"
+
+        with pytest.raises(LineTooLong):
+            async for _ in iter_lines(_stream(), max_line_size=4):
+                pass
+        assert chunks_read == 2
@@ -0,0 +1,53 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from polar.kit.time_queries import TimeInterval
+
+
+@pytest.mark.parametrize(
+    "interval,timestamp,expected",
+    [
+        (
+            TimeInterval.hour,
+            datetime(2025, 1, 15, 9, 30, tzinfo=UTC),
+            datetime(2025, 1, 15, 10, tzinfo=UTC),
+        ),
+        (
+            TimeInterval.day,
+            datetime(2025, 1, 15, 9, 30, tzinfo=UTC),
+            datetime(2025, 1, 16, tzinfo=UTC),
+        ),
+        (
+            TimeInterval.week,
+            # Wednesday
+            datetime(2025, 1, 15, 9, 30, tzinfo=UTC),
+            datetime(2025, 1, 20, tzinfo=UTC),
+        ),
+        (
+            TimeInterval.week,
+            # Monday
+            datetime(2025, 1, 13, tzinfo=UTC),
+            datetime(2025, 1, 20, tzinfo=UTC),
+        ),
+        (
+            TimeInterval.month,
+            datetime(2025, 1, 15, 9, 30, tzinfo=UTC),
+            datetime(2025, 2, 1, tzinfo=UTC),
+        ),
+        (
+            TimeInterval.month,
+            datetime(2025, 12, 31, 23, 59, tzinfo=UTC),
+            datetime(2026, 1, 1, tzinfo=UTC),
+        ),
+        (
+            TimeInterval.year,
+            datetime(2025, 1, 15, 9, 30, tzinfo=UTC),
+            datetime(2026, 1, 1, tzinfo=UTC),
+        ),
+    ],
+)
+def test_get_period_end(
+    interval: TimeInterval, timestamp: datetime, expected: datetime
+) -> None:
+    assert interval.get_period_end(timestamp) == expected
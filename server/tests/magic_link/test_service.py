@@ -88,12 +88,20 @@ async def test_authenticate_expired_token(
 
 @pytest.mark.asyncio
 async def test_send(
-    generate_magic_link_token: GenerateMagicLinkToken, enqueue_email_mock: MagicMock
+    mocker: MockerFixture,
+    generate_magic_link_token: GenerateMagicLinkToken,
+    enqueue_email_mock: MagicMock,
 ) -> None:
+    render_email_template_mock = mocker.patch(
+        "polar.magic_link.service.render_email_template", return_value="<html></html>"
+    )
     magic_link, _ = await generate_magic_link_token("user@example.com", None, None)
 
     await magic_link_service.send(magic_link, "TOKEN", "BASE_URL")
 
+    render_email_template_mock.assert_awaited_once()
+    assert render_email_template_mock.call_args[0][0] == "magic_link"
+
     enqueue_email_mock.assert_called_once_with(
         to_email_addr="user@example.com", html_content=ANY, subject="Sign in to Polar"
     )
@@ -1,12 +1,20 @@
 import uuid
-from datetime import timedelta
+from collections.abc import Sequence
+from datetime import UTC, datetime, timedelta
 from decimal import Decimal
 
 import pytest
 import pytest_asyncio
+from pytest_mock import MockerFixture
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.attributes import set_committed_value
 
 from polar.auth.models import AuthSubject
+from polar.billing_entry.repository import BillingEntryRepository
+from polar.config import settings
 from polar.enums import SubscriptionRecurringInterval
+from polar.event.service import event as event_service
 from polar.event.system import SystemEvent
 from polar.exceptions import PolarRequestValidationError
 from polar.kit.time_queries import TimeInterval
@@ -21,9 +29,11 @@ from polar.meter.filter import Filter, FilterClause, FilterConjunction, FilterOp
 from polar.meter.schemas import MeterCreate, MeterUpdate
 from polar.meter.service import meter as meter_service
 from polar.models import (
+    BillingEntry,
     Customer,
     Event,
     Meter,
+    MeterRollup,
     Organization,
     Product,
     Subscription,
@@ -31,6 +41,7 @@ from polar.models import (
 from polar.models.billing_entry import BillingEntryDirection
 from polar.models.event import EventSource
 from polar.postgres import AsyncSession
+from polar.redis import Redis
 from tests.fixtures.auth import AuthSubjectFixture
 from tests.fixtures.database import SaveFixture
 from tests.fixtures.random_objects import (
@@ -402,6 +413,111 @@ class TestGetQuantities:
         assert tomorrow_quantity.timestamp.date() == future_timestamp.date()
         assert tomorrow_quantity.quantity == 500
 
+    @pytest.mark.parametrize(
+        "aggregation,expected_value",
+        [
+            (CountAggregation(), 4),
+            (PropertyAggregation(func=AggregationFunction.sum, property="tokens"), 40),
+            (PropertyAggregation(func=AggregationFunction.max, property="tokens"), 20),
+            (PropertyAggregation(func=AggregationFunction.min, property="tokens"), 0),
+            (PropertyAggregation(func=AggregationFunction.avg, property="tokens"), 10),
+        ],
+    )
+    async def test_rolled_up(
+        self,
+        aggregation: Aggregation,
+        expected_value: Decimal,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+    ) -> None:
+        timestamp = utc_now()
+        meter = await create_meter(
+            save_fixture,
+            name="Lite Model Usage",
+            filter=Filter(
+                conjunction=FilterConjunction.and_,
+                clauses=[
+                    FilterClause(
+                        property="model", operator=FilterOperator.eq, value="lite"
+                    )
+                ],
+            ),
+            aggregation=aggregation,
+            organization=customer.organization,
+        )
+
+        for tokens in (20, 10):
+            await create_event(
+                save_fixture,
+                timestamp=timestamp,
+                organization=customer.organization,
+                customer=customer,
+                metadata={"tokens": tokens, "model": "lite"},
+                ingest_xid=100,
+            )
+        meter = await meter_service.rollup(session, meter, until_xid=150)
+
+        # Events committed after the rollup are read from the events table
+        for tokens, model in ((10, "lite"), (0, "lite"), (100, "pro")):
+            await create_event(
+                save_fixture,
+                timestamp=timestamp,
+                organization=customer.organization,
+                customer=customer,
+                metadata={"tokens": tokens, "model": model},
+                ingest_xid=200,
+            )
+
+        result = await meter_service.get_quantities(
+            session,
+            meter,
+            customer_id=[customer.id],
+            start_timestamp=timestamp,
+            end_timestamp=timestamp,
+            interval=TimeInterval.day,
+        )
+
+        assert len(result.quantities) == 1
+        quantity = result.quantities[0]
+        assert quantity.quantity == expected_value
+
+    async def test_rolled_up_after_load(
+        self, save_fixture: SaveFixture, session: AsyncSession, customer: Customer
+    ) -> None:
+        timestamp = utc_now()
+        meter = await create_meter(
+            save_fixture,
+            name="Lite Model Usage",
+            filter=Filter(conjunction=FilterConjunction.and_, clauses=[]),
+            aggregation=CountAggregation(),
+            organization=customer.organization,
+        )
+
+        for ingest_xid in (100, 200):
+            await create_event(
+                save_fixture,
+                timestamp=timestamp,
+                organization=customer.organization,
+                customer=customer,
+                ingest_xid=ingest_xid,
+            )
+        meter = await meter_service.rollup(session, meter, until_xid=150)
+
+        # Meter loaded before the rollup was committed
+        set_committed_value(meter, "rolled_up_xid", None)
+
+        result = await meter_service.get_quantities(
+            session,
+            meter,
+            start_timestamp=timestamp,
+            end_timestamp=timestamp,
+            interval=TimeInterval.day,
+        )
+
+        assert len(result.quantities) == 1
+        assert result.quantities[0].quantity == 2
+
     @pytest.mark.parametrize(
         "property",
         [
@@ -455,6 +571,115 @@ class TestGetQuantities:
         quantity = result.quantities[0]
         assert quantity.quantity == 0
 
+    @pytest.mark.parametrize(
+        "filter_clause,expected_value",
+        [
+            (
+                FilterClause(
+                    property="model", operator=FilterOperator.eq, value="lite-v2"
+                ),
+                10,
+            ),
+            (FilterClause(property="code", operator=FilterOperator.eq, value=42), 10),
+            (FilterClause(property="tokens", operator=FilterOperator.eq, value=10), 10),
+            (
+                FilterClause(property="tokens", operator=FilterOperator.eq, value="10"),
+                0,
+            ),
+            (FilterClause(property="flag", operator=FilterOperator.eq, value=True), 10),
+            (
+                FilterClause(property="model", operator=FilterOperator.ne, value="pro"),
+                10,
+            ),
+            (
+                FilterClause(
+                    property="missing", operator=FilterOperator.ne, value="pro"
+                ),
+                0,
+            ),
+            (FilterClause(property="tokens", operator=FilterOperator.gt, value=5), 10),
+            (FilterClause(property="tokens", operator=FilterOperator.lte, value=5), 0),
+            (
+                FilterClause(
+                    property="model", operator=FilterOperator.like, value="lite"
+                ),
+                10,
+            ),
+            (
+                FilterClause(
+                    property="model", operator=FilterOperator.like, value="li_e"
+                ),
+                10,
+            ),
+            (
+                FilterClause(
+                    property="model", operator=FilterOperator.like, value="li.e"
+                ),
+                0,
+            ),
+            (
+                FilterClause(
+                    property="model", operator=FilterOperator.not_like, value="pro"
+                ),
+                10,
+            ),
+            (
+                FilterClause(
+                    property="model", operator=FilterOperator.not_like, value="lite"
+                ),
+                0,
+            ),
+            (
+                FilterClause(
+                    property="tokens", operator=FilterOperator.not_like, value="pro"
+                ),
+                0,
+            ),
+        ],
+    )
+    async def test_filter_metadata_operators(
+        self,
+        filter_clause: FilterClause,
+        expected_value: int,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+    ) -> None:
+        timestamp = utc_now()
+        await create_event(
+            save_fixture,
+            timestamp=timestamp,
+            organization=customer.organization,
+            customer=customer,
+            metadata={"tokens": 10, "model": "lite-v2", "code": "42", "flag": True},
+        )
+
+        meter = await create_meter(
+            save_fixture,
+            name="Lite Model Usage",
+            filter=Filter(
+                conjunction=FilterConjunction.and_,
+                clauses=[filter_clause],
+            ),
+            aggregation=PropertyAggregation(
+                func=AggregationFunction.sum, property="tokens"
+            ),
+            organization=customer.organization,
+        )
+
+        result = await meter_service.get_quantities(
+            session,
+            meter,
+            customer_id=[customer.id],
+            start_timestamp=timestamp,
+            end_timestamp=timestamp,
+            interval=TimeInterval.day,
+        )
+
+        assert len(result.quantities) == 1
+        quantity = result.quantities[0]
+        assert quantity.quantity == expected_value
+
     @pytest.mark.parametrize(
         "filter_clause",
         [
@@ -516,6 +741,131 @@ class TestGetQuantities:
         quantity = result.quantities[0]
         assert quantity.quantity == 0
 
+    async def test_cached(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        redis: Redis,
+        customer: Customer,
+    ) -> None:
+        timestamp = utc_now() - timedelta(days=2)
+        meter = await create_meter(
+            save_fixture,
+            name="Usage",
+            filter=Filter(conjunction=FilterConjunction.and_, clauses=[]),
+            aggregation=CountAggregation(),
+            organization=customer.organization,
+        )
+
+        async def _get_quantity() -> float:
+            result = await meter_service.get_quantities(
+                session,
+                meter,
+                start_timestamp=timestamp,
+                end_timestamp=timestamp,
+                interval=TimeInterval.day,
+                redis=redis,
+            )
+            return result.quantities[0].quantity
+
+        await create_event(
+            save_fixture, timestamp=timestamp, organization=customer.organization
+        )
+        assert await _get_quantity() == 1
+
+        event = await create_event(
+            save_fixture, timestamp=timestamp, organization=customer.organization
+        )
+        assert await _get_quantity() == 1
+
+        await event_service.ingested(session, redis, [event.id])
+        assert await _get_quantity() == 2
+
+    @pytest.mark.parametrize(
+        "interval,expected_ttl",
+        [
+            pytest.param(TimeInterval.hour, settings.RESULT_CACHE_TTL, id="closed"),
+            pytest.param(TimeInterval.day, settings.RESULT_CACHE_OPEN_TTL, id="open"),
+        ],
+    )
+    async def test_cached_open_bucket(
+        self,
+        interval: TimeInterval,
+        expected_ttl: timedelta,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        redis: Redis,
+        customer: Customer,
+    ) -> None:
+        mocker.patch(
+            "polar.result_cache.utc_now",
+            return_value=datetime(2025, 1, 15, 12, tzinfo=UTC),
+        )
+        meter = await create_meter(save_fixture, organization=customer.organization)
+
+        # Before the open window, but its day is still running
+        timestamp = datetime(2025, 1, 15, 9, tzinfo=UTC)
+        await meter_service.get_quantities(
+            session,
+            meter,
+            start_timestamp=timestamp,
+            end_timestamp=timestamp,
+            interval=interval,
+            redis=redis,
+        )
+
+        [key] = await redis.keys("polar:result_cache:meter_quantities:*")
+        ttl = await redis.ttl(key)
+        assert expected_ttl.total_seconds() - 5 < ttl <= expected_ttl.total_seconds()
+
+    async def test_cached_key(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        redis: Redis,
+        customer: Customer,
+    ) -> None:
+        timestamp = utc_now() - timedelta(days=2)
+        meter = await create_meter(save_fixture, organization=customer.organization)
+
+        async def _get_quantity() -> float:
+            result = await meter_service.get_quantities(
+                session,
+                meter,
+                start_timestamp=timestamp,
+                end_timestamp=timestamp,
+                interval=TimeInterval.day,
+                redis=redis,
+            )
+            return result.quantities[0].quantity
+
+        for _ in range(2):
+            await create_event(
+                save_fixture,
+                timestamp=timestamp,
+                organization=customer.organization,
+                metadata={"tokens": 10},
+            )
+        assert await _get_quantity() == 2
+
+        # Billing doesn't change the definition of the meter
+        await create_event(
+            save_fixture,
+            timestamp=timestamp,
+            organization=customer.organization,
+            metadata={"tokens": 10},
+        )
+        meter.set_modified_at()
+        await save_fixture(meter)
+        assert await _get_quantity() == 2
+
+        meter.aggregation = PropertyAggregation(
+            func=AggregationFunction.sum, property="tokens"
+        )
+        await save_fixture(meter)
+        assert await _get_quantity() == 30
+
 
 @pytest_asyncio.fixture
 async def meter(save_fixture: SaveFixture, organization: Organization) -> Meter:
@@ -544,6 +894,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=1),
+            ingest_xid=101,
             organization=customer.organization,
             customer=customer,
             metadata={"tokens": 20, "model": "lite"},
@@ -551,6 +902,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=2),
+            ingest_xid=102,
             organization=customer.organization,
             customer=customer,
             metadata={"tokens": 10, "model": "lite"},
@@ -558,6 +910,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=3),
+            ingest_xid=103,
             organization=customer.organization,
             customer=customer,
             metadata={"tokens": 10, "model": "lite"},
@@ -565,6 +918,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=4),
+            ingest_xid=104,
             organization=customer.organization,
             customer=customer,
             metadata={"tokens": 0, "model": "lite"},
@@ -572,6 +926,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=5),
+            ingest_xid=105,
             organization=customer.organization,
             customer=customer,
             source=EventSource.system,
@@ -582,6 +937,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=6),
+            ingest_xid=106,
             organization=customer.organization,
             customer=customer,
             metadata={"tokens": 100, "model": "pro"},
@@ -589,6 +945,7 @@ async def events(
         await create_event(
             save_fixture,
             timestamp=timestamp + timedelta(seconds=7),
+            ingest_xid=107,
             organization=customer.organization,
             customer=customer,
             source=EventSource.system,
@@ -619,6 +976,236 @@ async def metered_subscription(
     )
 
 
+async def _get_rollups(session: AsyncSession, meter: Meter) -> Sequence[MeterRollup]:
+    result = await session.execute(
+        select(MeterRollup).where(MeterRollup.meter_id == meter.id)
+    )
+    return result.scalars().all()
+
+
+@pytest.mark.asyncio
+class TestRollup:
+    async def test_incremental(
+        self, save_fixture: SaveFixture, session: AsyncSession, customer: Customer
+    ) -> None:
+        timestamp = utc_now()
+        meter = await create_meter(
+            save_fixture,
+            name="Usage",
+            filter=Filter(conjunction=FilterConjunction.and_, clauses=[]),
+            aggregation=PropertyAggregation(
+                func=AggregationFunction.sum, property="tokens"
+            ),
+            organization=customer.organization,
+        )
+        modified_at = meter.modified_at
+
+        await create_event(
+            save_fixture,
+            timestamp=timestamp,
+            organization=customer.organization,
+            customer=customer,
+            metadata={"tokens": 10},
+            ingest_xid=100,
+        )
+        meter = await meter_service.rollup(session, meter, until_xid=150)
+        assert meter.rolled_up_xid == 150
+
+        await create_event(
+            save_fixture,
+            timestamp=timestamp,
+            organization=customer.organization,
+            customer=customer,
+            metadata={"tokens": 5},
+            ingest_xid=150,
+        )
+        meter = await meter_service.rollup(session, meter, until_xid=200)
+        assert meter.rolled_up_xid == 200
+
+        rollups = await _get_rollups(session, meter)
+        assert len(rollups) == 1
+        [rollup] = rollups
+        assert rollup.customer_id == customer.id
+        assert rollup.count == 2
+        assert rollup.sum == 15
+        assert rollup.min == 5
+        assert rollup.max == 10
+
+        await session.refresh(meter)
+        assert meter.modified_at == modified_at
+
+    async def test_uncommitted_events(
+        self, save_fixture: SaveFixture, session: AsyncSession, customer: Customer
+    ) -> None:
+        timestamp = utc_now()
+        meter = await create_meter(
+            save_fixture,
+            name="Usage",
+            filter=Filter(conjunction=FilterConjunction.and_, clauses=[]),
+            aggregation=CountAggregation(),
+            organization=customer.organization,
+        )
+        # Stamped long ago, but inserted by a transaction still running
+        await create_event(
+            save_fixture,
+            timestamp=timestamp,
+            organization=customer.organization,
+            customer=customer,
+            ingested_at=timestamp - timedelta(hours=1),
+        )
+
+        meter = await meter_service.rollup(session, meter)
+
+        assert meter.rolled_up_xid is not None
+        assert await _get_rollups(session, meter) == []
+
+        result = await meter_service.get_quantities(
+            session,
+            meter,
+            start_timestamp=timestamp,
+            end_timestamp=timestamp,
+            interval=TimeInterval.day,
+        )
+        assert result.quantities[0].quantity == 1
+
+    async def test_reset_on_update(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+    ) -> None:
+        meter = await create_meter(
+            save_fixture,
+            name="Usage",
+            filter=Filter(conjunction=FilterConjunction.and_, clauses=[]),
+            aggregation=CountAggregation(),
+            organization=customer.organization,
+        )
+        await create_event(
+            save_fixture,
+            organization=customer.organization,
+            customer=customer,
+            ingest_xid=100,
+        )
+        meter = await meter_service.rollup(session, meter, until_xid=150)
+
+        meter = await meter_service.update(
+            session,
+            meter,
+            MeterUpdate(
+                aggregation=PropertyAggregation(
+                    func=AggregationFunction.sum, property="tokens"
+                )
+            ),
+        )
+
+        assert meter.rolled_up_xid is None
+        assert await _get_rollups(session, meter) == []
+
+
+@pytest.mark.asyncio
+class TestEnqueueRollups:
+    async def test_new_events(
+        self,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+    ) -> None:
+        enqueue_job_mock = mocker.patch("polar.meter.service.enqueue_job")
+        meter = await create_meter(save_fixture, organization=customer.organization)
+        await create_event(
+            save_fixture,
+            organization=customer.organization,
+            customer=customer,
+            ingest_xid=100,
+        )
+
+        # Never rolled up
+        await meter_service.enqueue_rollups(session)
+        enqueue_job_mock.assert_called_once_with(
+            "meter.rollup", meter.id, _job_id=f"meter.rollup:{meter.id}"
+        )
+
+        # No new events since the last rollup
+        enqueue_job_mock.reset_mock()
+        meter = await meter_service.rollup(session, meter, until_xid=150)
+        await meter_service.enqueue_rollups(session)
+        enqueue_job_mock.assert_not_called()
+
+        await create_event(
+            save_fixture,
+            organization=customer.organization,
+            customer=customer,
+            ingest_xid=150,
+        )
+        await meter_service.enqueue_rollups(session)
+        enqueue_job_mock.assert_called_once_with(
+            "meter.rollup", meter.id, _job_id=f"meter.rollup:{meter.id}"
+        )
+
+
+@pytest.mark.asyncio
+class TestEnqueueBilling:
+    async def test_unbilled_events(
+        self,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+        events: list[Event],
+        meter: Meter,
+    ) -> None:
+        enqueue_job_mock = mocker.patch("polar.meter.service.enqueue_job")
+        billed_meter = await create_meter(
+            save_fixture,
+            id=uuid.uuid4(),
+            name="Billed Meter",
+            filter=Filter(conjunction=FilterConjunction.and_, clauses=[]),
+            aggregation=CountAggregation(),
+            organization=customer.organization,
+        )
+        billed_meter.last_billed_event = events[-1]
+        await save_fixture(billed_meter)
+
+        oldest_unbilled_events = await meter_service.get_oldest_unbilled_events(
+            session, [meter, billed_meter]
+        )
+        assert oldest_unbilled_events == {meter.id: events[0].ingested_at}
+
+        # Same result when the meters are looked up in several batches
+        mocker.patch("polar.meter.service.settings.METER_BILLING_LAG_BATCH_SIZE", 1)
+        oldest_unbilled_events = await meter_service.get_oldest_unbilled_events(
+            session, [billed_meter, meter]
+        )
+        assert oldest_unbilled_events == {meter.id: events[0].ingested_at}
+
+        await meter_service.enqueue_billing(session)
+
+        enqueue_job_mock.assert_called_once_with(
+            "meter.organization_billing_entries",
+            customer.organization_id,
+            [meter.id],
+            _job_id=f"meter.organization_billing_entries:{customer.organization_id}",
+        )
+
+    async def test_no_unbilled_events(
+        self,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        events: list[Event],
+        meter: Meter,
+    ) -> None:
+        enqueue_job_mock = mocker.patch("polar.meter.service.enqueue_job")
+        meter.last_billed_event = events[-3]
+        await save_fixture(meter)
+
+        await meter_service.enqueue_billing(session)
+
+        enqueue_job_mock.assert_not_called()
+
+
 @pytest.mark.asyncio
 class TestCreateBillingEntries:
     async def test_no_subscription(
@@ -630,9 +1217,10 @@ class TestCreateBillingEntries:
         meter: Meter,
         product_metered_unit: Product,
     ) -> None:
-        entries = await meter_service.create_billing_entries(session, meter)
+        count, has_more = await meter_service.create_billing_entries(session, meter)
 
-        assert len(entries) == 0
+        assert count == 0
+        assert has_more is False
         assert meter.last_billed_event == events[-3]
 
     async def test_no_last_billed_event(
@@ -645,8 +1233,10 @@ class TestCreateBillingEntries:
         product_metered_unit: Product,
         metered_subscription: Subscription,
     ) -> None:
-        entries = await meter_service.create_billing_entries(session, meter)
+        count, _ = await meter_service.create_billing_entries(session, meter)
 
+        assert count == 5
+        entries = await _get_billing_entries(session, metered_subscription)
         assert len(entries) == 5
         for entry in entries:
             assert entry.event is not None
@@ -669,8 +1259,10 @@ class TestCreateBillingEntries:
         metered_subscription: Subscription,
     ) -> None:
         meter.last_billed_event = events[1]
-        entries = await meter_service.create_billing_entries(session, meter)
+        count, _ = await meter_service.create_billing_entries(session, meter)
 
+        assert count == 3
+        entries = await _get_billing_entries(session, metered_subscription)
         assert len(entries) == 3
         for entry in entries:
             assert entry.event is not None
@@ -681,3 +1273,73 @@ class TestCreateBillingEntries:
             assert entry.product_price == product_metered_unit.prices[0]
 
         assert meter.last_billed_event == events[-3]
+
+    async def test_uncommitted_events(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+        events: list[Event],
+        meter: Meter,
+        product_metered_unit: Product,
+        metered_subscription: Subscription,
+    ) -> None:
+        # Inserted by the running transaction: left for the next run,
+        # even if it's ingested before the other events
+        await create_event(
+            save_fixture,
+            ingested_at=events[0].ingested_at - timedelta(seconds=1),
+            organization=customer.organization,
+            customer=customer,
+            metadata={"tokens": 10, "model": "lite"},
+        )
+
+        count, has_more = await meter_service.create_billing_entries(session, meter)
+
+        assert count == 5
+        assert has_more is False
+        entries = await _get_billing_entries(session, metered_subscription)
+        assert {entry.event_id for entry in entries} == {
+            event.id for event in events[:5]
+        }
+        assert meter.last_billed_event == events[-3]
+
+    async def test_chunks(
+        self,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        customer: Customer,
+        events: list[Event],
+        meter: Meter,
+        product_metered_unit: Product,
+        metered_subscription: Subscription,
+    ) -> None:
+        mocker.patch("polar.meter.service.settings.METER_BILLING_CHUNK_SIZE", 2)
+
+        counts: list[int] = []
+        has_more = True
+        while has_more:
+            count, has_more = await meter_service.create_billing_entries(session, meter)
+            counts.append(count)
+
+        assert counts == [2, 2, 1]
+        entries = await _get_billing_entries(session, metered_subscription)
+        assert {entry.event_id for entry in entries} == {
+            event.id for event in events[:5]
+        }
+        assert meter.last_billed_event == events[-3]
+
+
+async def _get_billing_entries(
+    session: AsyncSession, subscription: Subscription
+) -> Sequence[BillingEntry]:
+    repository = BillingEntryRepository.from_session(session)
+    return await repository.get_pending_by_subscription(
+        subscription.id,
+        options=(
+            joinedload(BillingEntry.event),
+            joinedload(BillingEntry.customer),
+            joinedload(BillingEntry.product_price),
+        ),
+    )
@@ -7,6 +7,9 @@ import pytest_asyncio
 from polar.auth.models import AuthSubject
 from polar.enums import SubscriptionRecurringInterval
 from polar.kit.time_queries import TimeInterval
+from polar.kit.utils import utc_now
+from polar.metrics.repository import OrderDailyMetricsRepository
+from polar.metrics.schemas import MetricsPeriod
 from polar.metrics.service import metrics as metrics_service
 from polar.models import (
     Customer,
@@ -22,6 +25,7 @@ from polar.models.discount import DiscountDuration, DiscountType
 from polar.models.product import ProductBillingType
 from polar.models.subscription import SubscriptionStatus
 from polar.postgres import AsyncSession
+from polar.redis import Redis
 from tests.fixtures.auth import AuthSubjectFixture
 from tests.fixtures.database import SaveFixture
 from tests.fixtures.random_objects import (
@@ -732,3 +736,102 @@ class TestGetMetrics:
 
         feb = metrics.periods[1]
         assert feb.monthly_recurring_revenue == 50_00
+
+
+async def _refresh(session: AsyncSession, redis: Redis) -> None:
+    # Same steps as the `metrics.refresh` task, within the test session
+    outdated, organization_ids = await metrics_service.get_outdated(session)
+    for product_id, since in outdated.items():
+        await metrics_service.refresh_product(session, product_id, since)
+    await metrics_service.invalidate_cache(redis, organization_ids)
+
+
+@pytest.mark.asyncio
+class TestRefresh:
+    @pytest.mark.auth
+    @pytest.mark.parametrize(
+        "interval",
+        [TimeInterval.year, TimeInterval.month, TimeInterval.week, TimeInterval.day],
+    )
+    async def test_materialized(
+        self,
+        interval: TimeInterval,
+        session: AsyncSession,
+        redis: Redis,
+        auth_subject: AuthSubject[User],
+        user_organization: UserOrganization,
+        fixtures: tuple[dict[str, Product], dict[str, Subscription], dict[str, Order]],
+    ) -> None:
+        products, _, _ = fixtures
+
+        live_metrics = await metrics_service.get_metrics(
+            session,
+            auth_subject,
+            start_date=date(2023, 12, 25),
+            end_date=date(2024, 12, 31),
+            interval=interval,
+        )
+
+        await _refresh(session, redis)
+
+        repository = OrderDailyMetricsRepository.from_session(session)
+        daily_metrics = await repository.get_all(repository.get_base_statement())
+        assert {daily_metric.product_id for daily_metric in daily_metrics} == {
+            products["one_time_product"].id,
+            products["monthly_subscription"].id,
+            products["yearly_subscription"].id,
+        }
+        assert await repository.get_outdated(utc_now().date()) == {}
+
+        materialized_metrics = await metrics_service.get_metrics(
+            session,
+            auth_subject,
+            start_date=date(2023, 12, 25),
+            end_date=date(2024, 12, 31),
+            interval=interval,
+        )
+        assert materialized_metrics.periods == live_metrics.periods
+
+    @pytest.mark.auth
+    async def test_modified_order(
+        self,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        redis: Redis,
+        auth_subject: AuthSubject[User],
+        user_organization: UserOrganization,
+        fixtures: tuple[dict[str, Product], dict[str, Subscription], dict[str, Order]],
+    ) -> None:
+        products, _, orders = fixtures
+        await _refresh(session, redis)
+
+        async def _get_february() -> MetricsPeriod:
+            metrics = await metrics_service.get_metrics(
+                session,
+                auth_subject,
+                start_date=date(2024, 2, 1),
+                end_date=date(2024, 2, 29),
+                interval=TimeInterval.month,
+                redis=redis,
+            )
+            return metrics.periods[0]
+
+        assert (await _get_february()).revenue == 100_00
+
+        order = orders["order_3"]
+        order.subtotal_amount = 50_00
+        order.set_modified_at()
+        await save_fixture(order)
+
+        repository = OrderDailyMetricsRepository.from_session(session)
+        assert await repository.get_outdated(utc_now().date()) == {
+            products["monthly_subscription"].id: date(2024, 2, 1)
+        }
+
+        await _refresh(session, redis)
+
+        feb = await _get_february()
+        assert feb.revenue == 50_00
+        assert feb.cumulative_revenue == 1250_00
+        assert feb.renewed_subscriptions == 1
+        assert feb.renewed_subscriptions_revenue == 50_00
@@ -0,0 +1,57 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from polar.email.renderer import get_email_renderer
+from polar.models import Organization, UserOrganization
+from polar.notifications.notification import (
+    MaintainerCreateAccountNotificationPayload,
+    NotificationType,
+)
+from polar.notifications.service import PartialNotification, notifications
+from polar.notifications.tasks.email import notifications_send_batch
+from polar.postgres import AsyncSession
+from polar.worker import JobContext, PolarWorkerContext
+
+
+@pytest.mark.asyncio
+async def test_send_to_org_members_batch(
+    mocker: MockerFixture,
+    job_context: JobContext,
+    polar_worker_context: PolarWorkerContext,
+    session: AsyncSession,
+    organization: Organization,
+    user_organization: UserOrganization,
+    user_organization_second: UserOrganization,
+) -> None:
+    enqueue_job_mock = mocker.patch("polar.notifications.service.enqueue_job")
+    enqueue_email_mock = mocker.patch("polar.notifications.tasks.email.enqueue_email")
+    render_from_string_spy = mocker.spy(get_email_renderer(), "render_from_string")
+
+    await notifications.send_to_org_members(
+        session,
+        org_id=organization.id,
+        notif=PartialNotification(
+            type=NotificationType.maintainer_create_account,
+            payload=MaintainerCreateAccountNotificationPayload(
+                organization_name=organization.slug, url="https://polar.sh"
+            ),
+        ),
+    )
+
+    enqueue_job_mock.assert_called_once()
+    assert enqueue_job_mock.call_args[0][0] == "notifications.send_batch"
+    notification_ids = enqueue_job_mock.call_args[1]["notification_ids"]
+    assert len(notification_ids) == 2
+
+    await notifications_send_batch(
+        job_context, notification_ids, polar_context=polar_worker_context
+    )
+
+    # Both members get the same email, it's rendered once
+    render_from_string_spy.assert_called_once()
+    assert enqueue_email_mock.call_count == 2
+    assert {
+        call.kwargs["to_email_addr"] for call in enqueue_email_mock.call_args_list
+    } == {user_organization.user.email, user_organization_second.user.email}
+    (first_call, second_call) = enqueue_email_mock.call_args_list
+    assert first_call.kwargs["html_content"] == second_call.kwargs["html_content"]
@@ -1,7 +1,10 @@
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
+from pytest_mock import MockerFixture
 
+from polar.config import settings
+from polar.kit.crypto import get_token_hash
 from polar.kit.db.postgres import Session
 from polar.models import (
     OAuth2Client,
@@ -789,11 +792,13 @@ class TestOAuth2Token:
 
     async def test_refresh_token_sub_user(
         self,
+        mocker: MockerFixture,
         save_fixture: SaveFixture,
         client: AsyncClient,
         user: User,
         oauth2_client: OAuth2Client,
     ) -> None:
+        enqueue_job_mock = mocker.patch("polar.auth.token_cache.enqueue_job")
         await create_oauth2_token(
             save_fixture,
             client=oauth2_client,
@@ -820,6 +825,12 @@ class TestOAuth2Token:
         refresh_token = json["refresh_token"]
         assert refresh_token.startswith("polar_rt_u_")
 
+        # The previous access token is revoked with its refresh token
+        enqueue_job_mock.assert_called_once_with(
+            "auth.invalidate_token_cache",
+            token_hashes=[get_token_hash("ACCESS_TOKEN", secret=settings.SECRET)],
+        )
+
     async def test_refresh_token_sub_organization(
         self,
         save_fixture: SaveFixture,
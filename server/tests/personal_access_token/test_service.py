@@ -73,3 +73,37 @@ class TestRevokeLeaked:
         assert updated_personal_access_token.deleted_at is not None
 
         enqueue_email_mock.assert_called_once()
+
+
+@pytest.mark.asyncio
+class TestRecordUsage:
+    async def test_bulk(
+        self, save_fixture: SaveFixture, session: AsyncSession, user: User
+    ) -> None:
+        now = utc_now()
+        personal_access_tokens = []
+        for i, last_used_at in enumerate((None, now - timedelta(hours=1), now)):
+            personal_access_token = PersonalAccessToken(
+                comment="Test",
+                token=get_token_hash(f"polar_pat_{i}", secret=settings.SECRET),
+                user_id=user.id,
+                expires_at=now + timedelta(days=1),
+                scope="openid",
+                last_used_at=last_used_at,
+            )
+            await save_fixture(personal_access_token)
+            personal_access_tokens.append(personal_access_token)
+
+        used_at = now - timedelta(minutes=1)
+        await personal_access_token_service.record_usage(
+            session, {token.id: used_at for token in personal_access_tokens}
+        )
+
+        for personal_access_token in personal_access_tokens:
+            await session.refresh(personal_access_token)
+        # The latest usage is kept
+        assert [token.last_used_at for token in personal_access_tokens] == [
+            used_at,
+            used_at,
+            now,
+        ]
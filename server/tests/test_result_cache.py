@@ -0,0 +1,105 @@
+import uuid
+from datetime import UTC, datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+from pydantic import BaseModel
+
+from polar.config import settings
+from polar.kit.utils import utc_now
+from polar.redis import Redis
+from polar.result_cache import ResultCache
+
+
+class Result(BaseModel):
+    value: int
+
+
+ORGANIZATION_ID = uuid.uuid4()
+CLOSED_END = datetime(2024, 1, 1, tzinfo=UTC)
+
+
+@pytest.mark.asyncio
+class TestGetOrCompute:
+    async def test_hit(self, redis: Redis) -> None:
+        cache = ResultCache(redis)
+        compute = AsyncMock(return_value=Result(value=1))
+
+        for _ in range(2):
+            result = await cache.get_or_compute(
+                "test",
+                Result,
+                compute,
+                organization_ids=[ORGANIZATION_ID],
+                parameters={"parameter": "A"},
+                end=CLOSED_END,
+            )
+            assert result == Result(value=1)
+
+        compute.assert_awaited_once()
+
+    async def test_different_parameters(self, redis: Redis) -> None:
+        cache = ResultCache(redis)
+        compute = AsyncMock(return_value=Result(value=1))
+
+        for parameter in ("A", "B"):
+            await cache.get_or_compute(
+                "test",
+                Result,
+                compute,
+                organization_ids=[ORGANIZATION_ID],
+                parameters={"parameter": parameter},
+                end=CLOSED_END,
+            )
+
+        assert compute.await_count == 2
+
+    async def test_invalidate(self, redis: Redis) -> None:
+        cache = ResultCache(redis)
+        compute = AsyncMock(side_effect=[Result(value=1), Result(value=2)])
+
+        first_result = await cache.get_or_compute(
+            "test",
+            Result,
+            compute,
+            organization_ids=[ORGANIZATION_ID],
+            parameters={},
+            end=CLOSED_END,
+        )
+        await cache.invalidate([ORGANIZATION_ID])
+        second_result = await cache.get_or_compute(
+            "test",
+            Result,
+            compute,
+            organization_ids=[ORGANIZATION_ID],
+            parameters={},
+            end=CLOSED_END,
+        )
+
+        assert first_result == Result(value=1)
+        assert second_result == Result(value=2)
+
+    @pytest.mark.parametrize(
+        "end,ttl",
+        [
+            pytest.param(CLOSED_END, settings.RESULT_CACHE_TTL, id="closed"),
+            pytest.param(
+                utc_now() + timedelta(days=1), settings.RESULT_CACHE_OPEN_TTL, id="open"
+            ),
+        ],
+    )
+    async def test_ttl(self, end: datetime, ttl: timedelta, redis: Redis) -> None:
+        cache = ResultCache(redis)
+
+        await cache.get_or_compute(
+            "test",
+            Result,
+            AsyncMock(return_value=Result(value=1)),
+            organization_ids=[ORGANIZATION_ID],
+            parameters={},
+            end=end,
+        )
+
+        keys = await redis.keys("polar:result_cache:test:*")
+        assert len(keys) == 1
+        assert await redis.ttl(keys[0]) == ttl.total_seconds()
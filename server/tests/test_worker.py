@@ -0,0 +1,237 @@
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from arq import ArqRedis
+from arq.constants import result_key_prefix
+from arq.jobs import Job, JobStatus
+from fakeredis import FakeAsyncRedis
+from freezegun import freeze_time
+from pytest_mock import MockerFixture
+
+from polar import tasks  # noqa: F401
+from polar.worker import (
+    JobToEnqueue,
+    QueueName,
+    _jobs_to_enqueue,
+    enqueue_batched_job,
+    enqueue_debounced_job,
+    enqueue_job,
+    flush_enqueued_jobs,
+    get_queues_max_jobs,
+)
+
+
+@pytest.fixture
+def enqueue_job_mock(mocker: MockerFixture) -> MagicMock:
+    return mocker.patch("polar.worker.enqueue_job")
+
+
+class TestEnqueueDebouncedJob:
+    def test_same_window(self, enqueue_job_mock: MagicMock) -> None:
+        with freeze_time("2025-01-01T00:00:01Z"):
+            enqueue_debounced_job(
+                "task", debounce_key="KEY", debounce_window=timedelta(seconds=10)
+            )
+        with freeze_time("2025-01-01T00:00:09Z"):
+            enqueue_debounced_job(
+                "task", debounce_key="KEY", debounce_window=timedelta(seconds=10)
+            )
+
+        first_call, second_call = enqueue_job_mock.call_args_list
+        assert first_call.kwargs["_job_id"] == second_call.kwargs["_job_id"]
+        assert first_call.kwargs["_defer_until"] == datetime(
+            2025, 1, 1, 0, 0, 10, tzinfo=UTC
+        )
+
+    def test_next_window(self, enqueue_job_mock: MagicMock) -> None:
+        with freeze_time("2025-01-01T00:00:09Z"):
+            enqueue_debounced_job(
+                "task", debounce_key="KEY", debounce_window=timedelta(seconds=10)
+            )
+        with freeze_time("2025-01-01T00:00:10Z"):
+            enqueue_debounced_job(
+                "task", debounce_key="KEY", debounce_window=timedelta(seconds=10)
+            )
+
+        first_call, second_call = enqueue_job_mock.call_args_list
+        assert first_call.kwargs["_job_id"] != second_call.kwargs["_job_id"]
+        assert second_call.kwargs["_defer_until"] == datetime(
+            2025, 1, 1, 0, 0, 20, tzinfo=UTC
+        )
+
+    def test_different_keys(self, enqueue_job_mock: MagicMock) -> None:
+        with freeze_time("2025-01-01T00:00:01Z"):
+            enqueue_debounced_job(
+                "task", debounce_key="KEY1", debounce_window=timedelta(seconds=10)
+            )
+            enqueue_debounced_job(
+                "task", debounce_key="KEY2", debounce_window=timedelta(seconds=10)
+            )
+
+        first_call, second_call = enqueue_job_mock.call_args_list
+        assert first_call.kwargs["_job_id"] != second_call.kwargs["_job_id"]
+
+
+class TestEnqueueBatchedJob:
+    @pytest.fixture(autouse=True)
+    def jobs_to_enqueue(self) -> Iterator[list[JobToEnqueue]]:
+        jobs: list[JobToEnqueue] = []
+        token = _jobs_to_enqueue.set(jobs)
+        yield jobs
+        _jobs_to_enqueue.reset(token)
+
+    def test_batches(self, jobs_to_enqueue: list[JobToEnqueue]) -> None:
+        for item in range(5):
+            enqueue_batched_job("task", item, batch_size=2)
+
+        assert [kwargs["items"] for _, _, kwargs in jobs_to_enqueue] == [
+            [0, 1],
+            [2, 3],
+            [4],
+        ]
+
+    def test_other_jobs(self, jobs_to_enqueue: list[JobToEnqueue]) -> None:
+        enqueue_batched_job("task", 1, batch_size=10)
+        enqueue_job("other_task")
+        enqueue_batched_job("task", 2, batch_size=10)
+        enqueue_batched_job("another_task", 3, batch_size=10)
+
+        assert [(name, kwargs.get("items")) for name, _, kwargs in jobs_to_enqueue] == [
+            ("task", [1, 2]),
+            ("other_task", None),
+            ("another_task", [3]),
+        ]
+
+
+class TestEnqueueJob:
+    @pytest.fixture(autouse=True)
+    def jobs_to_enqueue(self) -> Iterator[list[JobToEnqueue]]:
+        jobs: list[JobToEnqueue] = []
+        token = _jobs_to_enqueue.set(jobs)
+        yield jobs
+        _jobs_to_enqueue.reset(token)
+
+    def test_task_queue(self, jobs_to_enqueue: list[JobToEnqueue]) -> None:
+        enqueue_job("webhook_event.send")
+        enqueue_job("benefit.update_grants")
+        enqueue_job("unknown_task")
+        enqueue_job("benefit.update_grants", queue_name=QueueName.default)
+
+        assert [kwargs["_queue_name"] for _, _, kwargs in jobs_to_enqueue] == [
+            QueueName.high_priority.value,
+            QueueName.bulk.value,
+            QueueName.default.value,
+            QueueName.default.value,
+        ]
+
+
+@pytest.fixture
+def arq_pool() -> ArqRedis:
+    # Jobs are pickled, so responses can't be decoded like the `redis` fixture does
+    return ArqRedis(FakeAsyncRedis().connection_pool)
+
+
+@pytest.mark.asyncio
+class TestFlushEnqueuedJobs:
+    @pytest.fixture(autouse=True)
+    def jobs_to_enqueue(self) -> Iterator[list[JobToEnqueue]]:
+        token = _jobs_to_enqueue.set([])
+        yield _jobs_to_enqueue.get()
+        _jobs_to_enqueue.reset(token)
+
+    async def test_empty(self, arq_pool: ArqRedis) -> None:
+        await flush_enqueued_jobs(arq_pool)
+
+        assert await arq_pool.keys() == []
+
+    async def test_jobs(self, arq_pool: ArqRedis) -> None:
+        enqueue_job("task", 1, foo="bar", _job_id="JOB_1")
+        enqueue_job("webhook_event.send", _job_id="JOB_2")
+        enqueue_job(
+            "task",
+            _job_id="JOB_3",
+            _defer_until=datetime(2050, 1, 1, tzinfo=UTC),
+        )
+
+        await flush_enqueued_jobs(arq_pool)
+
+        assert _jobs_to_enqueue.get() == []
+
+        job_info = await Job("JOB_1", arq_pool).info()
+        assert job_info is not None
+        assert job_info.function == "task"
+        assert job_info.args == (1,)
+        assert job_info.kwargs["foo"] == "bar"
+        assert "_job_id" not in job_info.kwargs
+
+        assert await arq_pool.zrange(QueueName.default.value, 0, -1) == [
+            b"JOB_1",
+            b"JOB_3",
+        ]
+        assert await arq_pool.zscore(QueueName.default.value, "JOB_3") == (
+            datetime(2050, 1, 1, tzinfo=UTC).timestamp() * 1000
+        )
+        assert await arq_pool.zrange(QueueName.high_priority.value, 0, -1) == [b"JOB_2"]
+
+    async def test_existing_jobs(self, arq_pool: ArqRedis) -> None:
+        await arq_pool.enqueue_job("task", _job_id="QUEUED")
+        await arq_pool.set(result_key_prefix + "COMPLETE", b"")
+
+        enqueue_job("task", "new", _job_id="QUEUED")
+        enqueue_job("task", _job_id="COMPLETE")
+        enqueue_job("task", _job_id="NEW")
+        enqueue_job("task", _job_id="NEW")
+
+        await flush_enqueued_jobs(arq_pool)
+
+        assert await arq_pool.zrange(QueueName.default.value, 0, -1) == [
+            b"QUEUED",
+            b"NEW",
+        ]
+        job_info = await Job("QUEUED", arq_pool).info()
+        assert job_info is not None
+        assert job_info.args == ()
+        assert await Job("COMPLETE", arq_pool).status() == JobStatus.complete
+
+    async def test_chunks(self, arq_pool: ArqRedis, mocker: MockerFixture) -> None:
+        mocker.patch("polar.worker._ENQUEUE_JOBS_CHUNK_SIZE", 2)
+        evalsha_spy = mocker.spy(arq_pool, "evalsha")
+        script_load_spy = mocker.spy(arq_pool, "script_load")
+
+        for i in range(5):
+            enqueue_job("task", _job_id=f"JOB_{i}")
+
+        await flush_enqueued_jobs(arq_pool)
+
+        # The first call misses the script, which is loaded once then retried
+        assert evalsha_spy.call_count == 4
+        assert script_load_spy.call_count == 1
+        assert await arq_pool.zcard(QueueName.default.value) == 5
+
+
+@pytest.mark.parametrize(
+    "weights,max_jobs,expected",
+    [
+        (
+            {QueueName.high_priority: 1, QueueName.default: 2},
+            30,
+            {QueueName.high_priority: 10, QueueName.default: 20},
+        ),
+        (
+            {QueueName.high_priority: 1, QueueName.default: 1},
+            5,
+            {QueueName.high_priority: 3, QueueName.default: 2},
+        ),
+        (
+            {QueueName.high_priority: 1, QueueName.default: 100},
+            10,
+            {QueueName.high_priority: 1, QueueName.default: 9},
+        ),
+    ],
+)
+def test_get_queues_max_jobs(
+    weights: dict[QueueName, int], max_jobs: int, expected: dict[QueueName, int]
+) -> None:
+    assert get_queues_max_jobs(weights, max_jobs) == expected
@@ -0,0 +1,85 @@
+import uuid
+
+import pytest
+from pytest_mock import MockerFixture
+
+from polar.config import settings
+from polar.redis import Redis
+from polar.webhook.delivery import CircuitBreaker
+
+
+@pytest.mark.asyncio
+class TestCircuitBreaker:
+    async def test_open(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.webhook.delivery.settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD", 3
+        )
+        circuit_breaker = CircuitBreaker(redis, uuid.uuid4())
+
+        for _ in range(2):
+            await circuit_breaker.record_failure()
+        assert await circuit_breaker.get_park_delay() is None
+
+        await circuit_breaker.record_failure()
+        assert await circuit_breaker.get_park_delay() is not None
+
+    async def test_success_resets(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.webhook.delivery.settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD", 3
+        )
+        circuit_breaker = CircuitBreaker(redis, uuid.uuid4())
+
+        for _ in range(2):
+            await circuit_breaker.record_failure()
+        await circuit_breaker.record_success()
+        for _ in range(2):
+            await circuit_breaker.record_failure()
+
+        assert await circuit_breaker.get_park_delay() is None
+
+    async def test_half_open(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.webhook.delivery.settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD", 3
+        )
+        circuit_breaker = CircuitBreaker(redis, uuid.uuid4())
+
+        for _ in range(3):
+            await circuit_breaker.record_failure()
+        # The open duration elapsed
+        await redis.delete(circuit_breaker._get_open_key())
+
+        # A single delivery probes the endpoint
+        assert await circuit_breaker.get_park_delay() is None
+        assert await circuit_breaker.get_park_delay() is not None
+
+        await circuit_breaker.record_failure()
+        assert await circuit_breaker.get_park_delay() is not None
+
+    async def test_half_open_success(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.webhook.delivery.settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD", 3
+        )
+        circuit_breaker = CircuitBreaker(redis, uuid.uuid4())
+
+        for _ in range(3):
+            await circuit_breaker.record_failure()
+        await redis.delete(circuit_breaker._get_open_key())
+        assert await circuit_breaker.get_park_delay() is None
+
+        await circuit_breaker.record_success()
+        for _ in range(2):
+            assert await circuit_breaker.get_park_delay() is None
+
+    async def test_jitter(self, mocker: MockerFixture, redis: Redis) -> None:
+        mocker.patch(
+            "polar.webhook.delivery.settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD", 1
+        )
+        mocker.patch("polar.webhook.delivery.random.random", side_effect=[0.0, 1.0])
+        circuit_breaker = CircuitBreaker(redis, uuid.uuid4())
+        await circuit_breaker.record_failure()
+
+        first = await circuit_breaker.get_park_delay()
+        second = await circuit_breaker.get_park_delay()
+        assert first is not None and second is not None
+        assert first <= settings.WEBHOOK_CIRCUIT_BREAKER_OPEN_DURATION
+        assert second - first > settings.WEBHOOK_CIRCUIT_BREAKER_JITTER * 0.9
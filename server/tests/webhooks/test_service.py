@@ -1,4 +1,5 @@
 import uuid
+from datetime import timedelta
 from typing import cast
 from unittest.mock import MagicMock
 
@@ -9,18 +10,25 @@ from polar.auth.models import AuthSubject
 from polar.auth.scope import Scope
 from polar.checkout.eventstream import CheckoutEvent
 from polar.exceptions import PolarRequestValidationError, ResourceNotFound
+from polar.kit.pagination import PaginationParams
+from polar.kit.utils import utc_now
 from polar.models import (
     Organization,
     Product,
+    Subscription,
+    WebhookDelivery,
     WebhookEndpoint,
     WebhookEvent,
 )
-from polar.models.webhook_endpoint import WebhookFormat
+from polar.models.webhook_endpoint import WebhookEventType, WebhookFormat
 from polar.postgres import AsyncSession
 from polar.webhook.schemas import HttpsUrl, WebhookEndpointCreate, WebhookEndpointUpdate
 from polar.webhook.service import EventDoesNotExist, EventNotSuccessul
 from polar.webhook.service import webhook as webhook_service
-from polar.webhook.webhooks import WebhookCheckoutUpdatedPayload
+from polar.webhook.webhooks import (
+    WebhookCheckoutUpdatedPayload,
+    WebhookSubscriptionCreatedPayload,
+)
 from tests.fixtures.auth import AuthSubjectFixture
 from tests.fixtures.database import SaveFixture
 from tests.fixtures.random_objects import create_checkout
@@ -139,6 +147,140 @@ class TestRedeliverEvent:
         )
         enqueue_job_mock.assert_called_once()
 
+    @pytest.mark.auth(
+        AuthSubjectFixture(subject="organization", scopes={Scope.webhooks_write})
+    )
+    async def test_purged_payload(
+        self,
+        auth_subject: AuthSubject[Organization],
+        session: AsyncSession,
+        save_fixture: SaveFixture,
+        webhook_event_organization: WebhookEvent,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        webhook_event_organization.payload = None
+        await save_fixture(webhook_event_organization)
+
+        with pytest.raises(ResourceNotFound):
+            await webhook_service.redeliver_event(
+                session, auth_subject, webhook_event_organization.id
+            )
+        enqueue_job_mock.assert_not_called()
+
+
+@pytest.mark.asyncio
+class TestListDeliveries:
+    @pytest.mark.auth(
+        AuthSubjectFixture(subject="organization", scopes={Scope.webhooks_read})
+    )
+    async def test_starting_after(
+        self,
+        auth_subject: AuthSubject[Organization],
+        session: AsyncSession,
+        save_fixture: SaveFixture,
+        webhook_endpoint_organization: WebhookEndpoint,
+        webhook_event_organization: WebhookEvent,
+    ) -> None:
+        now = utc_now()
+        deliveries: list[WebhookDelivery] = []
+        for i in range(4):
+            delivery = WebhookDelivery(
+                webhook_endpoint_id=webhook_endpoint_organization.id,
+                webhook_event_id=webhook_event_organization.id,
+                succeeded=True,
+                http_code=200,
+                # Two deliveries at the same time, ordered by ID
+                created_at=now - timedelta(minutes=min(i, 2)),
+            )
+            await save_fixture(delivery)
+            deliveries.append(delivery)
+        ordered = sorted(deliveries, key=lambda d: (d.created_at, d.id), reverse=True)
+
+        results, count = await webhook_service.list_deliveries(
+            session,
+            auth_subject,
+            endpoint_id=webhook_endpoint_organization.id,
+            pagination=PaginationParams(1, 2),
+        )
+        assert count == 4
+        assert [r.id for r in results] == [d.id for d in ordered[:2]]
+
+        results, count = await webhook_service.list_deliveries(
+            session,
+            auth_subject,
+            endpoint_id=webhook_endpoint_organization.id,
+            starting_after=results[-1].id,
+            pagination=PaginationParams(1, 2),
+        )
+        assert count == 2
+        assert [r.id for r in results] == [d.id for d in ordered[2:]]
+
+        results, count = await webhook_service.list_deliveries(
+            session,
+            auth_subject,
+            endpoint_id=webhook_endpoint_organization.id,
+            starting_after=ordered[0].id,
+            pagination=PaginationParams(1, 2),
+        )
+        assert count == 3
+        assert [r.id for r in results] == [d.id for d in ordered[1:3]]
+
+        results, count = await webhook_service.list_deliveries(
+            session,
+            auth_subject,
+            endpoint_id=webhook_endpoint_organization.id,
+            starting_after=ordered[0].id,
+            pagination=PaginationParams(2, 1),
+        )
+        assert count == 3
+        assert [r.id for r in results] == [ordered[2].id]
+
+
+@pytest.mark.asyncio
+class TestPurgeEventPayloads:
+    async def test_purge(
+        self,
+        session: AsyncSession,
+        save_fixture: SaveFixture,
+        webhook_endpoint_organization: WebhookEndpoint,
+    ) -> None:
+        old_events = [
+            WebhookEvent(
+                webhook_endpoint_id=webhook_endpoint_organization.id,
+                succeeded=True,
+                last_http_code=200,
+                payload="{}",
+                created_at=utc_now() - timedelta(days=40),
+            )
+            for _ in range(3)
+        ]
+        recent_event = WebhookEvent(
+            webhook_endpoint_id=webhook_endpoint_organization.id,
+            succeeded=True,
+            last_http_code=200,
+            payload="{}",
+        )
+        for event in [*old_events, recent_event]:
+            await save_fixture(event)
+
+        before = utc_now() - timedelta(days=30)
+        purged = await webhook_service.purge_event_payloads(
+            session, before=before, batch_size=2
+        )
+        assert purged == 2
+        purged = await webhook_service.purge_event_payloads(
+            session, before=before, batch_size=2
+        )
+        assert purged == 1
+
+        for event in old_events:
+            await session.refresh(event)
+            assert event.payload is None
+            assert event.succeeded is True
+            assert event.last_http_code == 200
+        await session.refresh(recent_event)
+        assert recent_event.payload == "{}"
+
 
 @pytest.mark.asyncio
 class TestOnEventSuccess:
@@ -191,3 +333,85 @@ class TestOnEventSuccess:
             CheckoutEvent.webhook_event_delivered,
             {"status": checkout.status},
         )
+
+
+@pytest.mark.asyncio
+class TestSendPayload:
+    async def test_fan_out(
+        self,
+        mocker: MockerFixture,
+        save_fixture: SaveFixture,
+        session: AsyncSession,
+        organization: Organization,
+        subscription: Subscription,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        endpoints: list[WebhookEndpoint] = []
+        for format in (WebhookFormat.raw, WebhookFormat.raw, WebhookFormat.discord):
+            endpoint = WebhookEndpoint(
+                url=webhook_url,
+                format=format,
+                secret="SECRET",
+                organization=organization,
+                events=[WebhookEventType.subscription_created],
+            )
+            await save_fixture(endpoint)
+            endpoints.append(endpoint)
+
+        payload = WebhookSubscriptionCreatedPayload.model_validate(
+            {"type": WebhookEventType.subscription_created, "data": subscription}
+        )
+        get_payload_spy = mocker.spy(WebhookSubscriptionCreatedPayload, "get_payload")
+        flush_spy = mocker.spy(session, "flush")
+
+        events = await webhook_service.send_payload(session, organization, payload)
+
+        assert {event.webhook_endpoint_id for event in events} == {
+            endpoint.id for endpoint in endpoints
+        }
+        assert events[0].payload == events[1].payload
+        # Serialized once per format
+        assert get_payload_spy.call_count == 2
+        flush_spy.assert_called_once()
+        assert enqueue_job_mock.call_count == 3
+        for event in events:
+            enqueue_job_mock.assert_any_call(
+                "webhook_event.send", webhook_event_id=event.id
+            )
+
+    @pytest.mark.auth(
+        AuthSubjectFixture(subject="organization", scopes={Scope.webhooks_write})
+    )
+    async def test_endpoints_index(
+        self,
+        auth_subject: AuthSubject[Organization],
+        session: AsyncSession,
+        organization: Organization,
+        subscription: Subscription,
+        enqueue_job_mock: MagicMock,
+    ) -> None:
+        payload = WebhookSubscriptionCreatedPayload.model_validate(
+            {"type": WebhookEventType.subscription_created, "data": subscription}
+        )
+
+        # No endpoints, the organization is indexed as such
+        assert await webhook_service.send_payload(session, organization, payload) == []
+
+        endpoint = await webhook_service.create_endpoint(
+            session,
+            auth_subject,
+            WebhookEndpointCreate(
+                url=webhook_url,
+                format=WebhookFormat.raw,
+                secret="SECRET",
+                events=[WebhookEventType.subscription_created],
+            ),
+        )
+        # The index is outdated by the version, committed with the endpoint
+        assert organization.webhook_endpoints_version == 1
+        events = await webhook_service.send_payload(session, organization, payload)
+        assert [event.webhook_endpoint_id for event in events] == [endpoint.id]
+
+        await webhook_service.delete_endpoint(session, endpoint)
+        assert organization.webhook_endpoints_version == 2
+        assert await webhook_service.send_payload(session, organization, payload) == []
@@ -19,6 +19,7 @@ from polar.models.webhook_event import WebhookEvent
 from polar.webhook.service import webhook as webhook_service
 from polar.webhook.tasks import (
     MAX_RETRIES,
+    MAX_TRIES,
     _webhook_event_send,
     allowed_url,
     webhook_event_send,
@@ -149,9 +150,8 @@ async def test_webhook_delivery_500(
     await save_fixture(event)
 
     # failures
-    for job_try in range(MAX_RETRIES):
+    for _ in range(MAX_RETRIES - 1):
         with pytest.raises(Retry):
-            job_context["job_try"] = job_try
             await _webhook_event_send(
                 session=session,
                 ctx=job_context,
@@ -159,7 +159,6 @@ async def test_webhook_delivery_500(
             )
 
     # does not raise on last attempt
-    job_context["job_try"] = MAX_RETRIES + 1
     await _webhook_event_send(
         session=session,
         ctx=job_context,
@@ -191,9 +190,8 @@ async def test_webhook_delivery_http_error(
     await save_fixture(event)
 
     # failures
-    for job_try in range(MAX_RETRIES):
+    for _ in range(MAX_RETRIES - 1):
         with pytest.raises(Retry):
-            job_context["job_try"] = job_try
             await _webhook_event_send(
                 session=session,
                 ctx=job_context,
@@ -201,7 +199,6 @@ async def test_webhook_delivery_http_error(
             )
 
     # does not raise on last attempt
-    job_context["job_try"] = MAX_RETRIES + 1
     await _webhook_event_send(
         session=session,
         ctx=job_context,
@@ -245,6 +242,61 @@ async def test_webhook_standard_webhooks_compatible(
     assert w.verify(request.content, cast(dict[str, str], request.headers)) is not None
 
 
+@pytest.mark.asyncio
+async def test_webhook_delivery_circuit_breaker(
+    mocker: MockerFixture,
+    session: AsyncSession,
+    save_fixture: SaveFixture,
+    respx_mock: respx.MockRouter,
+    organization: Organization,
+    job_context: JobContext,
+) -> None:
+    mocker.patch("polar.webhook.delivery.settings.WEBHOOK_CIRCUIT_BREAKER_THRESHOLD", 2)
+    route_mock = respx_mock.post("https://example.com/hook").mock(
+        return_value=httpx.Response(500)
+    )
+
+    endpoint = WebhookEndpoint(
+        url="https://example.com/hook",
+        format=WebhookFormat.raw,
+        organization_id=organization.id,
+        secret="mysecret",
+    )
+    await save_fixture(endpoint)
+
+    event = WebhookEvent(webhook_endpoint_id=endpoint.id, payload='{"foo":"bar"}')
+    await save_fixture(event)
+
+    for _ in range(2):
+        with pytest.raises(Retry):
+            await _webhook_event_send(
+                session=session, ctx=job_context, webhook_event_id=event.id
+            )
+    assert route_mock.call_count == 2
+
+    # The endpoint is parked: the delivery isn't attempted
+    with pytest.raises(Retry):
+        await _webhook_event_send(
+            session=session, ctx=job_context, webhook_event_id=event.id
+        )
+    assert route_mock.call_count == 2
+    assert (
+        await webhook_service.count_event_deliveries(
+            session, event.id, since=job_context["enqueue_time"]
+        )
+        == 2
+    )
+
+    # Out of tries while parked: the event is failed instead of being dropped
+    job_context["job_try"] = MAX_TRIES
+    await _webhook_event_send(
+        session=session, ctx=job_context, webhook_event_id=event.id
+    )
+    assert route_mock.call_count == 2
+    await session.refresh(event)
+    assert event.succeeded is False
+
+
 @pytest.mark.asyncio
 async def test_allowed_url() -> None:
     assert allowed_url("https://example.com/webhooks")
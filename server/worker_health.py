@@ -8,21 +8,29 @@ from starlette.routing import Route
 
 from polar.logging import Logger
 from polar.logging import configure as configure_logging
-from polar.worker import WorkerSettings, WorkerSettingsGitHubCrawl
+from polar.worker import QueueName, WorkerSettings
 
 configure_logging()
 logger: Logger = structlog.get_logger()
 
 
-async def arq_health_check(
-    settings_cls: type[WorkerSettings] | type[WorkerSettingsGitHubCrawl],
-) -> bool:
-    exit_code = await async_check_health(settings_cls.redis_settings)
+WORKER_QUEUES: dict[str, QueueName] = {
+    "main": QueueName.default,
+    "high_priority": QueueName.high_priority,
+    "github": QueueName.github_crawl,
+    "bulk": QueueName.bulk,
+}
+
+
+async def arq_health_check(queue_name: QueueName) -> bool:
+    exit_code = await async_check_health(
+        WorkerSettings.redis_settings, queue_name=queue_name.value
+    )
     return exit_code == 0
 
 
 class WorkerParamConvertor(StringConvertor):
-    regex = "main|github"
+    regex = "|".join(WORKER_QUEUES)
 
 
 register_url_convertor("worker", WorkerParamConvertor())
@@ -30,8 +38,7 @@ register_url_convertor("worker", WorkerParamConvertor())
 
 async def healthz(request: Request) -> Response:
     worker = request.path_params["worker"]
-    worker_class = WorkerSettingsGitHubCrawl if worker == "github" else WorkerSettings
-    if await arq_health_check(worker_class):
+    if await arq_health_check(WORKER_QUEUES[worker]):
         return Response(status_code=200)
     else:
         return Response(status_code=503)